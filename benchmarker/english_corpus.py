@@ -0,0 +1,57 @@
+"""A test corpus for benchmarking the english rendering of the REST service.
+
+The same queries are made with and without english, so the cost of the
+rendering can be seen, and when run with several inner runs (`-r`), the times
+of the repeated calls show the drop in latency once the english is cached:
+
+    indra-db-benchmarker run benchmarker/english_corpus.py <stack> english -r 5
+"""
+import requests
+
+from indra import get_config
+
+URL = get_config('INDRA_DB_REST_URL', failure_ok=False).rstrip('/')
+API_KEY = get_config('INDRA_DB_REST_API_KEY', failure_ok=True)
+
+
+def _get(endpoint, **params):
+    params['format'] = 'json-js'
+    if API_KEY is not None:
+        params['api_key'] = API_KEY
+    resp = requests.get(f'{URL}/{endpoint}', params=params)
+    assert resp.status_code == 200, (resp.status_code, resp.text)
+    return resp.json()
+
+
+def _check_english(res_json, key):
+    entries = res_json[key]
+    if isinstance(entries, dict):
+        entries = entries.values()
+    assert all(entry.get('english') for entry in entries), \
+        "Some results are missing english."
+
+
+def test_statements_without_english():
+    _get('statements/from_agents', agent='MEK', limit=500, ev_limit=10)
+
+
+def test_statements_with_english():
+    res_json = _get('statements/from_agents', agent='MEK', limit=500,
+                    ev_limit=10, with_english='true')
+    _check_english(res_json, 'statements')
+
+
+def test_relations_without_english():
+    _get('relations/from_agents', agent='TP53', limit=500)
+
+
+def test_relations_with_english():
+    res_json = _get('relations/from_agents', agent='TP53', limit=500,
+                    with_english='true')
+    _check_english(res_json, 'relations')
+
+
+def test_agents_with_english():
+    res_json = _get('agents/from_agents', agent='MAPK1', limit=500,
+                    with_english='true')
+    _check_english(res_json, 'relations')
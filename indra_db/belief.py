@@ -9,6 +9,10 @@ import pickle
 import logging
 import argparse
 from datetime import datetime
+from multiprocessing import Pool
+
+import numpy as np
+from sqlalchemy import func, null, union_all
 
 from indra_db import util as dbu
 from indra_db.util import S3Path
@@ -154,10 +158,15 @@ def load_mock_statements(db, hashes=None, sup_links=None):
     return list(stmts_dict.values())
 
 
-def calculate_belief(stmts):
-    scorer = SimpleScorer(subtype_probs={
+def get_scorer():
+    """Get the scorer used to calculate belief for the database."""
+    return SimpleScorer(subtype_probs={
         'biopax': {'pc11': 0.2, 'phosphosite': 0.01},
     })
+
+
+def calculate_belief(stmts):
+    scorer = get_scorer()
     be = BeliefEngine(scorer=scorer)
     be.set_prior_probs(stmts)
     be.set_hierarchy_probs(stmts)
@@ -190,6 +199,11 @@ def get_belief(db=None, partition=True):
                                              sup_links=list(sg.edges))
                 beliefs.update(calculate_belief(stmts))
                 group = set()
+        if group:
+            sg = g.subgraph(group)
+            stmts = load_mock_statements(db, hashes=group,
+                                         sup_links=list(sg.edges))
+            beliefs.update(calculate_belief(stmts))
         return beliefs
     else:
         logger.info('Running without partitioning, loading mock statements')
@@ -197,6 +211,305 @@ def get_belief(db=None, partition=True):
         return calculate_belief(stmts)
 
 
+class SourceCounts(object):
+    """The number of evidence from each source for a set of statements.
+
+    The counts are stored sparsely, as parallel arrays of (statement index,
+    source index, count) sorted by statement, where the statement index
+    refers to the sorted array of hashes, and the source index to the list of
+    sources.
+
+    Parameters
+    ----------
+    hashes : numpy.ndarray
+        The sorted, unique int64 array of statement hashes.
+    sources : list[tuple]
+        A list of (source_api, subtype) pairs. The subtype is None unless the
+        scorer distinguishes subtypes of the source.
+    stmt_idx : numpy.ndarray
+        The index of the statement in `hashes` for each count.
+    src_idx : numpy.ndarray
+        The index of the source in `sources` for each count.
+    counts : numpy.ndarray
+        The count of evidence.
+    """
+    def __init__(self, hashes, sources, stmt_idx, src_idx, counts):
+        self.hashes = hashes
+        self.sources = sources
+        self.stmt_idx = stmt_idx
+        self.src_idx = src_idx
+        self.counts = counts
+        self._ptr = np.searchsorted(stmt_idx, np.arange(len(hashes) + 1))
+
+    @classmethod
+    def from_rows(cls, rows, subtype_sources=('biopax',)):
+        """Build the counts from (hash, source_api, subtype, count) rows."""
+        src_dict = {}
+        hash_list = []
+        src_list = []
+        count_list = []
+        for mk_hash, src_api, subtype, count in rows:
+            src_api = src_api.lower()
+            src = (src_api, subtype if src_api in subtype_sources else None)
+            hash_list.append(mk_hash)
+            src_list.append(src_dict.setdefault(src, len(src_dict)))
+            count_list.append(count)
+        hash_arr = np.array(hash_list, dtype=np.int64)
+        hashes, stmt_idx = np.unique(hash_arr, return_inverse=True)
+        order = np.argsort(stmt_idx, kind='stable')
+        sources = sorted(src_dict, key=src_dict.get)
+        return cls(hashes, sources, stmt_idx[order],
+                   np.array(src_list, dtype=np.int64)[order],
+                   np.array(count_list, dtype=np.int64)[order])
+
+    def get_dense(self, idx):
+        """Get a dense matrix of counts for the statements at `idx`."""
+        dense = np.zeros((len(idx), len(self.sources)), dtype=np.int64)
+        starts = self._ptr[idx]
+        lengths = self._ptr[idx + 1] - starts
+        offsets = np.arange(lengths.sum()) \
+            - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        entries = np.repeat(starts, lengths) + offsets
+        rows = np.repeat(np.arange(len(idx)), lengths)
+        np.add.at(dense, (rows, self.src_idx[entries]), self.counts[entries])
+        return dense
+
+
+def load_source_counts(db):
+    """Load the number of evidence from each source for every pa statement.
+
+    The evidence from readings and from knowledge bases is counted in a single
+    query, grouped by hash and source, so that no per-evidence data needs to
+    be loaded.
+    """
+    db.grab_session()
+    mk_hash = db.RawUniqueLinks.pa_stmt_mk_hash.label('mk_hash')
+    q_rdg = db.session.query(mk_hash, db.Reading.reader.label('src'),
+                             null().label('sub'))\
+        .filter(*db.link(db.Reading, db.RawUniqueLinks))
+    q_dbs = db.session.query(mk_hash, db.DBInfo.source_api.label('src'),
+                             db.DBInfo.db_name.label('sub'))\
+        .filter(*db.link(db.DBInfo, db.RawUniqueLinks))
+    ev = union_all(q_rdg.statement, q_dbs.statement).alias('ev')
+    q = db.session.query(ev.c.mk_hash, ev.c.src, ev.c.sub, func.count())\
+        .group_by(ev.c.mk_hash, ev.c.src, ev.c.sub)
+    logger.info('Querying for evidence counts by source')
+    return SourceCounts.from_rows(q.yield_per(100000))
+
+
+def get_components(num_nodes, edges):
+    """Label the connected components of a graph with a union-find.
+
+    Parameters
+    ----------
+    num_nodes : int
+        The number of nodes, which are labeled 0 through num_nodes - 1.
+    edges : numpy.ndarray
+        An (N, 2) array of node indices.
+
+    Returns
+    -------
+    labels : numpy.ndarray
+        The label of the component of each node, which is the smallest node
+        in the component.
+    """
+    labels = np.arange(num_nodes, dtype=np.int64)
+    if not len(edges):
+        return labels
+    a, b = edges[:, 0], edges[:, 1]
+    while True:
+        # Hook each pair of roots onto the lesser of the two...
+        roots = np.minimum(labels[a], labels[b])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, labels[a], roots)
+        np.minimum.at(new_labels, labels[b], roots)
+
+        # ...and then compress the paths to the roots.
+        while True:
+            jumped = new_labels[new_labels]
+            if np.array_equal(jumped, new_labels):
+                break
+            new_labels = jumped
+
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def get_support_totals(counts, sup_links):
+    """Add the counts of the supported statements to the supporting.
+
+    This gathers the evidence in the same way as the belief engine does when
+    calculating hierarchy probabilities from the supports of statements.
+
+    Parameters
+    ----------
+    counts : numpy.ndarray
+        A matrix of counts, with a row for each statement.
+    sup_links : numpy.ndarray
+        An (N, 2) array of (supported, supporting) statement rows.
+    """
+    import networkx as nx
+    totals = counts.copy()
+    if not len(sup_links):
+        return totals
+    g = nx.DiGraph()
+    g.add_edges_from(zip(sup_links[:, 1], sup_links[:, 0]))
+    for node in g.nodes:
+        desc = list(nx.descendants(g, node))
+        if desc:
+            totals[node] += counts[desc].sum(axis=0)
+    return totals
+
+
+def get_source_priors(sources, scorer=None):
+    """Get the arrays of source priors needed by `score_counts`."""
+    if scorer is None:
+        scorer = get_scorer()
+    src_apis = sorted({src_api for src_api, _ in sources})
+    for err_type in ('rand', 'syst'):
+        for src_api in src_apis:
+            if src_api not in scorer.prior_probs[err_type]:
+                raise LoadError('BeliefEngine missing probability parameter '
+                                'for source: %s' % src_api)
+    subtype_probs = scorer.subtype_probs or {}
+    rand = np.array([subtype_probs.get(src_api, {}).get(
+                         sub, scorer.prior_probs['rand'][src_api])
+                     for src_api, sub in sources])
+    api_idx = np.array([src_apis.index(src_api) for src_api, _ in sources],
+                       dtype=np.int64)
+    syst = np.array([scorer.prior_probs['syst'][src_api]
+                     for src_api in src_apis])
+    return rand, syst, api_idx
+
+
+def score_counts(totals, rand, syst, api_idx):
+    """Calculate beliefs from a matrix of the total counts of evidence.
+
+    This is equivalent to the `SimpleScorer` applied to the evidence, given
+    that none of the evidence is negated.
+    """
+    # The random error of each source API is the product over its subtypes.
+    rand_prods = np.ones((len(totals), len(syst)))
+    api_counts = np.zeros((len(totals), len(syst)), dtype=np.int64)
+    for col in range(totals.shape[1]):
+        rand_prods[:, api_idx[col]] *= rand[col] ** totals[:, col]
+        api_counts[:, api_idx[col]] += totals[:, col]
+    neg_probs = np.where(api_counts > 0, syst + rand_prods, 1)
+    return 1 - neg_probs.prod(axis=1)
+
+
+_worker_priors = None
+
+
+def _init_belief_worker(priors):
+    global _worker_priors
+    _worker_priors = priors
+
+
+def _score_group(job):
+    hashes, counts, sup_links = job
+    totals = get_support_totals(counts, sup_links)
+    beliefs = score_counts(totals, *_worker_priors)
+    return {str(h): b for h, b in zip(hashes.tolist(), beliefs.tolist())}
+
+
+def iter_count_groups(source_counts, sup_links, group_size=10000):
+    """Yield groups of whole connected components to be scored.
+
+    Each group is a tuple of the array of hashes, the dense matrix of their
+    counts, and the array of support links within the group as rows of the
+    counts.
+    """
+    hashes = source_counts.hashes
+    if not len(hashes):
+        return
+    if len(sup_links):
+        idx = np.searchsorted(hashes, sup_links)
+        idx[idx == len(hashes)] = 0
+        valid = (hashes[idx] == sup_links).all(axis=1)
+        if not valid.all():
+            logger.warning("Found %d support links with hashes that have no "
+                           "evidence." % (~valid).sum())
+        idx = idx[valid]
+    else:
+        idx = np.zeros((0, 2), dtype=np.int64)
+
+    labels = get_components(len(hashes), idx)
+    order = np.argsort(labels, kind='stable')
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    comp_starts = np.concatenate([[0], bounds])
+    comp_ends = np.concatenate([bounds, [len(order)]])
+
+    # Sort the links by the component they are in, so each group's links are
+    # a contiguous slice.
+    link_order = np.argsort(labels[idx[:, 0]], kind='stable')
+    idx = idx[link_order]
+    link_labels = labels[idx[:, 0]]
+
+    start = 0
+    for end in comp_ends:
+        if end - start < group_size and end != len(order):
+            continue
+        grp_idx = np.sort(order[start:end])
+        lo, hi = np.searchsorted(link_labels, [labels[order[start]],
+                                               labels[order[end - 1]] + 1])
+        grp_links = np.searchsorted(grp_idx, idx[lo:hi])
+        yield hashes[grp_idx], source_counts.get_dense(grp_idx), grp_links
+        start = end
+
+
+def get_belief_from_counts(db=None, n_proc=1, group_size=10000):
+    """Calculate the beliefs of all pa statements from counts of evidence.
+
+    The evidence counts by source are loaded in a single query, the
+    statements are split into connected components of the support graph,
+    and groups of components are scored, optionally in parallel, from their
+    count vectors.
+
+    Parameters
+    ----------
+    db : Optional[DatabaseManager]
+        The database to load from. By default, the primary database.
+    n_proc : Optional[int]
+        The number of processes used to score groups. Default is 1.
+    group_size : Optional[int]
+        The minimum number of statements in each group that is scored.
+        Default is 10000.
+
+    Returns
+    -------
+    beliefs : dict
+        A dict of belief scores keyed by the string of the hash.
+    """
+    if db is None:
+        db = dbu.get_db('primary')
+
+    source_counts = load_source_counts(db)
+    logger.info(f'Loaded counts for {len(source_counts.hashes)} statements '
+                f'from {len(source_counts.sources)} sources.')
+
+    logger.info('Querying for support links')
+    link_pair = [db.PASupportLinks.supported_mk_hash,
+                 db.PASupportLinks.supporting_mk_hash]
+    sup_links = np.array(db.select_all(link_pair), dtype=np.int64)\
+        .reshape(-1, 2)
+
+    priors = get_source_priors(source_counts.sources)
+    groups = iter_count_groups(source_counts, sup_links, group_size)
+    beliefs = {}
+    if n_proc > 1:
+        with Pool(n_proc, initializer=_init_belief_worker,
+                  initargs=(priors,)) as pool:
+            for res in tqdm.tqdm(pool.imap_unordered(_score_group, groups)):
+                beliefs.update(res)
+    else:
+        _init_belief_worker(priors)
+        for group in tqdm.tqdm(groups):
+            beliefs.update(_score_group(group))
+    return beliefs
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='DB Belief Score Dumper')
     parser.add_argument('--fname',
@@ -209,8 +522,21 @@ if __name__ == '__main__':
                         default=False,
                         help='Upload belief dict to the bigmech s3 bucket '
                              'instead of saving it locally')
+    parser.add_argument('--from-counts',
+                        action='store_true',
+                        default=False,
+                        help='Calculate belief from counts of evidence by '
+                             'source rather than from mock statements')
+    parser.add_argument('-n', '--num-procs',
+                        type=int,
+                        default=1,
+                        help='The number of processes used to calculate '
+                             'belief from counts')
     args = parser.parse_args()
-    belief_dict = get_belief()
+    if args.from_counts:
+        belief_dict = get_belief_from_counts(n_proc=args.num_procs)
+    else:
+        belief_dict = get_belief()
     if args.s3:
         key = '/'.join([datetime.utcnow().strftime('%Y-%m-%d'), args.fname])
         s3_path = S3Path(S3_SUBDIR, key)
@@ -4,6 +4,7 @@ import os
 import random
 import re
 import csv
+import json
 import tarfile
 from itertools import islice
 import click
@@ -11,15 +12,19 @@ import zlib
 import logging
 import pickle
 import xml.etree.ElementTree as ET
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from multiprocessing.pool import Pool
+from queue import Queue, Empty
+from threading import Thread, Event
 
-from io import BytesIO
+from io import BytesIO, StringIO
 from ftplib import FTP
 from functools import wraps
 from datetime import datetime, timedelta
 from os import path, remove, rename, listdir
 from typing import Tuple
 
+import requests
 from tqdm import tqdm
 
 from indra.literature.elsevier_client import has_full_text
@@ -29,6 +34,8 @@ from indra.util import UnicodeXMLTreeBuilder as UTB
 from indra_db.databases import texttypes, formats
 from indra_db.databases import sql_expressions as sql_exp
 from indra_db.util.data_gatherer import DataGatherer, DGContext
+from indra_db.util.fetcher import ConcurrentFetcher, PersistentCache
+from indra_db.util.helpers import imap_bounded
 from sqlalchemy import exists, and_, literal
 from sqlalchemy.orm import aliased
 from .util import format_date
@@ -217,6 +224,25 @@ def get_clean_id(db, id_type, id_val):
     return id_val
 
 
+# The columns staged for each id type when matching against text refs, and the
+# (join, filter) conditions used to match them: first on the indexed numeric
+# parts of the id, and second on the raw id, for ids that could not be parsed.
+_tr_match_cols = {
+    'pmid': ('pmid', 'pmid_num'),
+    'pmcid': ('pmcid', 'pmcid_num'),
+    'doi': ('doi', 'doi_ns', 'doi_id'),
+}
+_tr_match_joins = {
+    'pmid': [('tr.pmid_num = t.pmid_num', 'tr.pmid = t.pmid'),
+             ('tr.pmid = t.pmid', 't.pmid_num IS NULL')],
+    'pmcid': [('tr.pmcid_num = t.pmcid_num', 'tr.pmcid = t.pmcid'),
+              ('tr.pmcid = t.pmcid', 't.pmcid_num IS NULL')],
+    'doi': [('(tr.doi_ns, tr.doi_id) = (t.doi_ns, t.doi_id)',
+             'tr.doi = t.doi'),
+            ('tr.doi = t.doi', 't.doi_ns IS NULL')],
+}
+
+
 class ContentManager(object):
     """Abstract class for all upload/update managers.
 
@@ -321,101 +347,144 @@ class ContentManager(object):
             f.write(msg + '\n')
         return
 
+    def _stage_text_ref_matches(self, db, tr_records, match_id_types):
+        """Find the text refs on the db that match any of the given records.
+
+        The cleaned ids of the records are staged in a temporary table using
+        COPY, and joined against `text_ref` on the (indexed) normalized id
+        columns, one id type at a time.
+
+        Returns
+        -------
+        tr_rows : dict
+            A dict of light-weight text ref rows (with `id` and the `tr_cols`
+            as attributes) keyed by text ref id.
+        matches : dict
+            A dict keyed by text ref id of the sets of records that matched
+            the text ref.
+        """
+        # Index the records by their cleaned ids. If multiple records share an
+        # id, only the last one is matched on that id.
+        record_idx = {}
+        for id_type in match_id_types:
+            type_idx = {}
+            for i, record in enumerate(tr_records):
+                id_val = record[self.tr_cols.index(id_type)]
+                try:
+                    id_val = get_clean_id(db, id_type, id_val)
+                except Exception:
+                    logger.warning(f"Id of type {id_type} malformed: {id_val}")
+                if id_val is not None:
+                    type_idx[id_val] = i
+            record_idx[id_type] = {i: id_val for id_val, i in type_idx.items()}
+
+        # Format the rows to be staged.
+        stage_cols = ['idx']
+        for id_type in match_id_types:
+            stage_cols.extend(_tr_match_cols.get(id_type, (id_type,)))
+        rows = []
+        for i in range(len(tr_records)):
+            row = [i]
+            for id_type in match_id_types:
+                id_val = record_idx[id_type].get(i)
+                if id_type == 'pmid':
+                    row.extend(db.TextRef.process_pmid(id_val)
+                               if isinstance(id_val, str) else (id_val, None))
+                elif id_type == 'pmcid':
+                    row.extend(db.TextRef.process_pmcid(id_val)[:2]
+                               if isinstance(id_val, str) else (id_val, None))
+                elif id_type == 'doi':
+                    row.extend(db.TextRef.process_doi(id_val)
+                               if isinstance(id_val, str)
+                               else (id_val, None, None))
+                else:
+                    row.append(id_val)
+            rows.append(row)
+
+        # Missing ids are written as unquoted empty fields, which COPY reads
+        # as NULL (a quoted empty string would be read as an empty string).
+        buf = StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+
+        # Build the query, one UNION term per join condition.
+        ret_cols = ', '.join(f'tr."{col}"' for col in ('id',) + self.tr_cols)
+        terms = []
+        for id_type in match_id_types:
+            joins = _tr_match_joins.get(id_type,
+                                        [(f'tr."{id_type}" = t."{id_type}"',
+                                          'true')])
+            for on_clause, where_clause in joins:
+                terms.append(f'SELECT t.idx, {ret_cols}\n'
+                             f'FROM tmp_tr_match AS t\n'
+                             f'  JOIN text_ref AS tr ON {on_clause}\n'
+                             f'WHERE {where_clause}')
+        stage_col_str = ', '.join(f'"{col}"' for col in stage_cols[1:])
+        cur = db.get_copy_cursor()
+        cur.execute(f'CREATE TEMP TABLE tmp_tr_match ON COMMIT DROP AS\n'
+                    f'SELECT id AS idx, {stage_col_str} FROM text_ref\n'
+                    f'WITH NO DATA;')
+        cur.copy_expert(f'COPY tmp_tr_match (idx, {stage_col_str}) '
+                        f'FROM STDIN WITH (FORMAT csv, NULL \'\');', buf)
+        cur.execute('ANALYZE tmp_tr_match;')
+        cur.execute('\nUNION\n'.join(terms) + ';')
+        res = cur.fetchall()
+        db.commit_copy("Failed to match text refs.")
+
+        # Tabulate the results.
+        TextRefRow = namedtuple('TextRefRow', ('id',) + self.tr_cols)
+        tr_rows = {}
+        matches = defaultdict(set)
+        for idx, *tr_vals in res:
+            tr_row = TextRefRow(*tr_vals)
+            tr_rows[tr_row.id] = tr_row
+            matches[tr_row.id].add(tr_records[idx])
+        return tr_rows, matches
+
     def filter_text_refs(self, db, tr_data_set, primary_id_types=None):
         """Try to reconcile the data we have with what's already on the db.
 
-        Note that this method is VERY slow in general, and therefore should
-        be avoided whenever possible.
+        The ids of the new data are staged on the database and joined with
+        the existing text refs (see `_stage_text_ref_matches`), so only the
+        text refs that actually match are returned, and the matching itself
+        is done by Postgres using the id indices.
 
-        The process can be sped up considerably by multiple orders of
-        magnitude if you specify a limited set of id types to query to get
-        text refs. This does leave some possibility of missing relevant refs.
+        Limiting the set of id types used to match refs (`primary_id_types`)
+        will still speed things up, at some risk of missing relevant refs.
         """
         logger.info("Beginning to filter %d text refs..." % len(tr_data_set))
 
         # If there are not actual refs to work with, don't waste time.
         N = len(tr_data_set)
         if not N:
-            return set(), []
+            return set(), [], {}
 
-        # Get all text refs that match any of the id data we have.
-        logger.debug("Getting list of existing text refs...")
-        or_list = []
         if primary_id_types is not None:
             match_id_types = primary_id_types
         else:
             match_id_types = self.tr_cols
 
-        # This is a helper for accessing the data tuples we create
-        def id_idx(id_type):
-            return self.tr_cols.index(id_type)
-
-        # Get IDs from the tr_data_set that have one or more of the listed
-        # id types.
-        for id_type in match_id_types:
-            id_list = [entry[id_idx(id_type)] for entry in tr_data_set
-                       if entry[id_idx(id_type)] is not None]
-            # Add SqlAlchemy filter clause based on ID list for this ID type
-            if id_list:
-                if id_type == 'pmid':
-                    term = db.TextRef.pmid_in(id_list, filter_ids=True)
-                    bad_ids = [pmid for pmid in id_list
-                               if not all(db.TextRef.process_pmid(pmid))]
-                elif id_type == 'pmcid':
-                    term = db.TextRef.pmcid_in(id_list, filter_ids=True)
-                    bad_ids = [pmcid for pmcid in id_list
-                               if not all(db.TextRef.process_pmcid(pmcid)[:2])]
-                elif id_type == 'doi':
-                    term = db.TextRef.doi_in(id_list, filter_ids=True)
-                    bad_ids = [doi for doi in id_list
-                               if not all(db.TextRef.process_doi(doi))]
-                else:
-                    term = getattr(db.TextRef, id_type).in_(id_list)
-                    bad_ids = []
-                or_list.append(term)
-                if bad_ids:
-                    logger.info("Handling %d malformed '%s's with separate "
-                                "query." % (len(bad_ids), id_type))
-                    or_list.append(getattr(db.TextRef, id_type).in_(bad_ids))
-        if len(or_list) == 1:
-            tr_list = db.select_all(db.TextRef, or_list[0])
-        else:
-            tr_list = db.select_all(db.TextRef, sql_exp.or_(*or_list))
-        logger.debug("Found %d potentially relevant text refs." % len(tr_list))
-
-        # Create an index of tupled data entries for quick lookups by any id
-        # type, for example tr_data_idx_dict['pmid'][<a pmid>] will get the
-        # tuple with all the id data.
-        logger.debug("Building index of new data...")
-        tr_data_idx_dict = {}
-        for id_type in match_id_types:
-            tr_data_idx = {}
-            for entry in tr_data_set:
-                id_val = entry[id_idx(id_type)]
-                try:
-                    id_val = get_clean_id(db, id_type, id_val)
-                except Exception as err:
-                    logger.warning(f"Id of type {id_type} malformed: {id_val}")
-
-                if id_val is not None:
-                    tr_data_idx[id_val] = entry
-            tr_data_idx_dict[id_type] = tr_data_idx
-            del tr_data_idx
+        # Get all text refs that match any of the id data we have.
+        logger.debug("Matching against existing text refs...")
+        tr_records = list(tr_data_set)
+        tr_rows, tr_matches = self._stage_text_ref_matches(db, tr_records,
+                                                           match_id_types)
+        logger.debug("Found %d potentially relevant text refs." % len(tr_rows))
 
         # Look for updates to the existing text refs
         logger.debug("Beginning to iterate over text refs...")
-        tr_data_match_list = []
+        matched_records = set()
         flawed_tr_data = []
         multi_match_records = set()
         update_dict = {}
 
         def add_to_found_record_list(record):
-            # Adds a record tuple from tr_data_list to tr_data_match_list and
+            # Adds a record tuple from tr_data_list to matched_records and
             # return True on success. If the record has multiple matches in
             # the database then we wouldn't know which one to update--hence
             # we record for review and return False for failure.
-            if record not in tr_data_match_list:
-                tr_data_match_list.append(record)
+            if record not in matched_records:
+                matched_records.add(record)
                 added = True
             else:
                 self.add_to_review(
@@ -428,22 +497,14 @@ class ContentManager(object):
                 added = False
             return added
 
-        for tr in tr_list:
-            match_set = set()
-
+        for trid, tr in tr_rows.items():
             # Find the matches in the data. Multiple distinct matches indicate
             # problems, and are flagged.
-            for id_type, tr_data_idx in tr_data_idx_dict.items():
-                candidate = tr_data_idx.get(getattr(tr, id_type))
-                if candidate is not None:
-                    match_set.add(candidate)
-
-            # Every tr MUST have a match, or else something is broken.
-            assert match_set, "No matches found, which is impossible."
+            match_set = tr_matches[trid]
 
             # Given a unique match, update any missing ids from the input data.
             if len(match_set) == 1:
-                tr_new = match_set.pop()
+                tr_new = next(iter(match_set))
 
                 # Add this record to the match list, unless there are conflicts
                 # If there are conflicts (multiple matches in the DB) then
@@ -482,7 +543,7 @@ class ContentManager(object):
                             all_good = False
 
                 if all_good and len(id_updates):
-                    update_dict[tr.id] = (tr, id_updates, tr_new)
+                    update_dict[tr.id] = (id_updates, tr_new)
             else:
                 # These still matched something in the db, so they shouldn't be
                 # uploaded as new refs.
@@ -497,24 +558,28 @@ class ContentManager(object):
                     'Multiple matches for %s from %s: %s.'
                     % (self.make_text_ref_str(tr), self.my_source, match_set))
 
-        # Apply ID updates to TextRefs with unique matches in tr_data_set
+        # Apply ID updates to TextRefs with unique matches in tr_data_set. Only
+        # the text refs that are actually updated are loaded as objects.
         logger.info("Applying %d updates." % len(update_dict))
+        for trid, (id_updates, record) in list(update_dict.items()):
+            if record in multi_match_records:
+                logger.warning("Skipping update of text ref %d with %s due "
+                               "to multiple matches to record %s."
+                               % (trid, id_updates, record))
+                del update_dict[trid]
         updated_id_map = {}
-        for tr, id_updates, record in update_dict.values():
-            if record not in multi_match_records:
+        for id_batch in batch_iter(list(update_dict.keys()), 10000):
+            for tr in db.select_all(db.TextRef, db.TextRef.id.in_(id_batch)):
+                id_updates, _ = update_dict[tr.id]
                 tr.update(**id_updates)
                 updated_id_map[tr.pmid] = tr.id
-            else:
-                logger.warning("Skipping update of text ref %d with %s due "
-                               "to multiple matches to record %s."
-                               % (tr.id, id_updates, record))
 
         # This applies all the changes made to the text refs to the db.
         logger.debug("Committing changes...")
         db.commit("Failed to update with new ids.")
 
         # Now update the text refs with any new refs that were found
-        filtered_tr_records = tr_data_set - set(tr_data_match_list) \
+        filtered_tr_records = tr_data_set - matched_records \
             - multi_match_records
 
         logger.debug("Filtering complete! %d records remaining."
@@ -601,6 +666,52 @@ def summarize_content_labels(label_list):
     return archive_stats
 
 
+def _get_pubmed_records(article_info, tr_cols, categories):
+    """Get ref and content data for each article in a parsed pubmed file.
+
+    Yields a (pmid, text ref dict, text content list) tuple for each PMID.
+    """
+    for pmid, data in article_info.items():
+        # Extract the ref data.
+        tr = {'pmid': pmid}
+        for id_type in tr_cols[1:]:
+            val = None
+            if id_type == 'pub_year':
+                r = data.get('publication_date')
+                if 'year' in r:
+                    val = r['year']
+            else:
+                r = data.get(id_type)
+                if id_type == 'doi':
+                    r = Pubmed.fix_doi(r)
+                if r:
+                    val = r.strip().upper()
+            tr[id_type] = val
+            tr['annotations'] = data['mesh_annotations']
+
+        # Extract the content data
+        tc_list = []
+        for text_type in categories:
+            content = data.get(text_type)
+            if content and content.strip():
+                tc = {'pmid': pmid, 'text_type': text_type,
+                      'content': zip_string(content)}
+                tc_list.append(tc)
+        yield pmid, tr, tc_list
+
+
+def _parse_pubmed_file(job):
+    """Download and parse a pubmed XML file in a worker process."""
+    from indra.literature.pubmed_client import get_metadata_from_xml_tree
+
+    ftp, xml_file, tr_cols, categories = job
+    tree = ftp.get_xml_file(xml_file)
+    article_info = get_metadata_from_xml_tree(tree, get_abstracts=True,
+                                              prepend_title=False)
+    return xml_file, list(_get_pubmed_records(article_info, tr_cols,
+                                              categories))
+
+
 class Pubmed(_NihManager):
     """Manager for the pubmed/medline content.
 
@@ -631,7 +742,6 @@ class Pubmed(_NihManager):
         else:
             self.tables = tables[:]
 
-        self.db_pmids = None
         self.max_annotations = max_annotations
         self.num_annotations = 0
         self.annotations = {}
@@ -741,7 +851,7 @@ class Pubmed(_NihManager):
         gatherer.add('content', len(new_trids))
         return
 
-    def iter_contents(self, archives=None):
+    def iter_contents(self, archives=None, n_procs=1):
         """Iterate over the files in the archive, yielding ref and content data.
 
         Parameters
@@ -749,6 +859,11 @@ class Pubmed(_NihManager):
         archives : Optional[Iterable[str]]
             The names of the archive files from the FTP server to processes. If
             None, all available archives will be iterated over.
+        n_procs : Optional[int]
+            The number of worker processes used to download and parse the XML
+            files. The results are still yielded in the order of the files,
+            and only a few files are parsed ahead of the one being consumed.
+            Default is 1, in which case the files are parsed in this process.
 
         Yields
         ------
@@ -760,58 +875,49 @@ class Pubmed(_NihManager):
         text_content_dict : dict
             A dictionary containing the text content information.
         """
-        from indra.literature.pubmed_client import get_metadata_from_xml_tree
-
         if archives is None:
             archives = self.get_file_list('baseline') \
                        + self.get_file_list('updatefiles')
 
         invalid_pmids = set(self.get_deleted_pmids())
 
-        for xml_file in sorted(archives):
-            # Parse the XML file.
-            tree = self.ftp.get_xml_file(xml_file)
-            article_info = get_metadata_from_xml_tree(tree, get_abstracts=True,
-                                                      prepend_title=False)
-
-            # Filter out any PMIDs that have been deleted.
-            valid_article_pmids = set(article_info.keys()) - invalid_pmids
-
-            # Yield results for each PMID.
-            num_records = len(valid_article_pmids)
-            for idx, pmid in enumerate(valid_article_pmids):
-                data = article_info[pmid]
-
-                # Extract the ref data.
-                tr = {'pmid': pmid}
-                for id_type in self.tr_cols[1:]:
-                    val = None
-                    if id_type == 'pub_year':
-                        r = data.get('publication_date')
-                        if 'year' in r:
-                            val = r['year']
-                    else:
-                        r = data.get(id_type)
-                        if id_type == 'doi':
-                            r = self.fix_doi(r)
-                        if r:
-                            val = r.strip().upper()
-                    tr[id_type] = val
-                    tr['annotations'] = data['mesh_annotations']
-
-                # Extract the content data
-                tc_list = []
-                for text_type in self.categories:
-                    content = article_info[pmid].get(text_type)
-                    if content and content.strip():
-                        tc = {'pmid': pmid, 'text_type': text_type,
-                              'content': zip_string(content)}
-                        tc_list.append(tc)
-                yield (xml_file, idx, num_records), tr, tc_list
+        jobs = ((self.ftp, xml_file, self.tr_cols, self.categories)
+                for xml_file in sorted(archives))
+        if n_procs <= 1:
+            parsed_files = map(_parse_pubmed_file, jobs)
+            pool = None
+        else:
+            pool = Pool(n_procs)
+            parsed_files = imap_bounded(pool, _parse_pubmed_file, jobs,
+                                        max_in_flight=2*n_procs)
+
+        try:
+            for xml_file, records in parsed_files:
+                # Filter out any PMIDs that have been deleted.
+                records = [rec for rec in records
+                           if rec[0] not in invalid_pmids]
+
+                # Yield results for each PMID.
+                num_records = len(records)
+                for idx, (pmid, tr, tc_list) in enumerate(records):
+                    yield (xml_file, idx, num_records), tr, tc_list
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
 
     def load_files(self, db, files, continuing=False, carefully=False,
-                   log_update=True):
-        """Load the files in subdirectory indicated by ``dirname``."""
+                   log_update=True, n_procs=1):
+        """Load the files in subdirectory indicated by ``dirname``.
+
+        If `n_procs` is greater than 1, the files are downloaded and parsed by
+        a pool of worker processes, while this process alone writes the
+        results to the database, in the order of the files.
+
+        A file is only marked as complete in the `source_file` table once all
+        of its refs, content, and annotations have been committed, so an
+        interrupted load may be safely resumed with `continuing=True`.
+        """
         if 'text_ref' not in self.tables:
             logger.info("Loading pmids from the database...")
             self.db_pmids = {pmid for pmid, in db.select_all(db.TextRef.pmid)}
@@ -836,7 +942,7 @@ class Pubmed(_NihManager):
             logger.info(f"{len(files)} new files to process.")
 
         batch_size = 10000
-        contents = self.iter_contents(files)
+        contents = self.iter_contents(files, n_procs=n_procs)
         batched_contents = batch_iter(contents, batch_size, lambda g: zip(*g))
         for i, (label_batch, tr_batch, tc_batch) in enumerate(batched_contents):
 
@@ -857,11 +963,20 @@ class Pubmed(_NihManager):
             self.load_text_content(db, expanded_tcs, id_map)
 
             # Check if we finished an xml file.
-            for file_name, info in archive_stats.items():
-                if info['max'] == info['tot']:
-                    if log_update and file_name not in existing_files:
-                        db.insert('source_file', source=self.my_source,
-                                  name=file_name)
+            finished_files = [
+                file_name for file_name, info in archive_stats.items()
+                if info['max'] == info['tot'] and file_name not in existing_files
+            ]
+            if finished_files and log_update:
+                # Make sure the annotations from the finished files are on the
+                # db before the files are marked as done.
+                self.dump_annotations(db)
+                self.annotations = {}
+                self.num_annotations = 0
+                db.copy_lazy('source_file',
+                             [(self.my_source, file_name)
+                              for file_name in finished_files],
+                             ('source', 'name'))
         self.dump_annotations(db)
 
         return True
@@ -901,7 +1016,7 @@ class Pubmed(_NihManager):
 
     @ContentManager._record_for_review
     @DGContext.wrap(gatherer, 'pubmed')
-    def populate(self, db, continuing=False):
+    def populate(self, db, continuing=False, n_procs=1):
         """Perform the initial input of the pubmed content into the database.
 
         Parameters
@@ -913,17 +1028,80 @@ class Pubmed(_NihManager):
             continuing from an earlier process. This means we will skip over
             source files contained in the database. If false, all files will be
             read and parsed.
+        n_procs : int
+            The number of processes used to download and parse the XML files.
+            Default is 1.
         """
         files = self.get_file_list('baseline')
-        return self.load_files(db, files, continuing, False)
+        return self.load_files(db, files, continuing, False, n_procs=n_procs)
 
     @ContentManager._record_for_review
     @DGContext.wrap(gatherer, 'pubmed')
-    def update(self, db):
+    def update(self, db, n_procs=1):
         """Update the contents of the database with the latest articles."""
         files = self.get_file_list('baseline') \
             + self.get_file_list('updatefiles')
-        return self.load_files(db, files, True, True)
+        return self.load_files(db, files, True, True, n_procs=n_procs)
+
+
+def _parse_pmc_xml_str(xml_str, filename, tr_cols):
+    """Get the ref and content data out of a PMC xml string.
+
+    This is kept at the module level (and free of any license lookup) so that
+    it can be sent to worker processes without pickling the whole manager.
+    """
+    # Load the XML
+    try:
+        tree = ET.XML(xml_str.encode('utf8'))
+    except ET.ParseError:
+        logger.info("Could not parse %s. Skipping." % filename)
+        return None
+
+    # Get the ID information from the XML.
+    id_data = {
+        e.get('pub-id-type'): e.text for e in
+        tree.findall('.//article-id')
+        }
+    if 'pmcid' not in id_data.keys():
+        if 'pmc' in id_data.keys():
+            if id_data['pmc'].startswith('PMC'):
+                pmcid = id_data['pmc']
+            else:
+                pmcid = 'PMC' + id_data['pmc']
+        else:
+            pmcid = filename.split('/')[1].split('.')[0]
+        id_data['pmcid'] = pmcid
+        logger.info('Processing XML for %s.' % pmcid)
+    if 'manuscript' in id_data.keys():
+        id_data['manuscript_id'] = id_data['manuscript']
+
+    # Get the year from the XML
+    year = None
+    for elem in tree.findall('.//article-meta/pub-date'):
+        year_elem = elem.find('year')
+        if year_elem is not None:
+            year = int(year_elem.text)
+            break
+
+    # Format the text ref datum.
+    tr_datum_raw = {k: id_data.get(k) for k in tr_cols}
+    tr_datum = {k: val.strip().upper() if val is not None else None
+                for k, val in tr_datum_raw.items()}
+    tr_datum['pub_year'] = year
+
+    # Format the text content datum.
+    tc_datum = {
+        'pmcid': id_data['pmcid'],
+        'text_type': texttypes.FULLTEXT,
+        'content': zip_string(xml_str)
+        }
+    return tr_datum, tc_datum
+
+
+def _parse_pmc_xml_job(job):
+    """Unpack a job from `PmcManager.iter_contents` for a worker process."""
+    label, file_name, xml_str, tr_cols = job
+    return label, file_name, _parse_pmc_xml_str(xml_str, file_name, tr_cols)
 
 
 class PmcManager(_NihManager):
@@ -1070,52 +1248,11 @@ class PmcManager(_NihManager):
 
     def get_data_from_xml_str(self, xml_str, filename):
         """Get the data out of the xml string."""
-        # Load the XML
-        try:
-            tree = ET.XML(xml_str.encode('utf8'))
-        except ET.ParseError:
-            logger.info("Could not parse %s. Skipping." % filename)
+        res = _parse_pmc_xml_str(xml_str, filename, self.tr_cols)
+        if res is None:
             return None
-
-        # Get the ID information from the XML.
-        id_data = {
-            e.get('pub-id-type'): e.text for e in
-            tree.findall('.//article-id')
-            }
-        if 'pmcid' not in id_data.keys():
-            if 'pmc' in id_data.keys():
-                if id_data['pmc'].startswith('PMC'):
-                    pmcid = id_data['pmc']
-                else:
-                    pmcid = 'PMC' + id_data['pmc']
-            else:
-                pmcid = filename.split('/')[1].split('.')[0]
-            id_data['pmcid'] = pmcid
-            logger.info('Processing XML for %s.' % pmcid)
-        if 'manuscript' in id_data.keys():
-            id_data['manuscript_id'] = id_data['manuscript']
-
-        # Get the year from the XML
-        year = None
-        for elem in tree.findall('.//article-meta/pub-date'):
-            year_elem = elem.find('year')
-            if year_elem is not None:
-                year = int(year_elem.text)
-                break
-
-        # Format the text ref datum.
-        tr_datum_raw = {k: id_data.get(k) for k in self.tr_cols}
-        tr_datum = {k: val.strip().upper() if val is not None else None
-                    for k, val in tr_datum_raw.items()}
-        tr_datum['pub_year'] = year
-
-        # Format the text content datum.
-        tc_datum = {
-            'pmcid': id_data['pmcid'],
-            'text_type': texttypes.FULLTEXT,
-            'license': self.get_license(id_data['pmcid']),
-            'content': zip_string(xml_str)
-            }
+        tr_datum, tc_datum = res
+        tc_datum['license'] = self.get_license(tc_datum['pmcid'])
         return tr_datum, tc_datum
 
     def get_license(self, pmcid):
@@ -1147,7 +1284,70 @@ class PmcManager(_NihManager):
             raise
         return archive_local_path
 
-    def iter_xmls(self, archives=None, continuing=False, pmcid_set=None):
+    def _iter_archive_paths(self, archives, continuing=False, prefetch=0):
+        """Yield (archive, local path) pairs, downloading ahead if requested.
+
+        If `prefetch` is greater than 0, a background thread downloads up to
+        that many archives ahead of the one currently being consumed, so the
+        network transfer overlaps with the extraction and parsing.
+        """
+        if prefetch <= 0:
+            for archive in archives:
+                try:
+                    yield archive, self.download_archive(archive, continuing)
+                except ftplib.Error as e:
+                    logger.warning(f"Failed to download {archive}: {e}")
+                    logger.info(f"Skipping {archive}...")
+            return
+
+        done = object()
+        q = Queue(maxsize=prefetch)
+        stop = Event()
+
+        def download_all():
+            try:
+                for archive in archives:
+                    if stop.is_set():
+                        break
+                    try:
+                        archive_path = self.download_archive(archive,
+                                                             continuing)
+                    except ftplib.Error as e:
+                        logger.warning(f"Failed to download {archive}: {e}")
+                        logger.info(f"Skipping {archive}...")
+                        continue
+                    q.put((archive, archive_path))
+            except BaseException as e:
+                q.put(e)
+            finally:
+                q.put(done)
+
+        th = Thread(target=download_all, daemon=True)
+        th.start()
+        try:
+            while True:
+                item = q.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Let the downloader finish its current archive and quit, and
+            # delete the archives it downloaded that were never used.
+            stop.set()
+            while th.is_alive() or not q.empty():
+                try:
+                    item = q.get(timeout=1)
+                except Empty:
+                    continue
+                if isinstance(item, tuple):
+                    archive, archive_path = item
+                    logger.info(f"Deleting unused prefetched {archive}.")
+                    remove(archive_path)
+
+    def iter_xmls(self, archives=None, continuing=False, pmcid_set=None,
+                  prefetch=0):
         """Iterate over the xmls in the given archives.
 
         Parameters
@@ -1164,6 +1364,10 @@ class PmcManager(_NihManager):
             papers in each, and only a fraction may need to be returned.
             Extracting and processing XMLs can be time consuming, so skipping
             those you don't need can really pay off!
+        prefetch : Optional[int]
+            The number of archives to download ahead of the one currently
+            being extracted, in a background thread. Default is 0, meaning
+            each archive is downloaded only when it is needed.
 
         Yields
         ------
@@ -1188,14 +1392,9 @@ class PmcManager(_NihManager):
             desired_files -= {'~'}
 
         # Yield the contents from each archive.
-        for archive in sorted(archives):
-            try:
-                archive_path = self.download_archive(archive, continuing)
-            except ftplib.Error as e:
-                logger.warning(f"Failed to download {archive}: {e}")
-                logger.info(f"Skipping {archive}...")
-                continue
-
+        archive_paths = self._iter_archive_paths(sorted(archives), continuing,
+                                                 prefetch)
+        for archive, archive_path in archive_paths:
             num_yielded = 0
             with tarfile.open(archive_path, mode='r:gz') as tar:
 
@@ -1234,7 +1433,8 @@ class PmcManager(_NihManager):
                         f"XMLs.")
             remove(archive_path)
 
-    def iter_contents(self, archives=None, continuing=False, pmcid_set=None):
+    def iter_contents(self, archives=None, continuing=False, pmcid_set=None,
+                      n_procs=1, prefetch=0):
         """Iterate over the files in the archive, yielding ref and content data.
 
         Parameters
@@ -1251,6 +1451,13 @@ class PmcManager(_NihManager):
             papers in each, and only a fraction may need to be returned.
             Extracting and processing XMLs can be time consuming, so skipping
             those you don't need can really pay off!
+        n_procs : Optional[int]
+            The number of worker processes used to parse the XMLs. Only a
+            few XMLs per worker are parsed ahead of the one being consumed.
+            Default is 1, in which case the XMLs are parsed in this process.
+        prefetch : Optional[int]
+            The number of archives to download ahead of time in the
+            background (see `iter_xmls`). Default is 0.
 
         Yields
         ------
@@ -1262,15 +1469,31 @@ class PmcManager(_NihManager):
         text_content_dict : dict
             A dictionary containing the text content information.
         """
-        xml_iter = self.iter_xmls(archives, continuing, pmcid_set)
-        for label, file_name, xml_str in xml_iter:
-            logger.info(f"Getting data from {file_name}")
-            res = self.get_data_from_xml_str(xml_str, file_name)
-            if res is None:
-                continue
-            tr, tc = res
-            logger.info(f"Yielding ref and content for {file_name}.")
-            yield label, tr, tc
+        xml_iter = self.iter_xmls(archives, continuing, pmcid_set, prefetch)
+        if n_procs <= 1:
+            for label, file_name, xml_str in xml_iter:
+                logger.info(f"Getting data from {file_name}")
+                res = self.get_data_from_xml_str(xml_str, file_name)
+                if res is None:
+                    continue
+                tr, tc = res
+                logger.info(f"Yielding ref and content for {file_name}.")
+                yield label, tr, tc
+            return
+
+        # Parse in a pool of workers. The order of results is preserved, so
+        # the labels still tell us when an archive has been completed.
+        jobs = ((label, file_name, xml_str, self.tr_cols)
+                for label, file_name, xml_str in xml_iter)
+        with Pool(n_procs) as pool:
+            for label, file_name, res in imap_bounded(
+                    pool, _parse_pmc_xml_job, jobs,
+                    max_in_flight=10*n_procs):
+                if res is None:
+                    continue
+                tr, tc = res
+                tc['license'] = self.get_license(tc['pmcid'])
+                yield label, tr, tc
 
     def is_archive(self, *args):
         raise NotImplementedError("is_archive must be defined by the child.")
@@ -1278,8 +1501,22 @@ class PmcManager(_NihManager):
     def get_all_archives(self):
         return [k for k in self.ftp.ftp_ls() if self.is_archive(k)]
 
+    def _record_finished_archives(self, db, archive_stats):
+        """Add a source file entry for any archive completed in a batch."""
+        for archive_name, info in archive_stats.items():
+            if info['max'] == info['tot']:
+                sf_list = db.select_all(
+                    db.SourceFile,
+                    db.SourceFile.source == self.my_source,
+                    db.SourceFile.name == archive_name
+                )
+                if not sf_list:
+                    db.insert('source_file', source=self.my_source,
+                              name=archive_name)
+
     def upload_archives(self, db, archives=None, continuing=False,
-                        pmcid_set=None, batch_size=10000):
+                        pmcid_set=None, batch_size=10000, n_procs=1,
+                        prefetch=None):
         """Do the grunt work of downloading and processing a list of archives.
 
         Parameters
@@ -1297,14 +1534,26 @@ class PmcManager(_NihManager):
         batch_size : Optional[int]
             Default is 10,000. The number of pieces of content to submit to the
             database at a time.
+        n_procs : Optional[int]
+            Default is 1. If greater than 1, the ingest runs concurrently:
+            archives are downloaded ahead in a background thread, the XMLs are
+            parsed by a pool of `n_procs` workers, and the batches are
+            uploaded to the database by a separate consumer thread, so that
+            the throughput is bounded by the network or the database rather
+            than by parsing on a single core.
+        prefetch : Optional[int]
+            The number of archives to download ahead of the one being parsed.
+            By default this is 0 in serial mode and 1 in concurrent mode.
         """
+        if prefetch is None:
+            prefetch = 1 if n_procs > 1 else 0
+
         # Form a generator over the content in batches.
-        contents = self.iter_contents(archives, continuing, pmcid_set)
+        contents = self.iter_contents(archives, continuing, pmcid_set,
+                                      n_procs=n_procs, prefetch=prefetch)
         batched_contents = batch_iter(contents, batch_size, lambda g: zip(*g))
 
-        # Upload each batch of content into the database.
-        for i, (lbls, trs, tcs) in enumerate(batched_contents):
-
+        def upload(i, lbls, trs, tcs):
             # Figure out where we are in the list of archives.
             archive_stats = summarize_content_labels(lbls)
 
@@ -1318,20 +1567,50 @@ class PmcManager(_NihManager):
             self.upload_batch(db, trs, tcs)
 
             # Check if we finished an archive
-            for archive_name, info in archive_stats.items():
-                if info['max'] == info['tot']:
-                    sf_list = db.select_all(
-                        db.SourceFile,
-                        db.SourceFile.source == self.my_source,
-                        db.SourceFile.name == archive_name
-                    )
-                    if not sf_list:
-                        db.insert('source_file', source=self.my_source,
-                                  name=archive_name)
+            self._record_finished_archives(db, archive_stats)
+
+        # Upload each batch of content into the database.
+        if n_procs <= 1:
+            for i, (lbls, trs, tcs) in enumerate(batched_contents):
+                upload(i, lbls, trs, tcs)
+            return
+
+        # Hand the batches off to a single consumer which alone talks to the
+        # database, keeping at most one batch waiting in the queue.
+        done = object()
+        q = Queue(maxsize=1)
+        errors = []
+
+        def consume():
+            while True:
+                item = q.get()
+                if item is done:
+                    return
+                if errors:
+                    continue
+                try:
+                    upload(*item)
+                except BaseException as e:
+                    logger.exception(e)
+                    errors.append(e)
+
+        th = Thread(target=consume)
+        th.start()
+        try:
+            for i, (lbls, trs, tcs) in enumerate(batched_contents):
+                if errors:
+                    break
+                q.put((i, lbls, trs, tcs))
+        finally:
+            q.put(done)
+            th.join()
+        if errors:
+            raise UploadError(f"Failed to upload batch: {errors[0]}") \
+                from errors[0]
 
     @ContentManager._record_for_review
     @DGContext.wrap(gatherer)
-    def populate(self, db, continuing=False):
+    def populate(self, db, continuing=False, n_procs=1):
         """Perform the initial population of the pmc content into the database.
 
         Parameters
@@ -1343,6 +1622,10 @@ class PmcManager(_NihManager):
             otherwise continuing from an earlier process. This means we will
             skip over source files contained in the database. If false, all
             files will be read and parsed.
+        n_procs : int
+            The number of processes used to parse XMLs. If greater than 1,
+            downloading, parsing, and uploading are run concurrently (see
+            `upload_archives`). Default is 1.
 
         Returns
         -------
@@ -1368,7 +1651,8 @@ class PmcManager(_NihManager):
                 logger.info("No archives to load. All done.")
                 return False
 
-        self.upload_archives(db, archives, continuing=continuing)
+        self.upload_archives(db, archives, continuing=continuing,
+                             n_procs=n_procs)
         return True
 
     def get_pmcid_file_dict(self):
@@ -1438,7 +1722,7 @@ class PmcOA(PmcManager):
 
     @ContentManager._record_for_review
     @DGContext.wrap(gatherer, my_source)
-    def update(self, db):
+    def update(self, db, n_procs=1):
         logger.info("Finding all the PMC IDs that need to be updated.")
         load_pmcid_set = self.find_all_pmcids_need_update(db)
         logger.info("Getting archives for PMC IDs.")
@@ -1449,7 +1733,8 @@ class PmcOA(PmcManager):
         for archive, pmcid_set in sorted(archives_dict.items()):
             logging.info(f"Extracting {len(pmcid_set)} articles from "
                          f"{archive}.")
-            self.upload_archives(db, [archive], pmcid_set=pmcid_set)
+            self.upload_archives(db, [archive], pmcid_set=pmcid_set,
+                                 n_procs=n_procs)
         return True
 
     def find_all_pmcids_need_update(self, db, scope=None):
@@ -1604,7 +1889,7 @@ class Manuscripts(PmcManager):
 
     @ContentManager._record_for_review
     @DGContext.wrap(gatherer, my_source)
-    def update(self, db):
+    def update(self, db, n_procs=1):
         """Add any new content found in the archives.
 
         Note that this is very much the same as populating for manuscripts,
@@ -1643,23 +1928,106 @@ class Manuscripts(PmcManager):
             logging.info(f"Extracting {len(pmcid_set)} articles from "
                          f"{archive}.")
             self.upload_archives(db, [archive], pmcid_set=pmcid_set,
-                                 batch_size=500)
+                                 batch_size=500, n_procs=n_procs)
         return True
 
 
+def _get_crossref_publisher(doi):
+    """Get the publisher of a DOI from CrossRef.
+
+    Unlike indra's crossref client, which returns None for any failure (and
+    caches it with lru_cache), this returns None only if CrossRef does not
+    have the DOI, and raises on any other error so that it can be retried.
+    """
+    from indra.literature.crossref_client import crossref_url
+    res = requests.get(crossref_url + 'works/' + doi)
+    if res.status_code == 404:
+        return None
+    res.raise_for_status()
+    return (res.json().get('message') or {}).get('publisher')
+
+
+def _download_elsevier_article(id_tpl_json):
+    """Download an article from Elsevier given a json list of id pairs.
+
+    The ids are tried in order. None is returned if none of them are found,
+    and an error is raised on any other failure (such as breaking the rate
+    limit) so that it can be retried.
+    """
+    from indra import has_config, get_config
+    from indra.literature import elsevier_client
+
+    headers = {}
+    for header, key in [('X-ELS-APIKey', elsevier_client.API_KEY_ENV_NAME),
+                        ('X-ELS-Insttoken',
+                         elsevier_client.INST_KEY_ENV_NAME)]:
+        if has_config(key):
+            headers[header] = get_config(key)
+    for id_type, id_val in json.loads(id_tpl_json):
+        if id_type == 'pmid':
+            id_type = 'pubmed_id'
+        elif id_type == 'doi' and id_val.lower().startswith('doi:'):
+            id_val = id_val[4:]
+        url = '%s/%s' % (elsevier_client.elsevier_article_url_fmt % id_type,
+                         id_val)
+        res = requests.get(url, params={'httpAccept': 'text/xml'},
+                           headers=headers)
+        if res.status_code == 404:
+            continue
+        res.raise_for_status()
+        content_str = res.content.decode('utf-8')
+        if content_str.startswith('<service-error>'):
+            raise requests.HTTPError("Got a service error from Elsevier: %s"
+                                     % content_str)
+        return content_str
+    return None
+
+
 class Elsevier(ContentManager):
     """Content manager for maintaining content from Elsevier."""
     my_source = 'elsevier'
     tc_cols = ('text_ref_id', 'source', 'format', 'text_type',
                'content',)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, n_workers=4, rate=10, cache_path=None,
+                 **kwargs):
+        """Initialize the Elsevier content manager.
+
+        Parameters
+        ----------
+        n_workers : Optional[int]
+            The number of threads used to make web requests concurrently.
+            Default is 4.
+        rate : Optional[float]
+            The maximum number of requests per second, for each web service.
+            Default is 10.
+        cache_path : Optional[str]
+            The path to a sqlite file used to cache DOI->publisher lookups,
+            PMID->journal lookups, the articles that are not available, and
+            the ids of text refs that have already been checked. By default,
+            `elsevier_cache.sqlite` in the `indra_db` pystow directory.
+        """
         super(Elsevier, self).__init__(*args, **kwargs)
         with open(path.join(THIS_DIR, 'elsevier_titles.txt'), 'r') as f:
             self.__journal_set = {self.__regularize_title(t)
                                   for t in f.read().splitlines()}
         self.__found_journal_set = set()
         self.__matched_journal_set = set()
+
+        if cache_path is None:
+            import pystow
+            cache_path = pystow.join('indra_db', name='elsevier_cache.sqlite')
+        self.cache = PersistentCache(str(cache_path))
+        self.publisher_fetcher = ConcurrentFetcher(
+            _get_crossref_publisher, n_workers=n_workers, rate=rate,
+            cache=self.cache, cache_prefix='publisher:'
+        )
+        # Only the articles that are not available are cached, the content
+        # itself goes into the database.
+        self.content_fetcher = ConcurrentFetcher(
+            _download_elsevier_article, n_workers=n_workers, rate=rate,
+            cache=self.cache, cache_prefix='article:', cache_results=False
+        )
         return
 
     @staticmethod
@@ -1672,20 +2040,29 @@ class Elsevier(ContentManager):
     def __select_elsevier_refs(self, tr_set, max_retries=2):
         """Try to check if this content is available on Elsevier."""
         from indra.literature.pubmed_client import get_metadata_for_ids
-        from indra.literature.crossref_client import get_publisher
 
         elsevier_tr_set = set()
+        publishers = self.publisher_fetcher.fetch_all(
+            {tr.doi for tr in tr_set if tr.doi is not None}
+        )
         for tr in tr_set.copy():
             if tr.doi is not None:
-                publisher = get_publisher(tr.doi)
+                publisher = publishers.get(tr.doi)
                 if publisher is not None and\
                    publisher.lower() == "elsevier bv":
                     tr_set.remove(tr)
                     elsevier_tr_set.add(tr)
 
-        if tr_set:
-            pmid_set = {tr.pmid for tr in tr_set}
-            tr_dict = {tr.pmid: tr for tr in tr_set}
+        # Use the journal titles we have already looked up.
+        tr_dict = {tr.pmid: tr for tr in tr_set if tr.pmid is not None}
+        titles = set()
+        for pmid in list(tr_dict.keys()):
+            title = self.cache.get('journal:' + pmid)
+            if title is not None:
+                titles.add((pmid, title))
+        pmid_set = set(tr_dict.keys()) - {pmid for pmid, _ in titles}
+
+        if pmid_set:
             num_retries = 0
             meta_data_dict = None
             while num_retries < max_retries:
@@ -1706,26 +2083,36 @@ class Elsevier(ContentManager):
                         break
 
             if meta_data_dict is not None:
-                titles = {(pmid, meta['journal_title'])
-                          for pmid, meta in meta_data_dict.items()}
-                for pmid, title in titles:
-                    reg_title = self.__regularize_title(title)
-                    self.__found_journal_set.add(reg_title)
-                    if reg_title in self.__journal_set:
-                        self.__matched_journal_set.add(reg_title)
-                        elsevier_tr_set.add(tr_dict[pmid])
+                new_titles = {pmid: meta['journal_title']
+                              for pmid, meta in meta_data_dict.items()}
+                self.cache.set_many({'journal:' + pmid: title
+                                     for pmid, title in new_titles.items()
+                                     if title is not None})
+                titles |= set(new_titles.items())
+
+        for pmid, title in titles:
+            reg_title = self.__regularize_title(title)
+            self.__found_journal_set.add(reg_title)
+            if reg_title in self.__journal_set:
+                self.__matched_journal_set.add(reg_title)
+                elsevier_tr_set.add(tr_dict[pmid])
         return elsevier_tr_set
 
     def __get_content(self, trs):
         """Get the content."""
-        from indra.literature.elsevier_client import download_article_from_ids
-        article_tuples = set()
+        id_tpl_dict = {}
         for tr in trs:
-            id_dict = {id_type: getattr(tr, id_type)
-                       for id_type in ['doi', 'pmid', 'pii']
-                       if getattr(tr, id_type) is not None}
-            if id_dict:
-                content_str = download_article_from_ids(**id_dict)
+            id_tpl = tuple((id_type, getattr(tr, id_type))
+                           for id_type in ['doi', 'pmid', 'pii']
+                           if getattr(tr, id_type) is not None)
+            if id_tpl:
+                id_tpl_dict[tr] = json.dumps(id_tpl)
+        contents = self.content_fetcher.fetch_all(id_tpl_dict.values())
+
+        article_tuples = set()
+        for tr, id_tpl in id_tpl_dict.items():
+            if id_tpl in contents:
+                content_str = contents[id_tpl]
                 if content_str is not None:
                     if has_full_text(content_str):
                         text_type = texttypes.FULLTEXT
@@ -1745,14 +2132,16 @@ class Elsevier(ContentManager):
         self.copy_into_db(db, 'text_content', article_tuples, self.tc_cols)
         return
 
+    def _checkpoint_batch(self, tr_batch):
+        """Record that the text refs in a batch have been checked."""
+        self.cache.set_many({'checked:%d' % tr.id: True for tr in tr_batch})
+
     def _get_elsevier_content(self, db, tr_query, continuing=False):
         """Get the elsevier content given a text ref query object."""
-        pickle_stash_fname = path.join(THIS_DIR,
-                                       'checked_elsevier_trid_stash.pkl')
         tr_batch = set()
-        if continuing and path.exists(pickle_stash_fname):
-            with open(pickle_stash_fname, 'rb') as f:
-                tr_ids_checked = pickle.load(f)
+        if continuing:
+            tr_ids_checked = {int(key.split(':')[1])
+                              for key in self.cache.keys('checked:')}
             logger.info("Continuing; %d text refs already checked."
                         % len(tr_ids_checked))
         else:
@@ -1770,19 +2159,17 @@ class Elsevier(ContentManager):
                     batch_num += 1
                     logger.info('Beginning batch %d.' % batch_num)
                     self.__process_batch(db, tr_batch)
-                    tr_ids_checked |= {tr.id for tr in tr_batch}
+                    self._checkpoint_batch(tr_batch)
                     tr_batch.clear()
             if tr_batch:
                 logger.info('Loading final batch.')
                 self.__process_batch(db, tr_batch)
-                tr_ids_checked |= {tr.id for tr in tr_batch}
+                self._checkpoint_batch(tr_batch)
         except BaseException as e:
             logger.error("Caught exception while loading elsevier.")
             logger.exception(e)
-            with open(pickle_stash_fname, 'wb') as f:
-                pickle.dump(tr_ids_checked, f)
-            logger.info("Stashed the set of checked text ref ids in: %s"
-                        % pickle_stash_fname)
+            logger.info("The checked text ref ids are recorded in: %s"
+                        % self.cache.file_path)
             return False
         finally:
             with open('journals.pkl', 'wb') as f:
@@ -1803,6 +2190,8 @@ class Elsevier(ContentManager):
         """Load all available elsevier content for refs with no pmc content."""
         # Note that we do not implement multiprocessing, because by the nature
         # of the web API's used, we are limited by bandwidth from any one IP.
+        # Requests within a batch are instead made concurrently by threads,
+        # subject to the rate limit (see `__init__`).
         tr_w_pmc_q = db.filter_query(
             db.TextRef,
             db.TextRef.id == db.TextContent.text_ref_id,
@@ -1879,14 +2268,14 @@ class Elsevier(ContentManager):
 
 
     def get_content_from_pmids(self, pmids, pmid_tr_dict):
-        from indra.literature.elsevier_client import download_article_from_ids
         """Load PMIDs from a pickle file and retrieve Elsevier article content."""
         fulltext_count = 0
         abstract_count = 0
         article_tuples = set()
-        for pmid in pmids:
-            id_dict = {"pmid": pmid}
-            content_str = download_article_from_ids(**id_dict)
+        contents = self.content_fetcher.fetch_all(
+            (('pmid', pmid),) for pmid in pmids
+        )
+        for (_, pmid), content_str in contents.items():
             if content_str is not None:
                 if has_full_text(content_str):
                     fulltext_count += 1
@@ -2002,7 +2391,11 @@ def content():
                     'off.'))
 @click.option('-d', '--debug', is_flag=True,
               help='Run with debugging level output.')
-def run(task, sources, continuing, debug):
+@click.option('-n', '--n-procs', type=int, default=1,
+              help=('The number of processes used to parse the XML files. If '
+                    'more than 1, files are downloaded and parsed '
+                    'concurrently with the upload.'))
+def run(task, sources, continuing, debug, n_procs):
     """Upload/update text refs and content on the database.
 
     \b
@@ -2037,10 +2430,10 @@ def run(task, sources, continuing, debug):
     for ContentManager in selected_managers:
         if task == 'upload':
             print(f"Uploading {ContentManager.my_source}.")
-            ContentManager().populate(db, continuing)
+            ContentManager().populate(db, continuing, n_procs=n_procs)
         elif task == 'update':
             print(f"Updating {ContentManager.my_source}")
-            ContentManager().update(db)
+            ContentManager().update(db, n_procs=n_procs)
 
 
 @content.command()
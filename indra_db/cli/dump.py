@@ -1,5 +1,6 @@
 import json
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional, List
 
 import click
@@ -12,9 +13,10 @@ from indra.statements import get_all_descendants
 from indra.statements.io import stmts_from_json
 from indra_db.belief import get_belief
 from indra_db.config import CONFIG, get_s3_dump, record_in_test
-from indra_db.util import get_db, get_ro, S3Path
+from indra_db.util import get_db, get_ro, S3Path, GzipMultipartUpload
 from indra_db.util.aws import get_role_kwargs
-from indra_db.util.dump_sif import dump_sif, get_source_counts, load_res_pos
+from indra_db.util.dump_sif import dump_sif, dump_source_count_table, \
+    dump_res_pos_table, dump_mesh_id_table
 
 
 logger = logging.getLogger(__name__)
@@ -227,7 +229,7 @@ class Dumper(object):
             return False
         if s3_base.key not in s3_path.key:
             return False
-        if cls.name not in s3_path.key:
+        if not s3_path.key.endswith(cls.file_name()):
             return False
         return True
 
@@ -459,9 +461,9 @@ class Readonly(Dumper):
         return
 
 class SourceCount(Dumper):
-    """Dumps a dict of dicts with source counts per source api per statement"""
+    """Dumps a table of the evidence count per source api per statement"""
     name = 'source_count'
-    fmt = 'pkl'
+    fmt = 'parquet'
     db_required = True
     db_options = ['principal', 'readonly']
     requires = [Readonly]
@@ -471,13 +473,13 @@ class SourceCount(Dumper):
                                           **kwargs)
 
     def dump(self, continuing=False):
-        get_source_counts(self.get_s3_path(), self.db)
+        dump_source_count_table(self.get_s3_path(), self.db)
 
 
 class ResiduePosition(Dumper):
-    """Dumps a dict of dicts with residue/position data from Modifications"""
+    """Dumps a table of residue/position data from Modifications"""
     name = 'res_pos'
-    fmt = 'pkl'
+    fmt = 'parquet'
     db_required = True
     db_options = ['readonly', 'principal']
     requires = [Readonly]
@@ -487,11 +489,9 @@ class ResiduePosition(Dumper):
                                               **kwargs)
 
     def dump(self, continuing=False):
-        res_pos_dict = load_res_pos(ro=self.db)
-        s3 = boto3.client('s3')
-        logger.info(f'Uploading residue position dump to '
+        logger.info(f'Dumping residue position table to '
                     f'{self.get_s3_path().to_string()}')
-        self.get_s3_path().upload(s3=s3, body=pickle.dumps(res_pos_dict))
+        dump_res_pos_table(self.get_s3_path(), ro=self.db)
 
 
 class FullPaStmts(Dumper):
@@ -520,22 +520,56 @@ class FullPaStmts(Dumper):
 
 
 class FullPaJson(Dumper):
-    """Dumps all statements found in FastRawPaLink as jsonl"""
+    """Dumps all statements found in FastRawPaLink as gzipped jsonl"""
     name = 'full_pa_json'
-    fmt = 'jsonl'
+    fmt = 'jsonl.gz'
     db_required = True
     db_options = ['principal', 'readonly']
     requires = [Readonly]
+    part_size = 64*1024**2
+    batch_size = 10000
 
     def __init__(self, start, use_principal=False, **kwargs):
         super(FullPaJson, self).__init__(start, use_principal=use_principal,
                                          **kwargs)
 
+    def _get_json_query(self, after_hash=None):
+        # On principal, the pa_statements table has exactly one row per hash,
+        # otherwise pick one row per hash from the fast_raw_pa_link table,
+        # using the hash index rather than comparing the jsons themselves.
+        if 'pa_statements' in self.db.tables:
+            tbl = self.db.PAStatements
+            q = self.db.session.query(tbl.mk_hash, tbl.json)
+        else:
+            tbl = self.db.FastRawPaLink
+            q = self.db.session.query(tbl.mk_hash, tbl.pa_json)\
+                .distinct(tbl.mk_hash)
+        if after_hash is not None:
+            q = q.filter(tbl.mk_hash > after_hash)
+        return q.order_by(tbl.mk_hash)\
+            .execution_options(stream_results=True)\
+            .yield_per(self.batch_size)
+
     def dump(self, continuing=False):
-        query_res = self.db.session.query(self.db.FastRawPaLink.pa_json.distinct())
-        jsonl_str = '\n'.join([js.decode() for js, in query_res.all()])
         s3 = boto3.client('s3')
-        self.get_s3_path().upload(s3, jsonl_str.encode('utf-8'))
+        upload = GzipMultipartUpload(s3, self.get_s3_path(),
+                                     part_size=self.part_size)
+        upload.start(continuing)
+        if upload.last_marker is not None:
+            logger.info(f"Continuing {self.name} dump after hash "
+                        f"{upload.last_marker}.")
+
+        # Stream the jsons in order of hash, so that the hash at the end of
+        # each uploaded part marks where to pick up again.
+        n_stmts = 0
+        for mk_hash, stmt_json in self._get_json_query(upload.last_marker):
+            upload.write(bytes(stmt_json), marker=mk_hash)
+            n_stmts += 1
+            if n_stmts % 1000000 == 0:
+                logger.info(f"Dumped {n_stmts} statement jsons.")
+        upload.complete()
+        logger.info(f"Dumped {n_stmts} statement jsons to "
+                    f"{self.get_s3_path()}.")
 
 
 class Sif(Dumper):
@@ -562,9 +596,9 @@ class Sif(Dumper):
 
 
 class StatementHashMeshId(Dumper):
-    """Dump a mapping from Statement hashes to MeSH terms."""
+    """Dump a table mapping Statement hashes to MeSH terms."""
     name = 'mti_mesh_ids'
-    fmt = 'pkl'
+    fmt = 'parquet'
     db_required = True
     db_options = ['principal', 'readonly']
     requires = [Readonly]
@@ -575,17 +609,7 @@ class StatementHashMeshId(Dumper):
                                                   **kwargs)
 
     def dump(self, continuing=False):
-        mesh_term_tuples = self.db.select_all([
-            self.db.MeshTermMeta.mk_hash,
-            self.db.MeshTermMeta.mesh_num])
-        mesh_concept_tuples = self.db.select_all([
-            self.db.MeshConceptMeta.mk_hash,
-            self.db.MeshConceptMeta.mesh_num])
-        mesh_data = {'terms': mesh_term_tuples,
-                     'concepts': mesh_concept_tuples}
-
-        s3 = boto3.client('s3')
-        self.get_s3_path().upload(s3, pickle.dumps(mesh_data))
+        dump_mesh_id_table(self.get_s3_path(), ro=self.db)
 
 
 class End(Dumper):
@@ -606,6 +630,113 @@ class End(Dumper):
         ).encode('utf-8'))
 
 
+def get_dump_order(target=End):
+    """Get the dumpers needed to produce `target`, in order of requirements.
+
+    Start is not included, as it must already have been run to have a dump
+    to build in.
+    """
+    order = []
+
+    def visit(dumper_class):
+        if dumper_class in order or dumper_class is Start:
+            return
+        for req in dumper_class.requires:
+            visit(req)
+        order.append(dumper_class)
+
+    visit(target)
+    return order
+
+
+def _copy_db(db):
+    # Each dumper running in a thread needs a connection of its own.
+    new_db = db.__class__(db.url, label=db.label,
+                          protected=db.is_protected())
+    new_db.grab_session()
+    return new_db
+
+
+def run_dumpers(start, principal_db, allow_continue=True, n_workers=1,
+                max_heavy=1):
+    """Run the dumpers leading up to End, running independent ones together.
+
+    Each dumper is started as soon as all the dumpers it `requires` are done,
+    with at most `max_heavy` of those marked as `heavy_compute` running at
+    once. When more than one worker is used, each dumper gets its own handle
+    to the principal database. As each dumper finishes, its file is added to
+    the manifest of `start`, and when continuing, any dumper whose file is
+    already in the manifest is skipped.
+
+    Parameters
+    ----------
+    start : Start
+        The loaded Start of the dump.
+    principal_db : :class:`indra_db.databases.PrincipalDatabaseManager`
+        A handle to the principal database.
+    allow_continue : bool
+        If True, skip the dumps that have already been done. (Default is True)
+    n_workers : int
+        The number of dumpers that may run at once. (Default is 1)
+    max_heavy : int
+        The number of heavy_compute dumpers that may run at once. (Default is
+        1)
+    """
+    done = set()
+    pending = []
+    for dumper_class in get_dump_order():
+        if allow_continue and dumper_class.from_list(start.manifest):
+            logger.info(f"{dumper_class.name} dump exists, skipping.")
+            done.add(dumper_class)
+        else:
+            pending.append(dumper_class)
+
+    def run_dumper(dumper):
+        dumper.dump(continuing=allow_continue)
+        if n_workers > 1 and dumper.db is not None:
+            dumper.db.session.close()
+        return dumper.get_s3_path()
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        while pending or running:
+            # Start whatever is ready, as far as the limits allow.
+            n_heavy = sum(d.heavy_compute for d in running.values())
+            for dumper_class in pending[:]:
+                if len(running) >= n_workers:
+                    break
+                if not all(r in done or r is Start
+                           for r in dumper_class.requires):
+                    continue
+                if dumper_class.heavy_compute and n_heavy >= max_heavy:
+                    continue
+
+                kwargs = {}
+                if dumper_class.db_required:
+                    if n_workers > 1:
+                        kwargs['db'] = _copy_db(principal_db)
+                    else:
+                        kwargs['db'] = principal_db
+                dumper = dumper_class(start, **kwargs)
+                logger.info(f"Dumping {dumper_class.name}.")
+                running[executor.submit(run_dumper, dumper)] = dumper_class
+                pending.remove(dumper_class)
+                n_heavy += dumper_class.heavy_compute
+
+            if not running:
+                raise DumpOrderError(f"Cannot run dumpers: "
+                                     f"{[d.name for d in pending]}")
+
+            # Wait for something to finish, and record it.
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                dumper_class = running.pop(future)
+                start.manifest.append(future.result())
+                done.add(dumper_class)
+                logger.info(f"Finished {dumper_class.name} dump.")
+    return
+
+
 def load_readonly_dump(principal_db, readonly_db, dump_file,
                        no_redirect_to_principal=True):
     logger.info("Using dump_file = \"%s\"." % dump_file)
@@ -660,7 +791,7 @@ dumpers = {dumper.name: dumper for dumper in get_all_descendants(Dumper)}
 
 def dump(principal_db, readonly_db=None, delete_existing=False,
          allow_continue=True, load_only=False, dump_only=False,
-         no_redirect_to_principal=True):
+         no_redirect_to_principal=True, n_workers=1, max_heavy=1):
     """Run the suite of dumps in the specified order.
 
     Parameters
@@ -690,6 +821,12 @@ def dump(principal_db, readonly_db=None, delete_existing=False,
         this redirect is not attempted and we assume it is okay if the
         readonly DB being restored is not accessible for the duration
         of the load.
+    n_workers : int
+        The number of dumps that may be run at once, as far as their
+        requirements allow. (Default is 1)
+    max_heavy : int
+        The number of dumps marked as `heavy_compute` that may be run at once.
+        (Default is 1)
     """
     # Check if readonly is needed:
     if not dump_only and readonly_db is None:
@@ -703,73 +840,9 @@ def dump(principal_db, readonly_db=None, delete_existing=False,
         start = Start()
         start.dump(continuing=allow_continue)
 
-        # STATS DUMP
-        if not allow_continue or not PrincipalStats.from_list(start.manifest):
-            logger.info("Dumping principal stats.")
-            PrincipalStats(start, db=principal_db)\
-                .dump(continuing=allow_continue)
-        else:
-            logger.info("Stats dump exists, skipping.")
-
-        # BELIEF DUMP
-        if not allow_continue or not Belief.from_list(start.manifest):
-            logger.info("Dumping belief.")
-            Belief(start, db=principal_db).dump(continuing=allow_continue)
-        else:
-            logger.info("Belief dump exists, skipping.")
-
-        # READONLY DUMP
+        run_dumpers(start, principal_db, allow_continue=allow_continue,
+                    n_workers=n_workers, max_heavy=max_heavy)
         dump_file = Readonly.from_list(start.manifest)
-        if not allow_continue or not dump_file:
-            logger.info("Generating readonly schema (est. a long time)")
-            ro_dumper = Readonly(start, db=principal_db)
-            ro_dumper.dump(continuing=allow_continue)
-            dump_file = ro_dumper.get_s3_path()
-        else:
-            logger.info("Readonly dump exists, skipping.")
-
-        # RESIDUE POSITION DUMP
-        # By now, the readonly schema should exist on principal, so providing
-        # the principal manager should be ok for source counts and
-        # residue/position
-        if not allow_continue or not ResiduePosition.from_list(start.manifest):
-            logger.info("Dumping residue and position")
-            ResiduePosition(start, db=principal_db)\
-                .dump(continuing=allow_continue)
-        else:
-            logger.info("Residue position dump exists, skipping")
-
-        # SOURCE COUNT DUMP
-        if not allow_continue or not SourceCount.from_list(start.manifest):
-            logger.info("Dumping source count")
-            SourceCount(start, db=principal_db)\
-                .dump(continuing=allow_continue)
-        else:
-            logger.info("Source count dump exists, skipping.")
-
-        # SIF DUMP
-        if not allow_continue or not Sif.from_list(start.manifest):
-            logger.info("Dumping sif from the readonly schema on principal.")
-            Sif(start, db=principal_db).dump(continuing=allow_continue)
-        else:
-            logger.info("Sif dump exists, skipping.")
-
-        # FULL PA JSON DUMP
-        if not allow_continue or not FullPaJson.from_list(start.manifest):
-            logger.info("Dumping all PA Statements as jsonl.")
-            FullPaJson(start, db=principal_db).dump(continuing=allow_continue)
-        else:
-            logger.info("Statement dump exists, skipping.")
-
-        # HASH MESH ID DUMP
-        if not allow_continue \
-                or not StatementHashMeshId.from_list(start.manifest):
-            logger.info("Dumping hash-mesh tuples.")
-            StatementHashMeshId(start, db=principal_db)\
-                .dump(continuing=allow_continue)
-
-        # END DUMP
-        End(start).dump(continuing=allow_continue)
     else:
         # Find the most recent dump that has a readonly.
         dump_file = get_latest_dump_s3_path(Readonly.name)
@@ -808,13 +881,20 @@ def dump(principal_db, readonly_db=None, delete_existing=False,
                    "principal database while readonly is being loaded.")
 @click.option('--debug-log', is_flag=True,
               help="If set, the logging level will be set to DEBUG.")
+@click.option('-n', '--n-workers', type=int, default=1,
+              help="The number of dumps that may run at once, as far as "
+                   "their requirements allow.")
+@click.option('--max-heavy', type=int, default=1,
+              help="The number of compute-heavy dumps that may run at once.")
 def run_all(
     continuing,
     delete_existing,
     load_only,
     dump_only,
     no_redirect_to_principal,
-    debug_log
+    debug_log,
+    n_workers,
+    max_heavy
 ):
     """Generate new dumps and list existing dumps."""
     from indra_db import get_ro
@@ -838,7 +918,9 @@ def run_all(
         allow_continue=continuing,
         load_only=load_only,
         dump_only=dump_only,
-        no_redirect_to_principal=no_redirect_to_principal
+        no_redirect_to_principal=no_redirect_to_principal,
+        n_workers=n_workers,
+        max_heavy=max_heavy
     )
 
 
@@ -10,6 +10,7 @@ import hashlib
 import json
 import os
 import re
+import shutil
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Type
@@ -18,7 +19,6 @@ import click
 import pickle
 import logging
 import tempfile
-from itertools import count as iter_count
 from collections import Counter, defaultdict
 
 import requests
@@ -121,6 +121,22 @@ class KnowledgebaseManager(object):
             local_name = f"{self.short_name}_{self.source}"
         return KB_DIR.join(name=f"processed_stmts_{local_name}.tsv.gz")
 
+    def get_cache_fpath(self) -> Path:
+        """Return the local path to the cache of preprocessed statements."""
+        local_fpath = self.get_local_fpath()
+        return local_fpath.with_name(
+            local_fpath.name.replace("processed_stmts_", "stmt_cache_")
+            .replace(".tsv.gz", ".sqlite")
+        )
+
+    def get_info_shard_fpath(self) -> Path:
+        """Return the local path to the raw id info map of this knowledge base.
+        """
+        local_fpath = self.get_local_fpath()
+        return local_fpath.with_name(
+            local_fpath.name.replace("processed_stmts_", "raw_id_info_map_")
+        )
+
 
 class TasManager(KnowledgebaseManager):
     """This manager handles retrieval and processing of the TAS dataset."""
@@ -737,13 +753,202 @@ class UbiBrowserManager(KnowledgebaseManager):
 
 
 
+# The size of the block of fake raw statement ids given to each knowledgebase
+RAW_ID_BLOCK_SIZE = 10_000_000
+
+
+def get_processing_version():
+    """Get the versions of the tools that preprocess knowledgebase statements.
+    """
+    from indra import __version__ as indra_version
+    from indra.ontology.bio import bio_ontology
+    from protmapper import __version__ as protmapper_version
+    return (f"indra={indra_version},ontology={bio_ontology.version},"
+            f"protmapper={protmapper_version}")
+
+
+def _get_content_hash(stmt):
+    # Hash the content of a statement, leaving out its (random) uuid.
+    stmt_json = stmt.to_json()
+    for key in ['id', 'supports', 'supported_by']:
+        stmt_json.pop(key, None)
+    stmt_str = json.dumps(stmt_json, sort_keys=True)
+    return hashlib.md5(stmt_str.encode('utf-8')).hexdigest()
+
+
+def _preprocess_stmts(stmts, cache, version, stats, used_keys):
+    """Preprocess statements, using the cached results where available.
+
+    Results are cached by the content hash of the statement as it came from
+    the knowledgebase, together with the processing version. Statements that
+    are dropped in the processing are cached as None. The cached json leaves
+    out the uuid, and each statement gets its own uuid back on output.
+
+    Returns a list of the hash and json string of each kept statement.
+    """
+    keys = [f"{version}:{_get_content_hash(stmt)}" for stmt in stmts]
+    results = {}
+    for key in set(keys):
+        results[key] = cache.get(key, _MISSING)
+    used_keys.update(results)
+
+    # Process the statements that have not been seen before.
+    new_stmts = [stmt for stmt, key in zip(stmts, keys)
+                 if results[key] is _MISSING]
+    stats['hits'] += len(stmts) - len(new_stmts)
+    stats['misses'] += len(new_stmts)
+    if new_stmts:
+        key_by_uuid = {stmt.uuid: key for stmt, key in zip(stmts, keys)}
+        new_results = {key_by_uuid[stmt.uuid]: None for stmt in new_stmts}
+        new_stmts = ac.fix_invalidities(new_stmts, in_place=True)
+        new_stmts = ac.map_grounding(new_stmts)
+        new_stmts = ac.map_sequence(new_stmts)
+        for stmt in new_stmts:
+            stmt_json = stmt.to_json()
+            stmt_json.pop('id', None)
+            new_results[key_by_uuid[stmt.uuid]] = \
+                [stmt.get_hash(refresh=True), json.dumps(stmt_json)]
+        cache.set_many(new_results)
+        results.update(new_results)
+
+    rows = []
+    for stmt, key in zip(stmts, keys):
+        if results[key] is None:
+            continue
+        stmt_hash, stmt_json_str = results[key]
+        stmt_json = json.loads(stmt_json_str)
+        stmt_json['id'] = stmt.uuid
+        rows.append((stmt_hash, json.dumps(stmt_json)))
+    return rows
+
+
+_MISSING = object()
+
+
+def _iter_processed_stmts(kbm, kb_kwargs):
+    """Get, preprocess and save the statements of a knowledgebase.
+
+    Yields the hash and json string of each statement, as it is written to
+    the local file of the knowledgebase. Statements that are unchanged since
+    an earlier run, with the same versions of the processing tools, are
+    taken from the cache rather than processed again.
+    """
+    from indra_db.util.fetcher import PersistentCache
+
+    cache = PersistentCache(kbm.get_cache_fpath().as_posix())
+    version = get_processing_version()
+    stats = Counter()
+    used_keys = set()
+
+    fname = kbm.get_local_fpath().as_posix()
+    with gzip.open(fname, "wt") as proc_stmts_fh:
+        proc_stmts_writer = csv.writer(proc_stmts_fh, delimiter="\t")
+        stmts = kbm.get_statements(**kb_kwargs)
+
+        # Do preassembly
+        logger.info(f"Preassembling {kbm.short_name}")
+        for stmts in batch_iter(stmts, 100000):
+            rows = _preprocess_stmts(list(stmts), cache, version, stats,
+                                     used_keys)
+            proc_stmts_writer.writerows(rows)
+            yield from rows
+
+    logger.info(f"Statement cache for {kbm.short_name}: {stats['hits']} "
+                f"hits, {stats['misses']} misses.")
+
+    # Remove results for statements that are no longer in the knowledgebase,
+    # or were made with other versions.
+    stale = cache.keys() - used_keys
+    if stale:
+        logger.info(f"Removing {len(stale)} stale entries from the statement "
+                    f"cache for {kbm.short_name}.")
+        cache.delete(stale)
+    cache.close()
+
+
+def _iter_existing_stmts(kbm):
+    """Yield the hash and json string of each saved statement."""
+    with gzip.open(kbm.get_local_fpath(), "rt") as stmts_fh:
+        stmts_reader = csv.reader(stmts_fh, delimiter="\t")
+        for stmt_hash_str, stmt_json_str in stmts_reader:
+            yield int(stmt_hash_str), stmt_json_str
+
+
+def _run_kb(kb_manager, db_info_id, first_raw_id, use_existing,
+            kb_kwargs=None, block_size=RAW_ID_BLOCK_SIZE):
+    """Write the raw id info shard of one knowledgebase.
+
+    The statements are either loaded from the existing local file or
+    generated anew, and each is given a fake raw statement id counting down
+    from `first_raw_id`, within a block of `block_size` ids reserved for this
+    knowledgebase.
+
+    Returns
+    -------
+    kb_manager :
+        The knowledgebase manager class.
+    hash_counts : Counter
+        The number of statements for each hash.
+    hash_to_raw_ids : dict
+        The fake raw statement ids for each hash.
+    """
+    kbm = kb_manager()
+    if use_existing:
+        stmt_rows = _iter_existing_stmts(kbm)
+    else:
+        stmt_rows = _iter_processed_stmts(kbm, kb_kwargs or {})
+
+    hash_counts = Counter()
+    hash_to_raw_ids = defaultdict(set)
+    with gzip.open(kbm.get_info_shard_fpath().as_posix(), "wt") as info_fh:
+        kb_info_writer = csv.writer(info_fh, delimiter="\t")
+        for ix, (stmt_hash, stmt_json_str) in enumerate(stmt_rows):
+            if ix >= block_size:
+                raise ValueError(f"{kbm.short_name} has more than "
+                                 f"{block_size} statements, which will not "
+                                 f"fit in its block of raw ids.")
+            raw_id = first_raw_id - ix
+            hash_counts[stmt_hash] += 1
+            hash_to_raw_ids[stmt_hash].add(raw_id)
+            # raw_id, db_info_id, (reading_id), stmt_json
+            kb_info_writer.writerow(
+                (raw_id, db_info_id, "\\N", stmt_json_str)
+            )
+    logger.info(f"Finished {kbm.name} ({kbm.short_name}): "
+                f"{sum(hash_counts.values())} statements.")
+    return kb_manager, hash_counts, dict(hash_to_raw_ids)
+
+
+def _merge_kb_results(results):
+    """Combine the source counts and raw id maps of each knowledgebase."""
+    counts = Counter()
+    source_counts = {}
+    stmt_hash_to_raw_id = defaultdict(set)
+    for kb_manager, hash_counts, hash_to_raw_ids in results:
+        counts[(kb_manager.source, kb_manager.short_name)] += \
+            sum(hash_counts.values())
+        for stmt_hash, n in hash_counts.items():
+            source_count_dict = source_counts.get(stmt_hash, Counter())
+            source_count_dict[kb_manager.short_name] += n
+            source_counts[stmt_hash] = source_count_dict
+        for stmt_hash, raw_ids in hash_to_raw_ids.items():
+            stmt_hash_to_raw_id[stmt_hash] |= raw_ids
+    return counts, source_counts, dict(stmt_hash_to_raw_id)
+
+
 def local_update(
         kb_manager_list: List[Type[KnowledgebaseManager]],
         local_files: Dict[str, Dict] = None,
         refresh: bool = False,
+        n_proc: int = 1,
 ):
     """Update the knowledgebases of a local raw statements file dump
 
+    Each knowledgebase is written to its own shard of the raw id info map,
+    with fake raw statement ids from its own block, so that the knowledgebases
+    can be processed in separate processes. The shards, source counts and
+    statement hash to raw id maps are combined once all are done.
+
     Parameters
     ----------
     kb_manager_list :
@@ -755,6 +960,9 @@ def local_update(
         knowledgebase manager get_statements method.
     refresh :
         If True, the local files will be recreated even if they already exist.
+    n_proc :
+        The number of processes to use to run the knowledgebases. If 1 (the
+        default), they are run one after another in this process.
     """
 
     def _get_kb_info_map():
@@ -797,7 +1005,10 @@ def local_update(
         try:
             #try/except deal with cases when source website is down
             new_version = kbm.get_source_version()
-        except:
+        except Exception as err:
+            logger.warning(f"Could not get the source version of {kbm.name} "
+                           f"({kbm.short_name}), assuming it is unchanged: "
+                           f"{err}")
             new_version = old_version
 
         if new_version != old_version:
@@ -839,115 +1050,41 @@ def local_update(
         for kb_manager in existing_kbs:
             logger.info(f"  {kb_manager.name} ({kb_manager.short_name})")
 
-    total = len(kbs_to_run) + len(existing_kbs)
-    source_counts = {}
-    counts = Counter()
-    stmt_hash_to_raw_id = defaultdict(set)
     db_info_map = _get_kb_info_map()
 
-    # Generate fake raw statement id for each statement, from -1 and down
-    fake_raw_id_generator = iter_count(-1, -1)
-    with gzip.open(
-            raw_id_info_map_knowledgebases_fpath.as_posix(), "wt"
-    ) as info_fh:
-        kb_info_writer = csv.writer(info_fh, delimiter="\t")
-
-        outer_tqdm = tqdm(
-            desc="Knowledgebases", total=total, unit="knowledgebase"
-        )
-        # First run through the existing knowledgebases
-        logger.info(f"Loading existing statements")
-        for ix, Mngr in enumerate(existing_kbs):
-            kbm = Mngr()
-            tqdm.write(f"[{ix + 1}/{total}] {kbm.name} ({kbm.short_name})")
-            with gzip.open(kbm.get_local_fpath(), "rt") as stmts_fh:
-                stmts_reader = csv.reader(stmts_fh, delimiter="\t")
-                for row in tqdm(stmts_reader, leave=False):
-                    stmt_hash_str, stmt_json_str = row
-                    raw_id = next(fake_raw_id_generator)
-                    stmt_hash = int(stmt_hash_str)
-                    db_info_id = db_info_map[(kbm.source, kbm.short_name)]
-
-                    # Add to raw id mappings
-                    stmt_hash_to_raw_id[stmt_hash].add(raw_id)
-                    # raw_id, db_info_id, (reading_id), stmt_json
-                    kb_info_writer.writerow(
-                        (raw_id, db_info_id, "\\N", stmt_json_str)
-                    )
-                    # Update count
-                    counts[(kbm.source, kbm.short_name)] += 1
-
-                    # Get source count for this statement, or create new
-                    # Counter if it doesn't exist, and increment the count
-                    source_count_dict = source_counts.get(stmt_hash, Counter())
-                    source_count_dict[kbm.short_name] += 1
-                    source_counts[stmt_hash] = source_count_dict
-            outer_tqdm.update(1)
-
-        # Then run through the knowledgebases that are generating new output
-        for ix, Mngr in enumerate(kbs_to_run, start=len(existing_kbs)):
-            kbm = Mngr()
-            db_info_id = db_info_map[(kbm.source, kbm.short_name)]
-            tqdm.write(
-                f"[{ix + 1}/{total}] {kbm.name} ({kbm.short_name})"
-            )
+    # Give each knowledgebase its own block of fake raw statement ids, from
+    # -1 and down.
+    jobs = []
+    all_kbs = [(Mngr, True) for Mngr in existing_kbs] \
+        + [(Mngr, False) for Mngr in kbs_to_run]
+    if len(all_kbs) * RAW_ID_BLOCK_SIZE >= 2**31:
+        raise ValueError("Too many knowledgebases for the raw id blocks.")
+    for ix, (Mngr, use_existing) in enumerate(all_kbs):
+        if local_files is not None:
+            kb_kwargs = local_files.get(Mngr.short_name, {})
+        else:
+            kb_kwargs = {}
+        jobs.append((Mngr, db_info_map[(Mngr.source, Mngr.short_name)],
+                     -1 - ix * RAW_ID_BLOCK_SIZE, use_existing, kb_kwargs))
+
+    if n_proc > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=n_proc) as executor:
+            futures = [executor.submit(_run_kb, *job) for job in jobs]
+            results = [future.result() for future
+                       in tqdm(as_completed(futures), total=len(futures),
+                               desc="Knowledgebases", unit="knowledgebase")]
+    else:
+        results = [_run_kb(*job) for job
+                   in tqdm(jobs, desc="Knowledgebases", unit="knowledgebase")]
 
-            # Write statements for this knowledgebase to a file
-            fname = kbm.get_local_fpath().as_posix()
-            with gzip.open(fname, "wt") as proc_stmts_fh:
-                proc_stmts_writer = csv.writer(proc_stmts_fh, delimiter="\t")
-
-                if local_files is not None:
-                    kb_kwargs = local_files.get(kbm.short_name, {})
-                else:
-                    kb_kwargs = {}
-                stmts = kbm.get_statements(**kb_kwargs)
-
-                # Do preassembly
-                if len(stmts) > 100000:
-                    stmts_iter = batch_iter(stmts, 100000)
-                    batches = True
-                    t = tqdm(desc=f"Preassembling {kbm.short_name}",
-                             total=len(stmts) // 100000 + 1)
-                else:
-                    stmts_iter = [stmts]
-                    batches = False
-                    t = None
-                    logger.info(f"Preassembling {kbm.short_name}")
-
-                for stmts in stmts_iter:
-                    # Pre-process statements
-                    stmts = ac.fix_invalidities(list(stmts), in_place=True)
-                    stmts = ac.map_grounding(stmts)
-                    stmts = ac.map_sequence(stmts)
-                    rows = []
-                    kb_info_rows = []
-                    for stmt in tqdm(stmts, leave=not batches):
-                        raw_id = next(fake_raw_id_generator)
-                        # Get the statement hash and update the source count
-                        stmt_hash = stmt.get_hash(refresh=True)
-
-                        # Get source count for this statement, or create a new
-                        # Counter if it doesn't exist, and increment the count
-                        source_count_dict = source_counts.get(stmt_hash, Counter())
-                        source_count_dict[kbm.short_name] += 1
-                        source_counts[stmt_hash] = source_count_dict
-
-                        # Append to various raw id mappings
-                        stmt_hash_to_raw_id[stmt_hash].add(raw_id)
-                        kb_info_rows.append(
-                            # raw_id, db_info_id, (reading_id), stmt_json
-                            (raw_id, db_info_id, "\\N", json.dumps(stmt.to_json()))
-                        )
-
-                        rows.append((stmt_hash, json.dumps(stmt.to_json())))
-                    proc_stmts_writer.writerows(rows)
-                    kb_info_writer.writerows(kb_info_rows)
-                    if batches:
-                        t.update(1)
-                    counts[(kbm.source, kbm.short_name)] += len(stmts)
-            if batches:
-                t.close()
+    # Combine the results, concatenating the (gzipped) info shards in the
+    # order of the raw id blocks.
+    counts, source_counts, stmt_hash_to_raw_id = _merge_kb_results(results)
+    with raw_id_info_map_knowledgebases_fpath.open("wb") as info_fh:
+        for Mngr, _ in all_kbs:
+            with Mngr().get_info_shard_fpath().open("rb") as shard_fh:
+                shutil.copyfileobj(shard_fh, info_fh)
 
     logger.info("Statements produced per knowledgebase:")
     for (source, short_name), count in counts.most_common():
@@ -959,7 +1096,6 @@ def local_update(
         pickle.dump(source_counts, src_count_fh)
 
     # Dump stmt hash to raw stmt id mapping
-    stmt_hash_to_raw_id = dict(stmt_hash_to_raw_id)
     with stmt_hash_to_raw_stmt_ids_knowledgebases_fpath.open("wb") as hr_fh:
         pickle.dump(stmt_hash_to_raw_id, hr_fh)
 
@@ -972,9 +1108,12 @@ def kb():
 @kb.command()
 @click.argument("task", type=click.Choice(["upload", "update", "local-update"]))
 @click.argument("sources", nargs=-1, type=click.STRING, required=False)
+@click.option("-n", "--n-proc", type=int, default=1,
+              help="The number of processes to use for local-update.")
 def run(
         task: str,
         sources: List[str],
+        n_proc: int,
 ):
     """Upload/update the knowledge bases used by the database.
 
@@ -1021,7 +1160,7 @@ def run(
     # Handle the other tasks.
     logger.info(f"Running {task}...")
     if task == "local-update":
-        local_update(kb_manager_list=selected_kbs)
+        local_update(kb_manager_list=selected_kbs, n_proc=n_proc)
     else:
         for Manager in selected_kbs:
             kbm = Manager()
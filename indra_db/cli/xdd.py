@@ -3,6 +3,7 @@ import boto3
 import click
 import logging
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from indra.statements import Statement
 from indra_db.util import S3Path, get_db, insert_raw_agents
@@ -18,9 +19,6 @@ class XddManager:
 
     def __init__(self):
         self.groups = None
-        self.groups_done = None
-        self.statements = None
-        self.text_content = None
 
     def load_groups(self, db):
         logger.info("Finding groups that have not been handled yet.")
@@ -32,65 +30,93 @@ class XddManager:
                        if group.key[:-1] not in previous_groups]
         return
 
-    def load_statements(self, db):
-        logger.info("Loading statements.")
-        s3 = boto3.client('s3')
-        self.statements = defaultdict(lambda: defaultdict(list))
-        self.text_content = {}
-        self.groups_done = {}
-        for group in self.groups:
-            logger.info(f"Processing {group.key}")
-            file_pair_dict, got_all = _get_file_pairs_from_group(s3, group)
-            self.groups_done[group.key[:-1]] = got_all
-            for (run_id, id_src), (bibs, stmts) in file_pair_dict.items():
-                logger.info(f"Loading {run_id}")
-                doi_lookup = {bib['_xddid']: bib['identifier'][0]['id'].upper()
-                              for bib in bibs if 'identifier' in bib}
-                pub_lookup = {bib['_xddid']: bib['publisher'] for bib in bibs}
-                dois = {doi for doi in doi_lookup.values()}
-                trids = _get_trids_from_dois(db, dois)
-
-                for sj in stmts:
-                    ev = sj['evidence'][0]
-                    xddid = ev['text_refs']['CONTENT_ID']
-                    ev.pop('pmid', None)
-                    if xddid not in doi_lookup:
-                        logger.warning("Skipping statement because bib "
-                                       "lacked a DOI.")
-                        continue
-                    ev['text_refs']['DOI'] = doi_lookup[xddid]
-
-                    trid = trids[doi_lookup[xddid]]
-                    ev['text_refs']['TRID'] = trid
-                    ev['text_refs']['XDD_RUN_ID'] = run_id
-                    ev['text_refs']['XDD_GROUP_ID'] = group.key
-
-                    self.statements[trid][ev['text_refs']['READER']].append(sj)
-                    if trid not in self.text_content:
-                        if id_src:
-                            src = f'xdd-{id_src}'
-                        else:
-                            src = 'xdd'
-                        self.text_content[trid] = \
-                            (trid, src, 'xdd', 'fulltext',
-                             pub_lookup[xddid] == 'bioRxiv')
-        return
+    def iter_group_files(self, s3):
+        """Yield each group with its files, fetching the next in the background.
+
+        Only the current group and the one after it are held in memory.
+        """
+        if not self.groups:
+            return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_future = executor.submit(_get_file_pairs_from_group, s3,
+                                          self.groups[0])
+            for i, group in enumerate(self.groups):
+                future = next_future
+                if i + 1 < len(self.groups):
+                    next_future = executor.submit(_get_file_pairs_from_group,
+                                                  s3, self.groups[i + 1])
+                file_pair_dict, got_all = future.result()
+                yield group, file_pair_dict, got_all
+
+    def load_group(self, group, file_pair_dict, trids):
+        """Organize the statements and text content of a group by trid.
+
+        Parameters
+        ----------
+        group : S3Path
+            The group the files came from.
+        file_pair_dict : dict
+            The pairs of bib and statement jsons for each run in the group,
+            from `_get_file_pairs_from_group`.
+        trids : dict
+            The text ref id for each of the DOIs in the group.
+
+        Returns
+        -------
+        statements : dict
+            Lists of statement jsons, keyed by trid and then reader.
+        text_content : dict
+            The text content row for each trid.
+        """
+        statements = defaultdict(lambda: defaultdict(list))
+        text_content = {}
+        for (run_id, id_src), (bibs, stmts) in file_pair_dict.items():
+            logger.info(f"Loading {run_id}")
+            doi_lookup = _get_doi_lookup(bibs)
+            pub_lookup = {bib['_xddid']: bib['publisher'] for bib in bibs}
+
+            for sj in stmts:
+                ev = sj['evidence'][0]
+                xddid = ev['text_refs']['CONTENT_ID']
+                ev.pop('pmid', None)
+                if xddid not in doi_lookup:
+                    logger.warning("Skipping statement because bib "
+                                   "lacked a DOI.")
+                    continue
+                ev['text_refs']['DOI'] = doi_lookup[xddid]
+
+                trid = trids[doi_lookup[xddid]]
+                ev['text_refs']['TRID'] = trid
+                ev['text_refs']['XDD_RUN_ID'] = run_id
+                ev['text_refs']['XDD_GROUP_ID'] = group.key
 
-    def dump_statements(self, db):
+                statements[trid][ev['text_refs']['READER']].append(sj)
+                if trid not in text_content:
+                    if id_src:
+                        src = f'xdd-{id_src}'
+                    else:
+                        src = 'xdd'
+                    text_content[trid] = \
+                        (trid, src, 'xdd', 'fulltext',
+                         pub_lookup[xddid] == 'bioRxiv')
+        return statements, text_content
+
+    def dump_group(self, db, statements, text_content):
+        """Copy the content of a group into the database, without committing.
+        """
         from indra_db.reading.read_db import DatabaseStatementData, \
             generate_reading_id
-        tc_rows = set(self.text_content.values())
+        cur = db.get_copy_cursor()
+        tc_rows = set(text_content.values())
         tc_cols = ('text_ref_id', 'source', 'format', 'text_type', 'preprint')
         logger.info(f"Dumping {len(tc_rows)} text content.")
-        db.copy_lazy('text_content', tc_rows, tc_cols)
+        db.copy_lazy('text_content', tc_rows, tc_cols, commit=False)
 
-        # Look up tcids for newly entered content.
-        tcids = db.select_all(
-            [db.TextContent.text_ref_id, db.TextContent.id],
-            db.TextContent.text_ref_id.in_(self.statements.keys()),
-            db.TextContent.format == 'xdd'
-        )
-        tcid_lookup = {trid: tcid for trid, tcid in tcids}
+        # Look up tcids for newly entered content, in the same transaction.
+        cur.execute("SELECT text_ref_id, id FROM text_content "
+                    "WHERE format = 'xdd' AND text_ref_id = ANY(%s)",
+                    (list(statements.keys()),))
+        tcid_lookup = {trid: tcid for trid, tcid in cur.fetchall()}
 
         # Compile reading and statements into rows.
         r_rows = set()
@@ -100,7 +126,7 @@ class XddManager:
         rd_batch_id = db.make_copy_batch_id()
         stmt_batch_id = db.make_copy_batch_id()
         stmts = []
-        for trid, trid_set in self.statements.items():
+        for trid, trid_set in statements.items():
             for reader, stmt_list in trid_set.items():
                 tcid = tcid_lookup[trid]
                 reader_version = self.reader_versions[reader.upper()]
@@ -134,15 +160,39 @@ class XddManager:
         return
 
     def run(self, db):
+        """Load and dump each new group, committing one group at a time.
+
+        Each group is committed along with its row in xdd_updates (if all of
+        its files could be loaded), so a failure only loses the group being
+        handled, and the next group is fetched from s3 while the current one
+        is dumped.
+        """
         self.load_groups(db)
-        self.load_statements(db)
-        self.dump_statements(db)
-        update_rows = [(json.dumps(self.reader_versions),
-                        self.indra_version, grp_key)
-                       for grp_key, is_done in self.groups_done.items()
-                       if is_done]
-        db.copy('xdd_updates', update_rows,
-                ('reader_versions', 'indra_version', 'day_str'))
+        s3 = boto3.client('s3')
+        for group, file_pair_dict, got_all in self.iter_group_files(s3):
+            group_name = group.key[:-1]
+            logger.info(f"Processing {group.key}")
+
+            # Resolve all the DOIs of the group at once.
+            dois = {doi for bibs, _ in file_pair_dict.values()
+                    for doi in _get_doi_lookup(bibs).values()}
+            trids = _get_trids_from_dois(db, dois)
+            statements, text_content = \
+                self.load_group(group, file_pair_dict, trids)
+
+            try:
+                self.dump_group(db, statements, text_content)
+                if got_all:
+                    db.copy('xdd_updates',
+                            [(json.dumps(self.reader_versions),
+                              self.indra_version, group_name)],
+                            ('reader_versions', 'indra_version', 'day_str'))
+                else:
+                    db.commit_copy(f"Failed to commit group {group_name}.")
+            except Exception:
+                db.rollback_copy()
+                raise
+            logger.info(f"Finished {group_name}.")
         return
 
 
@@ -192,7 +242,15 @@ def _get_file_pairs_from_group(s3, group: S3Path):
     return ret, got_all
 
 
+def _get_doi_lookup(bibs):
+    return {bib['_xddid']: bib['identifier'][0]['id'].upper()
+            for bib in bibs if 'identifier' in bib}
+
+
 def _get_trids_from_dois(db, dois):
+    if not dois:
+        return {}
+
     # Get current relevant text refs (if any)
     tr_list = db.select_all(db.TextRef, db.TextRef.doi_in(dois))
 
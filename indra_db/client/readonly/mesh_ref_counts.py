@@ -1,4 +1,4 @@
-from sqlalchemy import func
+from sqlalchemy import func, case, literal, union_all
 
 from indra_db import get_ro
 
@@ -25,54 +25,91 @@ def get_mesh_ref_counts(mesh_terms, require_all=False, ro=None):
         A database manager handle. The default is the primary readonly, as
         indicated by environment variables or the config file.
     """
+    return get_mesh_ref_counts_batch([mesh_terms], require_all, ro)[0]
+
+
+def get_mesh_ref_counts_batch(mesh_term_sets, require_all=False, ro=None):
+    """Get the mesh ref counts for each of several sets of mesh terms.
+
+    All the sets are resolved in a single query, in which the counts for
+    both C and D type mesh terms are aggregated into a JSON object for each
+    hash, and the `require_all` option is applied, in the database.
+
+    Parameters
+    ----------
+    mesh_term_sets : list[list]
+        A list of lists of mesh term strings of the form "D000#####".
+    require_all : Optional[bool]
+        If True, require that each entry in a result includes all the mesh
+        terms of its set. Default is False
+    ro : Optional[DatabaseManager]
+        A database manager handle. The default is the primary readonly, as
+        indicated by environment variables or the config file.
+
+    Returns
+    -------
+    results : list[dict]
+        A list with an entry for each set of mesh terms, as would be returned
+        by `get_mesh_ref_counts`.
+    """
     # Get the default readonly database, if needed..
     if ro is None:
         ro = get_ro('primary')
 
     # Make sure the mesh IDs are of the correct kind.
-    if not all(m.startswith('D') or m.startswith('C') for m in mesh_terms):
+    mesh_term_sets = [set(mesh_terms) for mesh_terms in mesh_term_sets]
+    if not all(m.startswith('D') or m.startswith('C')
+               for mesh_terms in mesh_term_sets for m in mesh_terms):
         raise ValueError("All mesh terms must begin with C or D.")
 
-    # Convert the IDs to numbers for faster lookup.
-    result = {}
-    for prefix, table in [('C', ro.MeshConceptRefCounts),
-                          ('D', ro.MeshTermRefCounts)]:
-        mesh_num_map = {int(m[1:]): m for m in mesh_terms
-                        if m.startswith(prefix)}
-        if not mesh_num_map:
-            continue
-
-        # Build the query.
-        nums = func.array_agg(table.mesh_num)
-        counts = func.array_agg(table.ref_count)
-        q = ro.session.query(table.mk_hash, nums.label('nums'),
-                             counts.label('ref_counts'), table.pmid_count)
-        if len(mesh_num_map.keys()) == 1:
-            q = q.filter(table.mesh_num == list(mesh_num_map.keys())[0])
-        elif len(mesh_num_map.keys()) > 1:
-            q = q.filter(table.mesh_num.in_(mesh_num_map.keys()))
-        q = q.group_by(table.mk_hash, table.pmid_count)
-
-        # Apply the require all option by comparing the length of the nums array
-        # to the number of inputs.
-        if require_all:
-            q = q.having(func.cardinality(nums) == len(mesh_num_map.keys()))
-
-        # Parse the results.
-        for mk_hash, nums, counts, pmid_count in q.all():
-            count_dict = {mesh_num_map[mesh_num]: ref_count
-                          for mesh_num, ref_count in zip(nums, counts)}
-            if mk_hash not in result:
-                result[mk_hash] = count_dict
-                result[mk_hash]['total'] = pmid_count
+    # Build a query for each set and type of mesh term, which converts the IDs
+    # to numbers for faster lookup and labels the rows with the original term.
+    queries = []
+    for set_idx, mesh_terms in enumerate(mesh_term_sets):
+        for prefix, table in [('C', ro.MeshConceptRefCounts),
+                              ('D', ro.MeshTermRefCounts)]:
+            mesh_num_map = {int(m[1:]): m for m in mesh_terms
+                            if m.startswith(prefix)}
+            if not mesh_num_map:
+                continue
+
+            q = ro.session.query(
+                literal(set_idx).label('set_idx'),
+                table.mk_hash.label('mk_hash'),
+                case(mesh_num_map, value=table.mesh_num).label('mesh_term'),
+                table.ref_count.label('ref_count'),
+                table.pmid_count.label('pmid_count')
+            )
+            if len(mesh_num_map) == 1:
+                q = q.filter(table.mesh_num == list(mesh_num_map.keys())[0])
             else:
-                result[mk_hash].update(count_dict)
-                result[mk_hash]['total'] += sum(counts)
+                q = q.filter(table.mesh_num.in_(mesh_num_map.keys()))
+            queries.append(q.statement)
+
+    results = [{} for _ in mesh_term_sets]
+    if not queries:
+        return results
+    if len(queries) == 1:
+        ref_rows = queries[0].alias('ref_rows')
+    else:
+        ref_rows = union_all(*queries).alias('ref_rows')
 
-    # Little sloppy, but delete any that don't meet the require_all constraint.
+    # Aggregate the counts for each hash into a single JSON object.
+    counts = func.jsonb_object_agg(ref_rows.c.mesh_term, ref_rows.c.ref_count)
+    total = func.jsonb_build_object('total', func.max(ref_rows.c.pmid_count))
+    q = ro.session.query(ref_rows.c.set_idx, ref_rows.c.mk_hash,
+                         counts.op('||')(total).label('counts'))
+    q = q.group_by(ref_rows.c.set_idx, ref_rows.c.mk_hash)
+
+    # Apply the require all option by comparing the number of terms found for
+    # each hash to the number of terms in the set.
     if require_all:
-        num_terms = len(set(mesh_terms))
-        for mk_hash in result.copy().keys():
-            if len(result[mk_hash]) != num_terms + 1:
-                result.pop(mk_hash)
-    return result
+        num_terms_map = {set_idx: len(mesh_terms)
+                         for set_idx, mesh_terms in enumerate(mesh_term_sets)}
+        q = q.having(func.count()
+                     == case(num_terms_map, value=ref_rows.c.set_idx))
+
+    # Sort the results into their sets.
+    for set_idx, mk_hash, count_dict in q.all():
+        results[set_idx][mk_hash] = count_dict
+    return results
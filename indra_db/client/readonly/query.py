@@ -8,11 +8,14 @@ __all__ = ['Query', 'Intersection', 'Union', 'MergeQuery', 'HasAgent',
 import re
 import json
 import logging
+import threading
+from hashlib import md5
 from functools import lru_cache
 from itertools import combinations
 from typing import Optional, Iterable
 from typing import Union as TypeUnion
 from collections import OrderedDict, defaultdict
+from cachetools import LRUCache
 from sqlalchemy import desc, true, select, or_, except_, func, null, and_, \
     String, union, intersect
 
@@ -26,6 +29,7 @@ from indra_db.readonly_dumping.util import clean_json_loads
 from indra_db.schemas.readonly_schema import ro_role_map, ro_type_map, \
     SOURCE_GROUPS
 from indra_db.util import regularize_agent_id, get_ro
+from indra_db.util.fetcher import PersistentCache
 
 logger = logging.getLogger(__name__)
 
@@ -456,6 +460,92 @@ class Query(object):
         if self.empty:
             return StatementQueryResult.empty(limit, offset, self.to_json())
 
+        built = self._get_statements_selection(ro, limit, offset, sort_by,
+                                               ev_limit, evidence_filter)
+        if built is None:
+            return
+        selection, ref_link_keys = built
+
+        # Execute the query.
+        proxy = ro.session.connection().execute(selection)
+        res = proxy.fetchall()
+        logger.info("Query resolved.")
+        if res:
+            logger.debug("res is %d row by %d cols." % (len(res), len(res[0])))
+        else:
+            logger.debug("res is empty.")
+
+        # Unpack the statements.
+        stmts_dict = OrderedDict()
+        ev_counts = OrderedDict()
+        beliefs = OrderedDict()
+        source_counts = OrderedDict()
+        returned_evidence = 0
+        for mk_hash, stmt_json, ev_count, belief, src_dict, num_ev \
+                in self._iter_statement_rows(ro, res, ref_link_keys, ev_limit):
+            returned_evidence += num_ev
+
+            # Add a new statement if the hash is new.
+            if mk_hash not in stmts_dict.keys():
+                source_counts[mk_hash] = src_dict
+                ev_counts[mk_hash] = ev_count
+                beliefs[mk_hash] = belief
+                stmts_dict[mk_hash] = stmt_json
+            else:
+                stmts_dict[mk_hash]['evidence'].extend(stmt_json['evidence'])
+
+        return StatementQueryResult(stmts_dict, limit, offset, ev_counts,
+                                    beliefs, returned_evidence, source_counts,
+                                    self.to_json())
+
+    def iter_statements(self, ro=None, limit=None, offset=None,
+                        sort_by='ev_count', ev_limit=None,
+                        evidence_filter=None):
+        """Iterate over the statements that satisfy this query.
+
+        Unlike `get_statements`, the rows are streamed from the database with
+        a server-side cursor, and each statement is yielded as soon as all of
+        its evidence has been read, so the full result is never held in
+        memory. The parameters are the same as for `get_statements`.
+
+        Yields
+        ------
+        mk_hash : int
+            The hash of the statement.
+        stmt_json : dict
+            The JSON of the statement, including its evidence.
+        ev_count : int
+            The total number of evidence for the statement.
+        belief : float
+            The belief score of the statement.
+        source_counts : dict
+            The number of evidence from each source.
+        num_ev : int
+            The number of evidence returned for the statement.
+        """
+        if ro is None:
+            ro = get_ro('primary')
+
+        if self.empty:
+            return
+
+        built = self._get_statements_selection(ro, limit, offset, sort_by,
+                                               ev_limit, evidence_filter,
+                                               ordered=True)
+        if built is None:
+            return
+        selection, ref_link_keys = built
+
+        proxy = ro.session.connection()\
+            .execution_options(stream_results=True).execute(selection)
+        try:
+            yield from self._iter_statement_rows(ro, proxy, ref_link_keys,
+                                                 ev_limit)
+        finally:
+            proxy.close()
+
+    def _get_statements_selection(self, ro, limit, offset, sort_by, ev_limit,
+                                  evidence_filter, ordered=False):
         # Get the query for mk_hashes and ev_counts, and apply the generic
         # limits to it.
         mk_hashes_q = self.build_hash_query(ro)
@@ -521,6 +611,14 @@ class Query(object):
         # Put it all together.
         selection = select(cols).select_from(stmts_q)
 
+        # When streaming, the rows of each statement must be adjacent, and
+        # the statements must come out in order.
+        if ordered:
+            if sort_by == 'ev_count':
+                selection = selection.order_by(desc(cols[2]), cols[0])
+            else:
+                selection = selection.order_by(desc(cols[3]), cols[0])
+
         # This try-except section handles a sqlalchemy error that occurs when
         # trying to compile a string of the query.
         # See: https://github.com/sqlalchemy/sqlalchemy/issues/6514
@@ -530,7 +628,7 @@ class Query(object):
             selection_print = selection.compile(compile_kwargs={'literal_binds': True})
             if self._print_only:
                 print(selection_print)
-                return
+                return None
 
             logger.info("Executing query (get_statements)")
             logger.debug(f"SQL:\n{selection_print}")
@@ -539,23 +637,14 @@ class Query(object):
                 raise err
             logger.warning("Could not print query")
 
-        # Execute the query.
-        proxy = ro.session.connection().execute(selection)
-        res = proxy.fetchall()
-        logger.info("Query resolved.")
-        if res:
-            logger.debug("res is %d row by %d cols." % (len(res), len(res[0])))
-        else:
-            logger.debug("res is empty.")
+        return selection, ref_link_keys
 
-        # Unpack the statements.
-        stmts_dict = OrderedDict()
-        ev_counts = OrderedDict()
-        beliefs = OrderedDict()
-        source_counts = OrderedDict()
-        returned_evidence = 0
+    @staticmethod
+    def _iter_statement_rows(ro, rows, ref_link_keys, ev_limit):
+        """Group the rows of a statement query into statement JSONs."""
         src_set = ro.get_source_names()
-        for row in res:
+        current = None
+        for row in rows:
             # Unpack the row
             row_gen = iter(row)
 
@@ -577,17 +666,17 @@ class Query(object):
                                "statement will have to be dropped.")
                 continue
 
-            if raw_json_bts is not None:
-                returned_evidence += 1
+            # Start a new statement if the hash is new.
+            if current is None or current[0] != mk_hash:
+                if current is not None:
+                    yield tuple(current)
+                stmt_json = json.loads(pa_json_bts.decode('utf-8'))
+                stmt_json['belief'] = belief
+                stmt_json['evidence'] = []
+                current = [mk_hash, stmt_json, ev_count, belief, src_dict, 0]
 
-            # Add a new statement if the hash is new.
-            if mk_hash not in stmts_dict.keys():
-                source_counts[mk_hash] = src_dict
-                ev_counts[mk_hash] = ev_count
-                beliefs[mk_hash] = belief
-                stmts_dict[mk_hash] = json.loads(pa_json_bts.decode('utf-8'))
-                stmts_dict[mk_hash]['belief'] = belief
-                stmts_dict[mk_hash]['evidence'] = []
+            if raw_json_bts is not None:
+                current[5] += 1
 
             # Add annotations if not present.
             if ev_limit != 0:
@@ -621,11 +710,10 @@ class Query(object):
                     ev_json['annotations']['content_source'] = ref_dict['source']
 
                 # Add the evidence JSON to the list.
-                stmts_dict[mk_hash]['evidence'].append(ev_json)
+                current[1]['evidence'].append(ev_json)
 
-        return StatementQueryResult(stmts_dict, limit, offset, ev_counts,
-                                    beliefs, returned_evidence, source_counts,
-                                    self.to_json())
+        if current is not None:
+            yield tuple(current)
 
     def get_hashes(self, ro=None, limit=None, offset=None, sort_by='ev_count',
                    with_src_counts=True) \
@@ -1600,18 +1688,150 @@ def get_gilda_grounder():
         return None
 
 
-def gilda_ground(agent_text):
+def _gilda_ground(agent_text, context=None):
     grounder = get_gilda_grounder()
     if grounder is None:
         import requests
         res = requests.post('https://grounding.indra.bio/ground',
-                            json={'text': agent_text})
+                            json={'text': agent_text, 'context': context})
         gilda_list = res.json()
     else:
-        gilda_list = [r.to_json() for r in grounder.ground(agent_text)]
+        gilda_list = [r.to_json()
+                      for r in grounder.ground(agent_text, context=context)]
     return gilda_list
 
 
+def get_gilda_version():
+    """Get the version of gilda used for grounding, local or remote."""
+    if get_gilda_grounder() is not None:
+        from gilda import __version__
+        return __version__
+    try:
+        import requests
+        res = requests.get('https://grounding.indra.bio/version', timeout=10)
+        res.raise_for_status()
+        return res.text.strip()
+    except Exception as e:
+        logger.warning(f"Could not get the version of the remote grounding "
+                       f"service: {e}")
+        return 'remote'
+
+
+class GroundingCache(object):
+    """A cache of gilda groundings keyed by normalized text and context.
+
+    Groundings are kept in an in-process LRU cache and, optionally, in an
+    on-disk cache that can be shared between processes and persists between
+    runs. The keys include the gilda version, and any groundings on disk from
+    another version are removed when the cache is created.
+
+    Parameters
+    ----------
+    maxsize : Optional[int]
+        The maximum number of groundings kept in memory. Default is 10000.
+    file_path : Optional[str]
+        The path to a sqlite file used for the on-disk cache. If not given,
+        groundings are only cached in memory.
+    """
+    def __init__(self, maxsize=10000, file_path=None):
+        self.version = get_gilda_version()
+        self._prefix = f'gilda:{self.version}:'
+        self._lru = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if file_path is not None:
+            self._disk = PersistentCache(file_path)
+            stale = {key for key in self._disk.keys('gilda:')
+                     if not key.startswith(self._prefix)}
+            if stale:
+                logger.info(f"Removing {len(stale)} groundings made by other "
+                            f"versions of gilda from the cache.")
+                self._disk.delete(stale)
+        else:
+            self._disk = None
+
+    def _get_key(self, agent_text, context=None):
+        text = ' '.join(agent_text.split())
+        if context:
+            ctx_hash = md5(' '.join(context.split()).encode('utf-8'))\
+                .hexdigest()
+        else:
+            ctx_hash = ''
+        return f'{self._prefix}{ctx_hash}:{text}'
+
+    def ground(self, agent_text, context=None):
+        """Get the gilda groundings for a text, using the cache if possible."""
+        key = self._get_key(agent_text, context)
+        with self._lock:
+            res = self._lru.get(key)
+        if res is None and self._disk is not None:
+            res = self._disk.get(key)
+            if res is not None:
+                with self._lock:
+                    self._lru[key] = res
+        if res is not None:
+            with self._lock:
+                self.hits += 1
+            return res
+
+        with self._lock:
+            self.misses += 1
+        res = _gilda_ground(agent_text, context)
+        with self._lock:
+            self._lru[key] = res
+        if self._disk is not None:
+            self._disk.set(key, res)
+        return res
+
+    def warm(self, ro=None, num_names=1000):
+        """Fill the cache with the groundings of the most common agent names.
+
+        This is meant to be run once, e.g. in a server's main process before
+        its workers are forked, so that they all start with a warm cache
+        without each running the query.
+
+        Parameters
+        ----------
+        ro : Optional[DatabaseManager]
+            A readonly database manager handle. The default is the primary
+            readonly database, whose connections are closed once the names
+            are loaded, so none are inherited by forked processes.
+        num_names : Optional[int]
+            The number of names, ranked by their total evidence count, to
+            ground. Default is 1000.
+        """
+        own_ro = ro is None
+        if own_ro:
+            ro = get_ro('primary')
+        try:
+            ev_count = func.sum(ro.NameMeta.ev_count)
+            q = ro.session.query(ro.NameMeta.db_id)\
+                .group_by(ro.NameMeta.db_id)\
+                .order_by(desc(ev_count))\
+                .limit(num_names)
+            names = [name for name, in q.all()]
+        finally:
+            if own_ro:
+                ro.session.close()
+                ro.dispose_engine()
+        misses = self.misses
+        for name in names:
+            self.ground(name)
+        logger.info(f"Warmed the grounding cache with {len(names)} names "
+                    f"({self.misses - misses} not previously cached).")
+
+
+@lru_cache(maxsize=1)
+def get_grounding_cache():
+    """Get the grounding cache, stored on disk if GROUNDING_CACHE is set."""
+    return GroundingCache(file_path=get_config("GROUNDING_CACHE"))
+
+
+def gilda_ground(agent_text, context=None):
+    return get_grounding_cache().ground(agent_text, context)
+
+
 class HasAgent(Query):
     """Get Statements that have a particular agent in a particular role.
 
@@ -1,5 +1,5 @@
 __all__ = ['CopyManager', 'LazyCopyManager', 'PushCopyManager',
-           'ReturningCopyManager']
+           'ReturningCopyManager', 'ReturningPushCopyManager']
 
 import logging
 import tempfile
@@ -234,3 +234,32 @@ class PushCopyManager(LazyCopyManager):
         updated = self._get_report(return_cols)
         return updated
 
+
+class ReturningPushCopyManager(PushCopyManager):
+    """Perform a push copy, and retrieve columns, such as the primary IDs, of
+    all the rows inserted or updated."""
+
+    def __init__(self, conn, table, cols, return_cols, constraint=None):
+        super(ReturningPushCopyManager, self).__init__(conn, table, cols,
+                                                       constraint=constraint)
+        self.return_cols = return_cols
+        return
+
+    def returning_copy(self, data, fobject_factory=tempfile.TemporaryFile):
+        self.copy(data, fobject_factory)
+        cursor = self.conn.cursor()
+        sql = self._get_insert_sql()
+        logger.debug(sql)
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+    def _get_sql(self):
+        return self._get_copy_sql()
+
+    def _get_insert_sql(self):
+        sql = super(ReturningPushCopyManager, self)._get_insert_sql()
+        sql = sql.strip()
+        if sql[-1] == ';':
+            sql = sql[:-1]
+        sql += f"\nRETURNING \"{self._stringify_cols(self.return_cols)}\";\n"
+        return sql
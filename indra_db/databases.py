@@ -7,6 +7,7 @@ import json
 import random
 import logging
 import string
+from copy import copy
 from io import BytesIO
 from numbers import Number
 from datetime import datetime
@@ -296,6 +297,25 @@ class DatabaseManager(object):
             return
         return self.__engine.connect()
 
+    def get_session_handle(self):
+        """Get a copy of this handle with its own session on the same engine.
+
+        This lets several threads share one pool of connections, while each
+        uses its own session.
+        """
+        handle = copy(self)
+        handle.session = None
+        handle.grab_session()
+        return handle
+
+    def dispose_engine(self):
+        """Close all the pooled connections of the engine.
+
+        The connections that are in use are dropped when they are returned,
+        and new connections are made as needed.
+        """
+        self.__engine.dispose()
+
     def __del__(self, *args, **kwargs):
         if not hasattr(self, 'available') or self.available:
             return
@@ -523,6 +543,15 @@ class DatabaseManager(object):
         finally:
             self._conn = None
 
+    def rollback_copy(self):
+        """Undo anything copied in since the last commit of a copy."""
+        if not self._conn:
+            return
+        try:
+            self._conn.rollback()
+        finally:
+            self._conn = None
+
 
     def _get_foreign_key_constraint(self, table_name_1, table_name_2):
         cols = self.get_column_objects(self.tables[table_name_1])
@@ -880,25 +909,35 @@ class DatabaseManager(object):
         return
 
     def copy_push(self, tbl_name, data, cols=None, commit=True,
-                  constraint=None):
-        """Copy, pushing any changes to constraint violating rows."""
+                  constraint=None, return_cols=None):
+        """Copy, pushing any changes to constraint violating rows.
+
+        If `return_cols` are given, the values of those columns (e.g. the
+        generated ids) for all the rows inserted or updated are returned.
+        """
         # General overhead.
         if not self._precheck_copy(tbl_name, data, 'copy_push'):
-            return
+            return [] if return_cols else None
         cols, data_bts = self._prep_copy(tbl_name, data, cols)
 
         # Handle guessed-parameters
         constraint = self._infer_copy_constraint(constraint, tbl_name, cols)
 
         # Do the copy.
-        mngr = PushCopyManager(self._conn, tbl_name, cols,
-                               constraint=constraint)
-        mngr.copy(data_bts, BytesIO)
+        ret = None
+        if return_cols:
+            mngr = ReturningPushCopyManager(self._conn, tbl_name, cols,
+                                            return_cols, constraint=constraint)
+            ret = mngr.returning_copy(data_bts, BytesIO)
+        else:
+            mngr = PushCopyManager(self._conn, tbl_name, cols,
+                                   constraint=constraint)
+            mngr.copy(data_bts, BytesIO)
 
         # Commit
         if commit:
             self.commit_copy(f'Failed to commit copy_push to {tbl_name}.')
-        return
+        return ret
 
     def copy_report_push(self, tbl_name, data, cols=None, commit=True,
                          constraint=None, return_cols=None, order_by=None):
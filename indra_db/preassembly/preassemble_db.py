@@ -1,11 +1,15 @@
 import json
+import mmap
 import pickle
+import shutil
 import logging
+import tempfile
 from os import path
 from functools import wraps
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from argparse import ArgumentParser
+from multiprocessing.pool import Pool
 
 from sqlalchemy import or_
 
@@ -21,6 +25,7 @@ from indra.ontology.bio import bio_ontology
 from indra_db.reading.read_db_aws import bucket_name
 
 from indra_db.util.data_gatherer import DataGatherer, DGContext
+from indra_db.util.helpers import imap_bounded
 from indra_db.util import insert_pa_stmts, distill_stmts, get_db, \
     extract_agent_data, insert_pa_agents, hash_pa_agents, S3Path
 
@@ -65,10 +70,25 @@ class DbPreassembler:
         Select the maximum number of statements you wish to be handled at a
         time. In general, a larger batch size will somewhat be faster, but
         require much more memory.
+    n_proc : int
+        The number of processes used to find support links. Each process
+        handles a different outer batch of statements. Default is 1.
+    max_cached_batches : int
+        The number of deserialized batches of statements each process keeps
+        in memory while finding support links. Default is 4.
+    prefilter : bool
+        If True, when supplementing the corpus, only compare new statements
+        to old statements of the same types and with agents that have the
+        same grounding as (or are related in the ontology to) an agent of a
+        new statement. Default is False.
     """
     def __init__(self, batch_size=10000, s3_cache=None, print_logs=False,
-                 stmt_type=None, yes_all=False, ontology=None):
+                 stmt_type=None, yes_all=False, ontology=None, n_proc=1,
+                 max_cached_batches=4, prefilter=False):
         self.batch_size = batch_size
+        self.n_proc = n_proc
+        self.max_cached_batches = max_cached_batches
+        self.prefilter = prefilter
         if s3_cache is not None:
             # Make the cache specific to stmt type. This guards against
             # technical errors resulting from mixing this key parameter.
@@ -428,47 +448,56 @@ class DbPreassembler:
                   f"new statements.")
         hash_list.sort()
         idx_batches, start_idx = self._make_idx_batches(hash_list, continuing)
-        for outer_idx, (out_si, out_ei) in enumerate(idx_batches[start_idx:]):
-            outer_idx += start_idx
-            sj_query = db.filter_query(
-                db.PAStatements.json,
-                db.PAStatements.mk_hash.in_(hash_list[out_si:out_ei])
-            )
-            outer_batch = [_stmt_from_json(sj) for sj, in sj_query.all()]
 
-            # Get internal support links
-            self._log(f'Getting internal support links outer batch '
-                      f'{outer_idx}/{len(idx_batches)-1}.')
-            some_support_links = self._get_support_links(outer_batch)
-
-            # Get links with all other batches
-            in_start = outer_idx + 1
-            for inner_idx, (in_si, in_ei) in enumerate(idx_batches[in_start:]):
-                inner_sj_q = db.filter_query(
+        # Load and deserialize each batch of statements only once, storing
+        # them on local disk, rather than re-querying every inner batch for
+        # every outer batch.
+        store = StmtBatchStore(max_cached=self.max_cached_batches)
+        try:
+            self._log(f"Loading {len(idx_batches)} batches of statements "
+                      f"into {store.dir_path}.")
+            for batch_idx, (si, ei) in enumerate(idx_batches):
+                sj_query = db.filter_query(
                     db.PAStatements.json,
-                    db.PAStatements.mk_hash.in_(hash_list[in_si:in_ei])
+                    db.PAStatements.mk_hash.in_(hash_list[si:ei])
                 )
-                inner_batch = [_stmt_from_json(sj) for sj, in inner_sj_q.all()]
-                # NOTE: deliberately subtracting 1 because the INDRA
-                # implementation is weird.
-                split_idx = len(inner_batch) - 1
-                full_list = inner_batch + outer_batch
-                self._log(f'Getting support between outer batch {outer_idx}/'
-                          f'{len(idx_batches)-1} and inner batch {inner_idx}/'
-                          f'{len(idx_batches)-in_start-1}.')
-                some_support_links |= \
-                    self._get_support_links(full_list, split_idx=split_idx)
-
-            # Add all the new support links
-            support_links |= some_support_links
-
-            # There are generally few support links compared to the number of
-            # statements, so it doesn't make sense to copy every time, but for
-            # long preassembly, this allows for better failure recovery.
-            if len(support_links) >= self.batch_size:
-                self._dump_links(db, support_links)
-                self._put_support_mark(outer_idx)
-                support_links = set()
+                store.put(batch_idx,
+                          [_stmt_from_json(sj) for sj, in sj_query.all()])
+
+            jobs = [(store, outer_idx, len(idx_batches))
+                    for outer_idx in range(start_idx, len(idx_batches))]
+            if self.n_proc > 1:
+                pool = Pool(self.n_proc, initializer=_init_support_worker,
+                            initargs=(self.pa,))
+                link_iter = pool.imap(_find_batch_support_links, jobs)
+            else:
+                pool = None
+                _init_support_worker(self.pa)
+                link_iter = map(_find_batch_support_links, jobs)
+
+            try:
+                for outer_idx, some_support_links in link_iter:
+                    self._log(f'Found {len(some_support_links)} support links '
+                              f'for outer batch '
+                              f'{outer_idx}/{len(idx_batches)-1}.')
+
+                    # Add all the new support links
+                    support_links |= some_support_links
+
+                    # There are generally few support links compared to the
+                    # number of statements, so it doesn't make sense to copy
+                    # every time, but for long preassembly, this allows for
+                    # better failure recovery.
+                    if len(support_links) >= self.batch_size:
+                        self._dump_links(db, support_links)
+                        self._put_support_mark(outer_idx)
+                        support_links = set()
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+        finally:
+            store.close()
 
         # Insert any remaining support links.
         if support_links:
@@ -564,25 +593,47 @@ class DbPreassembler:
         self._log(f"Getting refinements for {len(all_outer_stmts)} new statements")
         support_links |= self._get_support_links(all_outer_stmts)
 
-        # We now compare all new statements against batches of existing statements
+        # We now compare all new statements against batches of existing
+        # statements. Old statements of other types can never be related.
         opa_args = (db.PAStatements.create_date < start_time,)
         if self.stmt_type is not None:
             opa_args += (db.PAStatements.type == self.stmt_type,)
+        if self.prefilter:
+            new_types = {type(s).__name__ for s in all_outer_stmts}
+            opa_args += (db.PAStatements.type.in_(new_types),)
+            agent_keys = _get_related_agent_keys(self.pa.ontology,
+                                                 all_outer_stmts)
+        else:
+            agent_keys = None
 
+        # The batches (shards) of old statements are compared to the new
+        # statements by a pool of workers, each of which is given the new
+        # statements only once, when it starts.
         opa_json_iter = db.select_all_batched(self.batch_size,
                                               db.PAStatements.json,
                                               *opa_args)
-        for opa_idx, opa_json_batch in opa_json_iter:
-            opa_idx += 1  # log starting at 1
-            opa_batch = [_stmt_from_json(s_json) for s_json, in opa_json_batch]
-            # NOTE: deliberately subtracting 1 because the INDRA
-            # implementation is weird.
-            split_idx = len(all_outer_stmts) - 1
-            full_list = all_outer_stmts + opa_batch
-            self._log(f"Comparing new statements to batch {opa_idx} of old "
-                      f"statements.")
-            support_links |= \
-                self._get_support_links(full_list, split_idx=split_idx)
+        jobs = ((opa_idx + 1, [s_json for s_json, in opa_json_batch])
+                for opa_idx, opa_json_batch in opa_json_iter)
+        init_args = (self.pa, all_outer_stmts, agent_keys)
+        if self.n_proc > 1:
+            pool = Pool(self.n_proc, initializer=_init_support_worker,
+                        initargs=init_args)
+            link_iter = imap_bounded(pool, _find_shard_support_links, jobs,
+                                     2*self.n_proc)
+        else:
+            pool = None
+            _init_support_worker(*init_args)
+            link_iter = map(_find_shard_support_links, jobs)
+
+        try:
+            for opa_idx, num_compared, some_support_links in link_iter:
+                self._log(f"Compared new statements to {num_compared} "
+                          f"statements in batch {opa_idx} of old statements.")
+                support_links |= some_support_links
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
 
         # Insert any remaining support links.
         if support_links:
@@ -645,18 +696,167 @@ class DbPreassembler:
     @clockit
     def _get_support_links(self, unique_stmts, split_idx=None):
         """Find the links of refinement/support between statements."""
-        id_maps = self.pa._generate_id_maps(unique_stmts, split_idx=split_idx)
-        ret = set()
-        for ix_pair in id_maps:
-            if ix_pair[0] == ix_pair[1]:
-                assert False, "Self-comparison occurred."
-            hash_pair = \
-                tuple([shash(unique_stmts[ix]) for ix in ix_pair])
-            if hash_pair[0] == hash_pair[1]:
-                assert False, "Input list included duplicates."
-            ret.add(hash_pair)
+        return get_support_links(self.pa, unique_stmts, split_idx)
+
+
+def get_support_links(pa, unique_stmts, split_idx=None):
+    """Find the links of refinement/support between statements."""
+    id_maps = pa._generate_id_maps(unique_stmts, split_idx=split_idx)
+    ret = set()
+    for ix_pair in id_maps:
+        if ix_pair[0] == ix_pair[1]:
+            assert False, "Self-comparison occurred."
+        hash_pair = \
+            tuple([shash(unique_stmts[ix]) for ix in ix_pair])
+        if hash_pair[0] == hash_pair[1]:
+            assert False, "Input list included duplicates."
+        ret.add(hash_pair)
+
+    return ret
+
+
+class StmtBatchStore(object):
+    """A local, disk-backed store of batches of deserialized Statements.
+
+    Each batch is pickled to its own file, and read back through a memory
+    map, so repeated reads are served from the OS page cache. The most
+    recently used batches are also kept in memory. The store may be passed to
+    other processes, each of which then keeps its own in-memory cache.
+
+    Parameters
+    ----------
+    max_cached : int
+        The number of deserialized batches to keep in memory.
+    dir_path : Optional[str]
+        The directory in which to store the batches. By default a new
+        temporary directory is created.
+    """
+    def __init__(self, max_cached=4, dir_path=None):
+        if dir_path is None:
+            dir_path = tempfile.mkdtemp(prefix='indra_db_pa_')
+        self.dir_path = dir_path
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+
+    def __getstate__(self):
+        # Don't send the cached batches to other processes.
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        return state
+
+    def _get_file_path(self, batch_idx):
+        return path.join(self.dir_path, f'batch_{batch_idx}.pkl')
+
+    def _cache_batch(self, batch_idx, stmts):
+        self._cache[batch_idx] = stmts
+        self._cache.move_to_end(batch_idx)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def put(self, batch_idx, stmts):
+        """Store a batch of Statements."""
+        with open(self._get_file_path(batch_idx), 'wb') as f:
+            pickle.dump(stmts, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get(self, batch_idx):
+        """Get a batch of Statements."""
+        if batch_idx in self._cache:
+            self._cache.move_to_end(batch_idx)
+            return self._cache[batch_idx]
+        with open(self._get_file_path(batch_idx), 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            stmts = pickle.loads(mm)
+        self._cache_batch(batch_idx, stmts)
+        return stmts
+
+    def close(self):
+        """Remove the stored batches from disk."""
+        self._cache.clear()
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+
+# The preassembler used to find support links in worker processes, and when
+# supplementing, the new statements and the agent keys used to prefilter.
+_worker_pa = None
+_worker_new_stmts = None
+_worker_agent_keys = None
+
+
+def _init_support_worker(pa, new_stmts=None, agent_keys=None):
+    global _worker_pa, _worker_new_stmts, _worker_agent_keys
+    _worker_pa = pa
+    _worker_new_stmts = new_stmts
+    _worker_agent_keys = agent_keys
+
+
+def _get_agent_keys(stmt):
+    keys = set()
+    for ag in stmt.agent_list():
+        if ag is None:
+            continue
+        ns, db_id = ag.get_grounding()
+        if ns is not None:
+            keys.add((ns, db_id))
+        else:
+            keys.add(('NAME', ag.name))
+    return keys
 
-        return ret
+
+def _get_related_agent_keys(ontology, stmts):
+    """Get the agent keys of statements, and their relatives in the ontology.
+
+    An old statement can only be related to a new statement if it has an
+    agent with one of these keys.
+    """
+    keys = set()
+    for stmt in stmts:
+        keys |= _get_agent_keys(stmt)
+    related = set()
+    for ns, db_id in keys:
+        if ns == 'NAME':
+            continue
+        related |= set(ontology.get_parents(ns, db_id))
+        related |= set(ontology.get_children(ns, db_id))
+    return keys | related
+
+
+def _find_shard_support_links(job):
+    """Find the support links between the new statements and old ones."""
+    opa_idx, opa_jsons = job
+    opa_batch = [_stmt_from_json(s_json) for s_json in opa_jsons]
+    if _worker_agent_keys is not None:
+        opa_batch = [s for s in opa_batch
+                     if _get_agent_keys(s) & _worker_agent_keys]
+    if not opa_batch:
+        return opa_idx, 0, set()
+
+    # NOTE: deliberately subtracting 1 because the INDRA
+    # implementation is weird.
+    split_idx = len(_worker_new_stmts) - 1
+    full_list = _worker_new_stmts + opa_batch
+    support_links = get_support_links(_worker_pa, full_list,
+                                      split_idx=split_idx)
+    return opa_idx, len(opa_batch), support_links
+
+
+def _find_batch_support_links(job):
+    """Find the support links within and after an outer batch."""
+    store, outer_idx, num_batches = job
+    outer_batch = store.get(outer_idx)
+
+    # Get internal support links
+    support_links = get_support_links(_worker_pa, outer_batch)
+
+    # Get links with all later batches
+    for inner_idx in range(outer_idx + 1, num_batches):
+        inner_batch = store.get(inner_idx)
+        # NOTE: deliberately subtracting 1 because the INDRA
+        # implementation is weird.
+        split_idx = len(inner_batch) - 1
+        full_list = inner_batch + outer_batch
+        support_links |= \
+            get_support_links(_worker_pa, full_list, split_idx=split_idx)
+    return outer_idx, support_links
 
 
 def _stmt_from_json(stmt_json_bytes):
@@ -715,6 +915,20 @@ def _make_parser():
         help=("Select the number of statements loaded at a time. More "
               "statements at a time will run faster, but require more memory.")
     )
+    parser.add_argument(
+        '-n', '--num-procs',
+        dest='n_proc',
+        type=int,
+        default=1,
+        help=("Select the number of processes used to find support links "
+              "between statements.")
+    )
+    parser.add_argument(
+        '-p', '--prefilter',
+        action='store_true',
+        help=("When updating, only compare new statements to old statements "
+              "with the same types and related agents.")
+    )
     parser.add_argument(
         '-d', '--debug',
         action='store_true',
@@ -763,7 +977,8 @@ def _main():
     db.grab_session()
     s3_cache = S3Path.from_string(args.cache)
     pa = DbPreassembler(args.batch, s3_cache,
-                        stmt_type=args.stmt_type, yes_all=args.yes_all)
+                        stmt_type=args.stmt_type, yes_all=args.yes_all,
+                        n_proc=args.n_proc, prefilter=args.prefilter)
 
     desc = 'Continuing' if args.continuing else 'Beginning'
     print("%s to %s preassembled corpus." % (desc, args.task))
@@ -15,7 +15,7 @@ import shutil
 
 from collections import defaultdict, Counter
 from pathlib import Path
-from typing import Tuple, Set, Dict, List, Optional
+from typing import Tuple, Set, Dict, List, Optional, Iterable
 
 import networkx as nx
 import numpy as np
@@ -233,6 +233,52 @@ def reader_prioritize(reader_contents):
     return drop
 
 
+def get_drop_readings(rows: Iterable) -> Set[int]:
+    """Get the readings superseded by better readings of the same text ref
+
+    Parameters
+    ----------
+    rows :
+        An iterable of rows with the attributes reading_id, reader_version,
+        text_ref_id, text_content_source and text_content_type, sorted by
+        text_ref_id.
+
+    Returns
+    -------
+    :
+        The set of reading ids to drop
+    """
+    drop_readings = set()
+    trid = None
+    contents = defaultdict(list)
+    for row in rows:
+        if row.text_ref_id != trid:
+            for reader_name, reader_contents in contents.items():
+                if len(reader_contents) < 2:
+                    continue
+                drop_new = reader_prioritize(reader_contents)
+                # A sanity check to make sure we don't drop all
+                # the readings
+                assert len(drop_new) < len(reader_contents)
+                drop_readings |= drop_new
+            contents = defaultdict(list)
+        contents[version_to_reader[row.reader_version]].append(
+            (
+                row.reading_id,
+                row.reader_version,
+                row.text_content_source,
+                row.text_content_type,
+            )
+        )
+        trid = row.text_ref_id
+
+    # Process the last text_ref_id group
+    for _, reader_contents in contents.items():
+        if len(reader_contents) > 1:
+            drop_readings |= reader_prioritize(reader_contents)
+    return drop_readings
+
+
 def distill_statements() -> Tuple[Set, Dict]:
     if not drop_readings_fpath.exists() or not reading_to_text_ref_map_fpath.exists():
         df = pandas.read_csv(
@@ -250,37 +296,10 @@ def distill_statements() -> Tuple[Set, Dict]:
         )
         df.sort_values("text_ref_id", inplace=True)
 
-        drop_readings = set()
-        trid = df["text_ref_id"].iloc[0]
-        contents = defaultdict(list)
-
         # This takes around 1.5 hours
-        for row in tqdm(df.itertuples(), total=len(df),
-                        desc="Looping text content"):
-            if row.text_ref_id != trid:
-                for reader_name, reader_contents in contents.items():
-                    if len(reader_contents) < 2:
-                        continue
-                    drop_new = reader_prioritize(reader_contents)
-                    # A sanity check to make sure we don't drop all
-                    # the readings
-                    assert len(drop_new) < len(reader_contents)
-                    drop_readings |= drop_new
-                contents = defaultdict(list)
-            contents[version_to_reader[row.reader_version]].append(
-                (
-                    row.reading_id,
-                    row.reader_version,
-                    row.text_content_source,
-                    row.text_content_type,
-                )
-            )
-            trid = row.text_ref_id
-
-        # Process the last text_ref_id group
-        for _, reader_contents in contents.items():
-            if len(reader_contents) > 1:
-                drop_readings |= reader_prioritize(reader_contents)
+        drop_readings = get_drop_readings(
+            tqdm(df.itertuples(), total=len(df), desc="Looping text content")
+        )
 
         with drop_readings_fpath.open("wb") as fh:
             logger.info(f"Dumping drop readings set to {drop_readings_fpath}")
@@ -370,6 +389,13 @@ def preprocess(
         reading_id_to_text_ref_id: Dict,
         kb_mapping: Dict[Tuple[str, str], int],
         drop_db_info_ids: Optional[Set[int]] = None,
+        text_refs: Optional[Dict] = None,
+        raw_stmts_path: Path = raw_statements_fpath,
+        processed_stmts_path: Path = processed_stmts_reading_fpath,
+        raw_id_info_map_path: Path = raw_id_info_map_reading_fpath,
+        source_counts_path: Path = source_counts_reading_fpath,
+        stmt_hash_to_raw_stmt_ids_path: Path =
+        stmt_hash_to_raw_stmt_ids_reading_fpath,
 ):
     """Preassemble statements and collect source counts
 
@@ -383,10 +409,17 @@ def preprocess(
         A dictionary mapping source name and api name tuples to their unique db_info id
     drop_db_info_ids :
         A set of db_info ids to drop
+    text_refs :
+        A dictionary of text ref dicts keyed by text ref id. If not given,
+        the text refs are loaded from the full text refs dump.
+    raw_stmts_path :
+        The raw statements dump to process. The remaining paths are the
+        outputs. The defaults are those used for a full build, other paths
+        are used for incremental builds (see incremental_update).
     """
     if (
-            not processed_stmts_reading_fpath.exists() or
-            not source_counts_reading_fpath.exists()
+            not processed_stmts_path.exists() or
+            not source_counts_path.exists()
     ):
         logger.info("Preassembling statements, collecting source counts, "
                     "mapping from stmt hash to raw statement ids and mapping "
@@ -394,12 +427,13 @@ def preprocess(
         db_info_id_name_map = {
             db_id: name for (src_api, name), db_id in kb_mapping.items()
         }
-        text_refs = load_text_refs_by_trid(text_refs_fpath.as_posix())
+        if text_refs is None:
+            text_refs = load_text_refs_by_trid(text_refs_fpath.as_posix())
         source_counts = defaultdict(Counter)
         stmt_hash_to_raw_stmt_ids = defaultdict(set)
-        with gzip.open(raw_statements_fpath.as_posix(), "rt") as fh, \
-             gzip.open(processed_stmts_reading_fpath.as_posix(), "wt") as fh_out, \
-             gzip.open(raw_id_info_map_reading_fpath.as_posix(), "wt") as fh_info:
+        with gzip.open(raw_stmts_path.as_posix(), "rt") as fh, \
+             gzip.open(processed_stmts_path.as_posix(), "wt") as fh_out, \
+             gzip.open(raw_id_info_map_path.as_posix(), "wt") as fh_info:
             raw_stmts_reader = csv.reader(fh, delimiter="\t")
             writer = csv.writer(fh_out, delimiter="\t")
             info_writer = csv.writer(fh_info, delimiter="\t")
@@ -439,8 +473,9 @@ def preprocess(
                 # Write to the info file
                 # "raw_stmt_id_to_info_map_reading.tsv.gz"
                 info_writer.writerows(info_rows)
-                if paired_stmts_jsons:
-                    raw_ids, stmts_jsons, db_info_ids = zip(*paired_stmts_jsons)
+                if not paired_stmts_jsons:
+                    continue
+                raw_ids, stmts_jsons, db_info_ids = zip(*paired_stmts_jsons)
                 stmts = stmts_from_json(stmts_jsons)
 
                 # Use UUID mapping to keep track of the statements after
@@ -479,14 +514,14 @@ def preprocess(
         # Cast Counter to dict and pickle the source counts
         logger.info("Dumping source counts")
         source_counts = dict(source_counts)
-        with source_counts_reading_fpath.open("wb") as fh:
+        with source_counts_path.open("wb") as fh:
             pickle.dump(source_counts, fh)
             print("Source count saved")
 
         # Cast defaultdict to dict and pickle the stmt hash to raw stmt ids
         logger.info("Dumping stmt hash to raw stmt ids")
         stmt_hash_to_raw_stmt_ids = dict(stmt_hash_to_raw_stmt_ids)
-        with stmt_hash_to_raw_stmt_ids_reading_fpath.open("wb") as fh:
+        with stmt_hash_to_raw_stmt_ids_path.open("wb") as fh:
             pickle.dump(stmt_hash_to_raw_stmt_ids, fh)
 
 
@@ -618,7 +653,7 @@ def calculate_belief(
     unique_stmts_path: Path = unique_stmts_fpath,
     belief_scores_pkl_path: Path = belief_scores_pkl_fpath,
     source_counts_path: Path = source_counts_fpath,
-
+    only_hashes: Optional[Set[int]] = None,
 ):
     """Calculate belief scores for unique statements from the refinement graph
 
@@ -639,6 +674,10 @@ def calculate_belief(
         Pickle mapping ``stmt_hash → {source_name: count}``.
     belief_scores_pkl_path :
          ``{stmt_hash: belief}`` dict.
+    only_hashes :
+        If given, only the beliefs of these statements are (re)calculated
+        and the existing scores in belief_scores_pkl_path are updated,
+        rather than replaced. Used for incremental updates.
     """
     # The refinement set is a set of pairs of hashes, with the *first hash
     # being more specific than the second hash*, i.e. the evidence for the
@@ -675,7 +714,11 @@ def calculate_belief(
         source_counts = pickle.load(fh)
 
     # Store hash: belief score
-    belief_scores = {}
+    if only_hashes is not None and belief_scores_pkl_path.exists():
+        with belief_scores_pkl_path.open("rb") as fh:
+            belief_scores = pickle.load(fh)
+    else:
+        belief_scores = {}
 
     def _get_support_evidence_for_stmt(stmt_hash: int) -> List[Evidence]:
         # Find all the statements that refine the current
@@ -690,7 +733,9 @@ def calculate_belief(
             refiner_hashes = nx.ancestors(G=refinements_graph,
                                           source=stmt_hash)
             for refiner_hash in refiner_hashes:
-                summed_source_counts += Counter(source_counts[refiner_hash])
+                summed_source_counts += Counter(
+                    source_counts.get(refiner_hash, {})
+                )
 
         # Mock evidence - todo: add annotations?
         # Add evidence objects for each source's count and each source
@@ -718,17 +763,21 @@ def calculate_belief(
             for _ in tqdm(range(batch_size), leave=False, desc=f"Batch {bn}"):
                 try:
                     stmt_hash_string, stmt_json_string = next(reader)
+                    this_hash = int(stmt_hash_string)
+                    if only_hashes is not None and \
+                            this_hash not in only_hashes:
+                        continue
                     stmt = stmt_from_json(
                         clean_json_loads(stmt_json_string, remove_evidence=True)
                     )
-                    this_hash = int(stmt_hash_string)
                     stmt.evidence = _get_support_evidence_for_stmt(this_hash)
                     stmt_batch.append((this_hash, stmt))
 
                 except StopIteration:
                     break
 
-            _add_belief_scores_for_batch(stmt_batch)
+            if stmt_batch:
+                _add_belief_scores_for_batch(stmt_batch)
 
     # Dump the belief scores
     with belief_scores_pkl_path.open("wb") as fo:
@@ -0,0 +1,666 @@
+"""Incrementally update the readonly build with new principal raw statements
+
+A full readonly build (export_assembly.py followed by readonly_dumping.py)
+regenerates every intermediate file and table from full dumps of the
+principal database. This script instead only picks up the reading raw
+statements added to the principal database since the last build and:
+
+1. preassembles and hashes only the new raw statements,
+2. merges their source counts and hash to raw statement id mappings into the
+   existing ones, removing the raw statements of readings superseded by the
+   new readings,
+3. finds the refinements between the new unique statements and the existing
+   corpus (and among the new statements themselves),
+4. recalculates belief only for the statements whose support changed, i.e.
+   the new and changed statements and all the statements they refine, and
+5. upserts the belief, evidence_counts, raw_stmt_src and fast_raw_pa_link
+   tables in the local readonly database, and deletes the rows for removed
+   raw statements and statements.
+
+Knowledgebase statements are not handled here, they are updated by the
+knowledgebase pipeline. The remaining readonly tables (the meta tables,
+agent_interactions, the mesh tables etc.) are derived from the tables above
+and still require a full build to reflect the changes.
+
+The id of the last raw statement included is recorded in
+incremental_state_fpath. If that file is missing, the largest reading raw
+statement id in readonly.fast_raw_pa_link is used.
+
+An update can be rerun safely after a crash. Before any of the files of the
+full build are changed, the update is recorded as pending in the state file,
+with the sizes of the files that are appended to. The pickles that are
+rewritten are written to copies, which are only swapped in once the
+readonly tables are updated and the update is marked as committed. A rerun
+of a pending update first truncates the appended files back to their
+recorded sizes, and then repeats the same update, or, if it was committed,
+finishes swapping in the copies.
+"""
+import argparse
+import concurrent.futures
+import csv
+import gzip
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+from collections import Counter, namedtuple
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+import networkx as nx
+from indra.preassembler import Preassembler
+from indra.ontology.bio.sqlite_ontology import SqliteOntology
+from indra.statements import stmt_from_json
+from tqdm import tqdm
+
+from indra_db import get_db
+from indra_db.databases import ReadonlyDatabaseManager
+from indra_db.schemas.readonly_schema import ro_type_map
+from indra_db.readonly_dumping.export_assembly import get_drop_readings, \
+    preprocess, calculate_belief, process_batch_pair, get_related, \
+    load_statements_from_file, get_n_process, batch_size
+from indra_db.readonly_dumping.readonly_dumping import get_postgres_uri, \
+    LOCAL_RO_DB_NAME
+from indra_db.readonly_dumping.util import clean_json_loads, \
+    validate_statement_semantics
+from indra_db.readonly_dumping.locations import *
+
+logger = logging.getLogger("indra_db.readonly_dumping.incremental_update")
+logger.setLevel(logging.DEBUG)
+logger.propagate = False
+
+file_handler = logging.FileHandler(pipeline_log_fpath.absolute().as_posix(), mode='a')
+file_handler.setLevel(logging.DEBUG)
+
+formatter = logging.Formatter('%(asctime)s %(name)-12s %(levelname)-8s %(message)s', datefmt='%m-%d %H:%M')
+file_handler.setFormatter(formatter)
+
+logger.addHandler(file_handler)
+
+SQL_NULL = "\\N"
+
+ReadingMeta = namedtuple('ReadingMeta', ['reading_id', 'reader_version',
+                                         'text_content_id', 'text_ref_id',
+                                         'text_content_source',
+                                         'text_content_type'])
+
+
+def load_state(ro_mngr: ReadonlyDatabaseManager) -> Dict:
+    """Load the state of the last build, or infer it from the readonly db"""
+    if incremental_state_fpath.exists():
+        with incremental_state_fpath.open("r") as fh:
+            return json.load(fh)
+
+    logger.info("No incremental state found, getting the largest raw "
+                "statement id from the readonly database.")
+    cur = ro_mngr.get_copy_cursor()
+    cur.execute("SELECT max(id) FROM readonly.fast_raw_pa_link "
+                "WHERE reading_id IS NOT NULL")
+    max_id, = cur.fetchone()
+    ro_mngr.commit_copy("Failed to get the largest raw statement id.")
+    if max_id is None:
+        raise ValueError("readonly.fast_raw_pa_link is empty, run a full "
+                         "build first.")
+    return {"max_raw_stmt_id": max_id, "updated": None}
+
+
+def _write_state(state: Dict):
+    # Write a new file and move it, so the state is never half written.
+    tmp_fpath = incremental_state_fpath.with_name(
+        incremental_state_fpath.name + ".tmp"
+    )
+    with tmp_fpath.open("w") as fh:
+        json.dump(state, fh)
+    os.replace(tmp_fpath, incremental_state_fpath)
+
+
+def save_state(max_raw_stmt_id: int):
+    _write_state({"max_raw_stmt_id": max_raw_stmt_id,
+                  "updated": datetime.utcnow().isoformat()})
+
+
+def _get_appended_files() -> List[Path]:
+    return [unique_stmts_fpath, processed_stmts_fpath, raw_id_info_map_fpath,
+            refinements_fpath]
+
+
+def _get_swapped_files() -> List[Tuple[Path, Path]]:
+    return [(merged_source_counts_fpath, source_counts_fpath),
+            (merged_stmt_hash_to_raw_stmt_ids_fpath,
+             stmt_hash_to_raw_stmt_ids_fpath),
+            (merged_belief_scores_pkl_fpath, belief_scores_pkl_fpath)]
+
+
+def begin_update(state: Dict, max_raw_stmt_id: int,
+                 superseded: List[Tuple[int, int, str]]) -> Dict:
+    """Record an update as pending before the build files are changed
+
+    The superseded raw statements are recorded as well, as they are deleted
+    from the readonly database during the update, so a rerun could not
+    find them again.
+    """
+    pending = {
+        "max_raw_stmt_id": max_raw_stmt_id,
+        "superseded": [list(row) for row in superseded],
+        "sizes": {fpath.as_posix(): fpath.stat().st_size
+                  for fpath in _get_appended_files()},
+        "n_split_files": len(_get_split_files()),
+        "committed": False,
+    }
+    _write_state(dict(state, pending=pending))
+    return pending
+
+
+def rollback_update(pending: Dict):
+    """Undo the changes of a pending update to the build files"""
+    logger.info("Rolling back the files of an interrupted update")
+    for fpath_str, size in pending["sizes"].items():
+        with open(fpath_str, "r+b") as fh:
+            fh.truncate(size)
+    for split_file in _get_split_files()[pending["n_split_files"]:]:
+        os.remove(split_file)
+
+
+def commit_update(state: Dict, pending: Dict):
+    """Swap the updated copies of the build files in, and save the state"""
+    _write_state(dict(state, pending=dict(pending, committed=True)))
+    for merged_fpath, fpath in _get_swapped_files():
+        # A rerun of a committed update may find some already swapped in.
+        if merged_fpath.exists():
+            os.replace(merged_fpath, fpath)
+    save_state(pending["max_raw_stmt_id"])
+
+
+def dump_new_raw_statements(db, min_id: int, max_id: int):
+    """Dump the reading raw statements with min_id < id <= max_id
+
+    The columns are the same as those of the full raw statements dump.
+    """
+    logger.info(f"Dumping raw statements with ids in ({min_id}, {max_id}]")
+    cur = db.get_copy_cursor()
+    sql = (
+        "COPY (SELECT id, db_info_id, reading_id, "
+        "convert_from(json::bytea, 'utf-8') FROM public.raw_statements "
+        f"WHERE reading_id IS NOT NULL AND id > {int(min_id)} "
+        f"AND id <= {int(max_id)}) TO STDOUT"
+    )
+    with gzip.open(new_raw_statements_fpath.as_posix(), "wb") as fh:
+        cur.copy_expert(sql, fh)
+    db.commit_copy("Failed to dump the new raw statements.")
+
+
+def get_new_reading_ids() -> Set[int]:
+    reading_ids = set()
+    with gzip.open(new_raw_statements_fpath.as_posix(), "rt") as fh:
+        for _, _, reading_id, _ in csv.reader(fh, delimiter="\t"):
+            reading_ids.add(int(reading_id))
+    return reading_ids
+
+
+def get_reading_info(db, reading_ids: Set[int]) \
+        -> Tuple[Set[int], Dict[int, int], Dict[int, Dict]]:
+    """Get the reading and text ref info for the text refs of new readings
+
+    All the readings of the text refs are needed (not just the new ones) to
+    decide which readings are dropped in favour of better ones.
+
+    Returns
+    -------
+    :
+        The set of reading ids to drop, a mapping from reading id to text
+        ref id and a mapping from text ref id to text ref dicts, in the same
+        format as load_text_refs_by_trid.
+    """
+    cur = db.get_copy_cursor()
+    cur.execute(
+        "SELECT rd.id, rd.reader_version, tc.id, tc.text_ref_id, tc.source,\n"
+        "       tc.text_type\n"
+        "FROM text_content AS tc JOIN reading AS rd\n"
+        "  ON tc.id = rd.text_content_id\n"
+        "WHERE tc.text_ref_id IN (\n"
+        "  SELECT tc2.text_ref_id FROM text_content AS tc2 JOIN reading AS rd2\n"
+        "    ON tc2.id = rd2.text_content_id WHERE rd2.id = ANY(%s))\n"
+        "ORDER BY tc.text_ref_id",
+        (list(reading_ids),)
+    )
+    rows = [ReadingMeta(*row) for row in cur.fetchall()]
+    drop_readings = get_drop_readings(rows)
+    reading_id_to_trid = {row.reading_id: row.text_ref_id for row in rows}
+
+    trids = list({row.text_ref_id for row in rows})
+    cur.execute("SELECT id, pmid, pmcid, doi, pii, url, manuscript_id "
+                "FROM text_ref WHERE id = ANY(%s)", (trids,))
+    id_names = ["TRID", "PMID", "PMCID", "DOI", "PII", "URL", "MANUSCRIPT_ID"]
+    text_refs = {}
+    for ids in cur.fetchall():
+        text_refs[ids[0]] = {id_name: id_val
+                             for id_name, id_val in zip(id_names, ids)
+                             if id_val is not None}
+    db.commit_copy("Failed to get reading info.")
+    return drop_readings, reading_id_to_trid, text_refs
+
+
+def get_superseded_raw_stmts(ro_mngr: ReadonlyDatabaseManager,
+                             reading_ids: Set[int]) \
+        -> List[Tuple[int, int, str]]:
+    """Get (raw id, hash, source) for raw statements of superseded readings"""
+    if not reading_ids:
+        return []
+    cur = ro_mngr.get_copy_cursor()
+    cur.execute("SELECT f.id, f.mk_hash, s.src\n"
+                "FROM readonly.fast_raw_pa_link AS f\n"
+                "JOIN readonly.raw_stmt_src AS s ON s.sid = f.id\n"
+                "WHERE f.reading_id = ANY(%s)", (list(reading_ids),))
+    res = cur.fetchall()
+    ro_mngr.commit_copy("Failed to get superseded raw statements.")
+    return res
+
+
+def merge_counts(removed_raw_stmts: List[Tuple[int, int, str]]) \
+        -> Tuple[Set[int], Set[int], Dict[int, Counter]]:
+    """Merge the new source counts and raw id mappings into the existing ones
+
+    The merged mappings are written to merged_source_counts_fpath and
+    merged_stmt_hash_to_raw_stmt_ids_fpath, the existing files are left
+    unchanged until the update is committed.
+
+    Returns
+    -------
+    :
+        The set of hashes with changed source counts, the set of hashes that
+        no longer have any raw statements and the merged source counts.
+    """
+    with source_counts_fpath.open("rb") as fh:
+        source_counts = pickle.load(fh)
+    with stmt_hash_to_raw_stmt_ids_fpath.open("rb") as fh:
+        hash_to_raw_ids = pickle.load(fh)
+    with new_source_counts_fpath.open("rb") as fh:
+        new_source_counts = pickle.load(fh)
+    with new_stmt_hash_to_raw_stmt_ids_fpath.open("rb") as fh:
+        new_hash_to_raw_ids = pickle.load(fh)
+
+    changed_hashes = set()
+    for raw_id, stmt_hash, src in removed_raw_stmts:
+        raw_ids = hash_to_raw_ids.get(stmt_hash)
+        if not raw_ids or raw_id not in raw_ids:
+            continue
+        raw_ids.remove(raw_id)
+        counts = source_counts[stmt_hash]
+        counts[src] -= 1
+        if counts[src] <= 0:
+            del counts[src]
+        changed_hashes.add(stmt_hash)
+
+    for stmt_hash, counts in new_source_counts.items():
+        source_counts.setdefault(stmt_hash, Counter()).update(counts)
+        hash_to_raw_ids.setdefault(stmt_hash, set()).update(
+            new_hash_to_raw_ids[stmt_hash]
+        )
+        changed_hashes.add(stmt_hash)
+
+    removed_hashes = {h for h in changed_hashes if not hash_to_raw_ids[h]}
+    for stmt_hash in removed_hashes:
+        del hash_to_raw_ids[stmt_hash]
+        del source_counts[stmt_hash]
+    changed_hashes -= removed_hashes
+
+    with merged_source_counts_fpath.open("wb") as fh:
+        pickle.dump(source_counts, fh)
+    with merged_stmt_hash_to_raw_stmt_ids_fpath.open("wb") as fh:
+        pickle.dump(hash_to_raw_ids, fh)
+    return changed_hashes, removed_hashes, source_counts
+
+
+def get_existing_hashes() -> Set[int]:
+    """Get the hashes of the unique statements from the split files"""
+    hashes = set()
+    for split_file in _get_split_files():
+        with gzip.open(split_file, "rt") as fh:
+            hashes |= {int(sh) for sh, _ in csv.reader(fh, delimiter="\t")}
+    return hashes
+
+
+def _get_split_files() -> List[str]:
+    folder = split_unique_statements_folder_fpath.absolute().as_posix()
+    split_files = [os.path.join(folder, f) for f in os.listdir(folder)
+                   if f.endswith(".tsv.gz")]
+    return sorted(split_files,
+                  key=lambda f: int(re.findall(r'\d+', os.path.basename(f))[0]))
+
+
+def write_new_unique_statements(existing_hashes: Set[int]) -> Dict[int, str]:
+    """Write the new, valid, unique statements and return their json"""
+    new_stmts = {}
+    with gzip.open(new_processed_stmts_fpath.as_posix(), "rt") as fh, \
+            gzip.open(new_unique_stmts_fpath.as_posix(), "wt") as fh_out:
+        reader = csv.reader(fh, delimiter="\t")
+        writer = csv.writer(fh_out, delimiter="\t")
+        for sh, stmt_json_str in reader:
+            this_hash = int(sh)
+            if this_hash in existing_hashes or this_hash in new_stmts:
+                continue
+            stmt = stmt_from_json(clean_json_loads(stmt_json_str))
+            if not validate_statement_semantics(stmt):
+                continue
+            writer.writerow((sh, stmt_json_str))
+            new_stmts[this_hash] = stmt_json_str
+    return new_stmts
+
+
+def get_new_refinements(split_files: List[str], n_proc: int) \
+        -> Set[Tuple[int, int]]:
+    """Get refinements between the new statements and the existing ones"""
+    new_file = new_unique_stmts_fpath.absolute().as_posix()
+    tasks = [(new_file, split_file) for split_file in split_files]
+    refinements = set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_proc) \
+            as executor:
+        for result in tqdm(executor.map(process_batch_pair, tasks),
+                           total=len(tasks), desc="Finding refinements"):
+            refinements |= result
+
+    sqlite_ontology = SqliteOntology(
+        db_path=sql_ontology_db_fpath.absolute().as_posix())
+    sqlite_ontology.initialize()
+    pa = Preassembler(sqlite_ontology)
+    refinements |= get_related(load_statements_from_file(new_file), pa=pa)
+    return refinements
+
+
+def _append_gz(src_path, dst_path):
+    # Concatenated gzip members are read as a single stream.
+    with open(src_path, "rb") as f_in, open(dst_path, "ab") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+
+
+def _copy_text(value) -> str:
+    # Format a value for COPY ... FROM STDIN in the (default) text format
+    if value is None:
+        return SQL_NULL
+    if isinstance(value, bytes):
+        return "\\\\x" + value.hex()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t") \
+        .replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _stage_rows(cur, table: str, cols: List[str], rows: Iterable):
+    """Copy rows into a temp table shaped like the given readonly table"""
+    col_str = ", ".join(cols)
+    cur.execute(f"CREATE TEMP TABLE tmp_{table} ON COMMIT DROP AS "
+                f"SELECT {col_str} FROM readonly.{table} WITH NO DATA")
+    buf = StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_text(v) for v in row) + "\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY tmp_{table} ({col_str}) FROM STDIN", buf)
+
+
+def upsert_rows(ro_mngr: ReadonlyDatabaseManager, table: str,
+                cols: List[str], rows: Iterable):
+    """Insert rows into a readonly table, updating rows with the same key
+
+    The first column must be the primary key of the table.
+    """
+    cur = ro_mngr.get_copy_cursor()
+    _stage_rows(cur, table, cols, rows)
+    col_str = ", ".join(cols)
+    update = ", ".join(f"{c} = EXCLUDED.{c}" for c in cols[1:])
+    cur.execute(f"INSERT INTO readonly.{table} ({col_str})\n"
+                f"SELECT {col_str} FROM tmp_{table}\n"
+                f"ON CONFLICT ON CONSTRAINT {table}_pkey DO UPDATE "
+                f"SET {update}")
+    logger.info(f"Upserted {cur.rowcount} rows into readonly.{table}")
+    ro_mngr.commit_copy(f"Failed to upsert into readonly.{table}.")
+
+
+def delete_rows(ro_mngr: ReadonlyDatabaseManager, table: str, key: str,
+                values: Set[int]):
+    if not values:
+        return
+    cur = ro_mngr.get_copy_cursor()
+    cur.execute(f"DELETE FROM readonly.{table} WHERE {key} = ANY(%s)",
+                (list(values),))
+    logger.info(f"Deleted {cur.rowcount} rows from readonly.{table}")
+    ro_mngr.commit_copy(f"Failed to delete from readonly.{table}.")
+
+
+def update_fast_raw_pa_link(ro_mngr: ReadonlyDatabaseManager,
+                            new_stmts: Dict[int, str],
+                            raw_id_to_hash: Dict[int, int]):
+    """Insert the new raw statements into readonly.fast_raw_pa_link
+
+    Raw statements of existing statements get the pa_json already in the
+    table, like in the full build, where there is one pa_json per hash.
+    """
+    stmt_types = {}
+    with gzip.open(new_processed_stmts_fpath.as_posix(), "rt") as fh:
+        for sh, stmt_json_str in csv.reader(fh, delimiter="\t"):
+            stmt_types[int(sh)] = clean_json_loads(stmt_json_str)["type"]
+
+    rows = []
+    with gzip.open(new_raw_id_info_map_fpath.as_posix(), "rt") as fh:
+        for raw_stmt_id, _, reading_id, stmt_json_raw \
+                in csv.reader(fh, delimiter="\t"):
+            this_hash = raw_id_to_hash.get(int(raw_stmt_id))
+            if this_hash is None:
+                continue
+            pa_json = new_stmts.get(this_hash)
+            # As in the full build, src is only set for knowledgebase
+            # statements.
+            rows.append((
+                int(raw_stmt_id),
+                stmt_json_raw.encode("utf-8"),
+                int(reading_id),
+                None,
+                this_hash,
+                pa_json.encode("utf-8") if pa_json else None,
+                ro_type_map._str_to_int[stmt_types[this_hash]],
+                None,
+            ))
+
+    cols = ["id", "raw_json", "reading_id", "db_info_id", "mk_hash",
+            "pa_json", "type_num", "src"]
+    col_str = ", ".join(cols)
+    cur = ro_mngr.get_copy_cursor()
+    _stage_rows(cur, "fast_raw_pa_link", cols, rows)
+    cur.execute(
+        "UPDATE tmp_fast_raw_pa_link AS t SET pa_json = f.pa_json\n"
+        "FROM (SELECT DISTINCT ON (mk_hash) mk_hash, pa_json\n"
+        "      FROM readonly.fast_raw_pa_link\n"
+        "      WHERE mk_hash IN (SELECT mk_hash FROM tmp_fast_raw_pa_link\n"
+        "                        WHERE pa_json IS NULL)) AS f\n"
+        "WHERE t.pa_json IS NULL AND t.mk_hash = f.mk_hash"
+    )
+    # There is no primary key on fast_raw_pa_link, so delete any rows from
+    # a previous, interrupted, run before inserting.
+    cur.execute("DELETE FROM readonly.fast_raw_pa_link\n"
+                "WHERE id IN (SELECT id FROM tmp_fast_raw_pa_link)")
+    cur.execute(f"INSERT INTO readonly.fast_raw_pa_link ({col_str})\n"
+                f"SELECT {col_str} FROM tmp_fast_raw_pa_link")
+    logger.info(f"Inserted {cur.rowcount} rows into "
+                f"readonly.fast_raw_pa_link")
+    ro_mngr.commit_copy("Failed to update readonly.fast_raw_pa_link.")
+
+
+def incremental_update(db, ro_mngr: ReadonlyDatabaseManager,
+                       n_proc: int = 1):
+    """Update the readonly build with the raw statements added since the
+    last build"""
+    state = load_state(ro_mngr)
+    pending = state.pop("pending", None)
+    if pending is not None and pending["committed"]:
+        logger.info("Finishing an interrupted update that was committed")
+        commit_update(state, pending)
+        state = load_state(ro_mngr)
+        pending = None
+    elif pending is not None:
+        rollback_update(pending)
+
+    last_max_id = state["max_raw_stmt_id"]
+    if pending is not None:
+        # Repeat the same update, the superseded raw statements it found
+        # may already be gone from the readonly database.
+        max_id = pending["max_raw_stmt_id"]
+        logger.info(f"Repeating the interrupted update up to raw statement "
+                    f"id {max_id}")
+    else:
+        cur = db.get_copy_cursor()
+        cur.execute("SELECT max(id) FROM raw_statements")
+        max_id, = cur.fetchone()
+        db.commit_copy("Failed to get the largest raw statement id.")
+    if max_id is None or max_id <= last_max_id:
+        logger.info("No new raw statements, nothing to update.")
+        return
+
+    # Clear out the files from any previous increment.
+    shutil.rmtree(INCREMENTAL_DIR.base)
+    INCREMENTAL_DIR.base.mkdir(parents=True)
+
+    # 1. Dump, distill and preprocess the new raw statements
+    dump_new_raw_statements(db, last_max_id, max_id)
+    new_reading_ids = get_new_reading_ids()
+    if not new_reading_ids:
+        logger.info("No new reading raw statements, nothing to update.")
+        save_state(max_id)
+        return
+    drop_readings, reading_id_to_trid, text_refs = \
+        get_reading_info(db, new_reading_ids)
+    preprocess(
+        drop_readings=drop_readings,
+        reading_id_to_text_ref_id=reading_id_to_trid,
+        kb_mapping={},
+        text_refs=text_refs,
+        raw_stmts_path=new_raw_statements_fpath,
+        processed_stmts_path=new_processed_stmts_fpath,
+        raw_id_info_map_path=new_raw_id_info_map_fpath,
+        source_counts_path=new_source_counts_fpath,
+        stmt_hash_to_raw_stmt_ids_path=new_stmt_hash_to_raw_stmt_ids_fpath,
+    )
+
+    # 2. Merge the source counts and raw statement id mappings, removing
+    # the raw statements from readings superseded by the new readings.
+    if pending is not None:
+        superseded = [tuple(row) for row in pending["superseded"]]
+    else:
+        superseded = get_superseded_raw_stmts(ro_mngr,
+                                              drop_readings - new_reading_ids)
+    logger.info(f"Removing {len(superseded)} raw statements from superseded "
+                f"readings")
+    pending = begin_update(state, max_id, superseded)
+    changed_hashes, removed_hashes, source_counts = merge_counts(superseded)
+
+    # 3. Write out the new unique statements and find their refinements
+    existing_hashes = get_existing_hashes()
+    new_stmts = write_new_unique_statements(existing_hashes)
+    logger.info(f"Found {len(new_stmts)} new unique statements")
+    split_files = _get_split_files()
+    if new_stmts:
+        new_refinements = get_new_refinements(split_files, n_proc)
+        logger.info(f"Found {len(new_refinements)} new refinements")
+        with gzip.open(refinements_fpath.as_posix(), "at") as fh:
+            csv.writer(fh, delimiter="\t").writerows(new_refinements)
+        _append_gz(new_unique_stmts_fpath, unique_stmts_fpath)
+        shutil.copyfile(
+            new_unique_stmts_fpath,
+            split_unique_statements_folder_fpath.joinpath(
+                f"split_{len(split_files)}.tsv.gz")
+        )
+    _append_gz(new_processed_stmts_fpath, processed_stmts_fpath)
+    _append_gz(new_raw_id_info_map_fpath, raw_id_info_map_fpath)
+
+    # 4. Recalculate belief for the changed statements and every statement
+    # they refine, as those get the changed statements' evidence.
+    with gzip.open(refinements_fpath.as_posix(), "rt") as fh:
+        ref_graph = nx.DiGraph()
+        ref_graph.add_edges_from((int(h1), int(h2)) for h1, h2
+                                 in csv.reader(fh, delimiter="\t"))
+    ref_graph.remove_nodes_from(removed_hashes)
+    affected = set(changed_hashes)
+    for stmt_hash in changed_hashes:
+        if stmt_hash in ref_graph:
+            affected |= nx.descendants(ref_graph, stmt_hash)
+    logger.info(f"Recalculating belief for {len(affected)} statements")
+    source_mapping = {r.db_name: r.source_api
+                      for r in db.select_all(db.DBInfo)}
+    shutil.copyfile(belief_scores_pkl_fpath, merged_belief_scores_pkl_fpath)
+    calculate_belief(
+        ref_graph,
+        num_batches=len(source_counts) // batch_size + 1,
+        batch_size=batch_size,
+        source_mapping=source_mapping,
+        belief_scores_pkl_path=merged_belief_scores_pkl_fpath,
+        source_counts_path=merged_source_counts_fpath,
+        only_hashes=affected,
+    )
+    with merged_belief_scores_pkl_fpath.open("rb") as fh:
+        belief_scores = pickle.load(fh)
+    for stmt_hash in removed_hashes:
+        belief_scores.pop(stmt_hash, None)
+    with merged_belief_scores_pkl_fpath.open("wb") as fh:
+        pickle.dump(belief_scores, fh)
+
+    # 5. Update the readonly tables
+    removed_raw_ids = {raw_id for raw_id, _, _ in superseded}
+    delete_rows(ro_mngr, "fast_raw_pa_link", "id", removed_raw_ids)
+    delete_rows(ro_mngr, "raw_stmt_src", "sid", removed_raw_ids)
+    delete_rows(ro_mngr, "belief", "mk_hash", removed_hashes)
+    delete_rows(ro_mngr, "evidence_counts", "mk_hash", removed_hashes)
+
+    upsert_rows(ro_mngr, "belief", ["mk_hash", "belief"],
+                ((h, belief_scores[h]) for h in affected
+                 if h in belief_scores))
+    upsert_rows(ro_mngr, "evidence_counts", ["mk_hash", "ev_count"],
+                ((h, sum(source_counts[h].values())) for h in changed_hashes))
+    with new_stmt_hash_to_raw_stmt_ids_fpath.open("rb") as fh:
+        raw_id_to_hash = {raw_id: sh for sh, raw_ids in pickle.load(fh).items()
+                          for raw_id in raw_ids}
+    with gzip.open(new_raw_id_info_map_fpath.as_posix(), "rt") as fh:
+        raw_srcs = [
+            (int(raw_stmt_id),
+             clean_json_loads(stmt_json_raw)['evidence'][0]['source_api'])
+            for raw_stmt_id, _, _, stmt_json_raw
+            in csv.reader(fh, delimiter="\t")
+            if int(raw_stmt_id) in raw_id_to_hash
+        ]
+    upsert_rows(ro_mngr, "raw_stmt_src", ["sid", "src"], raw_srcs)
+    update_fast_raw_pa_link(ro_mngr, new_stmts, raw_id_to_hash)
+
+    commit_update(state, pending)
+    logger.info(f"Incremental update done, last raw statement id is "
+                f"{max_id}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        "Incrementally update the readonly build with new raw statements"
+    )
+    parser.add_argument("--db-name", default=LOCAL_RO_DB_NAME)
+    parser.add_argument("--user", required=True,
+                        help="Username for the local readonly db.")
+    parser.add_argument("--password", required=True,
+                        help="Password for the local readonly db.")
+    parser.add_argument("--port", default=5432,
+                        help="The port the local db server listens to.")
+    parser.add_argument("--n-proc", type=int, default=None,
+                        help="The number of processes used to find "
+                             "refinements. By default, this is based on the "
+                             "available memory and cores.")
+    args = parser.parse_args()
+
+    principal_db = get_db("primary")
+    if principal_db is None:
+        raise ValueError("Could not connect to principal db")
+
+    postgres_url = get_postgres_uri(
+        username=args.user,
+        password=args.password,
+        port=args.port,
+        db_name=args.db_name,
+    )
+    ro_manager = ReadonlyDatabaseManager(postgres_url, protected=False)
+    incremental_update(principal_db, ro_manager,
+                       n_proc=args.n_proc or get_n_process())
@@ -8,6 +8,7 @@ __all__ = [
     "TEMP_DIR",
     "PUBMED_MESH_DIR",
     "pubmed_xml_gz_dir",
+    "pubmed_mesh_shards_dir",
     "raw_statements_fpath",
     "reading_text_content_fpath",
     "text_refs_fpath",
@@ -47,10 +48,10 @@ __all__ = [
     "mesh_terms_meta_fpath",
     "raw_stmt_mesh_concepts_fpath",
     "raw_stmt_mesh_terms_fpath",
-    "pa_meta_fpath",
-    "name_meta_tsv",
-    "text_meta_tsv",
-    "other_meta_tsv",
+    "pa_meta_parts_dir",
+    "name_meta_dir",
+    "text_meta_dir",
+    "other_meta_dir",
     "source_meta_parquet",
     "evidence_counts_tsv",
     "pa_agents_counts_tsv",
@@ -64,7 +65,18 @@ __all__ = [
     "export_benchmark",
     "table_benchmark",
     "pipeline_log_fpath",
-    "knowledgebase_source_data_fpath"
+    "knowledgebase_source_data_fpath",
+    "INCREMENTAL_DIR",
+    "incremental_state_fpath",
+    "new_raw_statements_fpath",
+    "new_processed_stmts_fpath",
+    "new_raw_id_info_map_fpath",
+    "new_source_counts_fpath",
+    "new_stmt_hash_to_raw_stmt_ids_fpath",
+    "new_unique_stmts_fpath",
+    "merged_source_counts_fpath",
+    "merged_stmt_hash_to_raw_stmt_ids_fpath",
+    "merged_belief_scores_pkl_fpath",
 ]
 pipeline_log_fpath = TEMP_DIR.join(name="Pipeline.log")
 
@@ -113,6 +125,32 @@ pa_hash_act_type_ag_count_cache = TEMP_DIR.join(
     name="pa_hash_act_type_ag_count_cache.pkl"
 )
 
+# Incremental updates
+incremental_state_fpath = TEMP_DIR.join(name="incremental_state.json")
+INCREMENTAL_DIR = TEMP_DIR.module("incremental")
+new_raw_statements_fpath = INCREMENTAL_DIR.join(name="raw_statements.tsv.gz")
+new_processed_stmts_fpath = INCREMENTAL_DIR.join(
+    name="processed_statements.tsv.gz"
+)
+new_raw_id_info_map_fpath = INCREMENTAL_DIR.join(
+    name="raw_stmt_id_to_info_map.tsv.gz"
+)
+new_source_counts_fpath = INCREMENTAL_DIR.join(name="source_counts.pkl")
+new_stmt_hash_to_raw_stmt_ids_fpath = INCREMENTAL_DIR.join(
+    name="stmt_hash_to_raw_stmt_ids.pkl"
+)
+new_unique_stmts_fpath = INCREMENTAL_DIR.join(name="unique_statements.tsv.gz")
+# Updated copies of the full build files, swapped in when an update is done
+merged_source_counts_fpath = INCREMENTAL_DIR.join(
+    name="merged_source_counts.pkl"
+)
+merged_stmt_hash_to_raw_stmt_ids_fpath = INCREMENTAL_DIR.join(
+    name="merged_stmt_hash_to_raw_stmt_ids.pkl"
+)
+merged_belief_scores_pkl_fpath = INCREMENTAL_DIR.join(
+    name="merged_belief_scores.pkl"
+)
+
 # Temporary tsv files used for load into readonly db
 belief_scores_tsv_fpath = TEMP_DIR.join(name="belief_scores.tsv")
 reading_ref_link_tsv_fpath = TEMP_DIR.join(name="reading_ref_link.tsv")
@@ -121,6 +159,7 @@ raw_stmt_source_tsv_fpath = TEMP_DIR.join(name="raw_stmt_source.tsv")
 # Pubmed XML files
 PUBMED_MESH_DIR = TEMP_DIR.module("pubmed_mesh")
 pubmed_xml_gz_dir = PUBMED_MESH_DIR.join(name="pubmed_xml_gz")
+pubmed_mesh_shards_dir = PUBMED_MESH_DIR.join(name="mesh_shards")
 
 # stmt hash-pmid-MeSH map
 pmid_mesh_map_fpath = PUBMED_MESH_DIR.join(name="pmid_mesh_map.pkl")
@@ -143,10 +182,10 @@ raw_stmt_mesh_concepts_fpath = PUBMED_MESH_DIR.join(name="raw_stmt_mesh_concepts
 raw_stmt_mesh_terms_fpath = PUBMED_MESH_DIR.join(name="raw_stmt_mesh_terms.tsv")
 
 # PaMeta and derived files
-pa_meta_fpath = TEMP_DIR.join(name="pa_meta.tsv")
-name_meta_tsv = TEMP_DIR.join(name="name_meta.tsv")
-text_meta_tsv = TEMP_DIR.join(name="text_meta.tsv")
-other_meta_tsv = TEMP_DIR.join(name="other_meta.tsv")
+pa_meta_parts_dir = TEMP_DIR.join("pa_meta_parts")
+name_meta_dir = TEMP_DIR.join(name="name_meta")
+text_meta_dir = TEMP_DIR.join(name="text_meta")
+other_meta_dir = TEMP_DIR.join(name="other_meta")
 
 # SourceMeta
 source_meta_parquet = TEMP_DIR.join(name="source_meta.parquet")
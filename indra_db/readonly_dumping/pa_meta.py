@@ -0,0 +1,271 @@
+"""Build the Name/Text/OtherMeta load files from columns of agent data.
+
+The agents of the pa_meta dump (see :func:`ensure_pa_meta
+<indra_db.readonly_dumping.readonly_dumping.ensure_pa_meta>`) are joined to
+the statement metadata on mk_hash with sorted arrays, the extra rows of
+Complexes are added as whole columns, and each part is written as a tsv
+file in the directories of the three tables. The agents of the unique
+statements that are missing from pa_meta are made from the unique
+statement shards the same way.
+"""
+import csv
+import gzip
+import logging
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from indra.statements import stmt_from_json
+
+from indra_db.readonly_dumping.util import clean_json_loads, isin_sorted
+from indra_db.schemas.readonly_schema import ro_role_map, ro_type_map
+
+logger = logging.getLogger(__name__)
+
+NAME_META_COLUMNS = ["ag_id", "ag_num", "db_id", "role_num", "type_num",
+                     "mk_hash", "ev_count", "belief", "activity", "is_active",
+                     "agent_count", "is_complex_dup"]
+OTHER_META_COLUMNS = NAME_META_COLUMNS[:2] + ["db_name"] + \
+    NAME_META_COLUMNS[2:]
+
+# Files written after all the parts of a table, and skipped by spark.
+SUCCESS_MARKER = "_SUCCESS"
+
+# The statement metadata and the hashes in pa_meta are shared with the
+# (forked) workers through this, rather than copied to each of them.
+_shared = {}
+
+
+def synth_ag_id(mk_hash, ag_num, role_num, db_name, db_id):
+    int_mask = 0x7FFFFFFF  # 31 low bits set
+    # Deterministic, compact, and stable across runs
+    # The ID is guaranteed to be in the range [-INT32_MAX, -1].
+    crc32_full = zlib.crc32(
+        f"{mk_hash}|{ag_num}|{role_num}|{db_name}|{db_id}".encode()
+    )
+    id_pos = crc32_full & int_mask
+    if id_pos == 0:
+        id_pos = 1
+    return -id_pos
+
+
+def join_stmt_meta(agents: pd.DataFrame, stmt_meta: pd.DataFrame) \
+        -> pd.DataFrame:
+    """Add the statement metadata to the agents of statements that have it.
+
+    Agents of statements without metadata, belief or evidence are dropped.
+    """
+    sorted_hashes = stmt_meta["mk_hash"].values
+    hashes = agents["mk_hash"].values
+    found = isin_sorted(sorted_hashes, hashes)
+    meta_idx = np.searchsorted(sorted_hashes, hashes[found])
+    meta = stmt_meta.iloc[meta_idx].reset_index(drop=True)
+    joined = pd.concat([agents[found].drop(columns="mk_hash")
+                        .reset_index(drop=True), meta], axis=1)
+    keep = joined["belief"].notna().to_numpy(dtype=bool) & \
+        (joined["ev_count"].values > 0)
+    return joined[keep].assign(is_complex_dup=False)
+
+
+def expand_complex_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    """Add the duplicated subject and object rows of the Complex agents."""
+    complexes = rows[rows["type_num"].values == ro_type_map.get_int("Complex")]
+    dups = [complexes.assign(ag_num=ag_num, role_num=role_num,
+                             is_complex_dup=True)
+            for ag_num, role_num in [(0, -1), (1, 1)]]
+    return pd.concat([rows] + dups, ignore_index=True)
+
+
+def write_agent_meta(rows: pd.DataFrame, out_dirs: Tuple[Path, Path, Path],
+                     part_name: str):
+    """Write rows to the name, text and other meta directories by db_name."""
+    db_names = rows["db_name"].values
+    is_name = db_names == "NAME"
+    is_text = db_names == "TEXT"
+    name_dir, text_dir, other_dir = out_dirs
+    for out_dir, mask, columns in [
+        (name_dir, is_name, NAME_META_COLUMNS),
+        (text_dir, is_text, NAME_META_COLUMNS),
+        (other_dir, ~(is_name | is_text), OTHER_META_COLUMNS),
+    ]:
+        rows.loc[mask, columns].to_csv(Path(out_dir) / f"{part_name}.tsv",
+                                       sep="\t", header=False, index=False)
+
+
+def load_pa_meta_part(part_fpath: Path) -> pd.DataFrame:
+    """Load a part of the pa_meta dump as columns."""
+    part = pd.read_csv(
+        part_fpath, sep="\t", compression="gzip", keep_default_na=False,
+        dtype={"db_name": str, "db_id": str, "ag_id": np.int64,
+               "ag_num": np.int64, "role": str, "mk_hash": np.int64},
+    )
+    role_nums = {role: ro_role_map.get_int(role)
+                 for role in part["role"].unique()}
+    return pd.DataFrame({
+        "ag_id": part["ag_id"].values,
+        "ag_num": part["ag_num"].values,
+        "db_name": part["db_name"].values,
+        "db_id": part["db_id"].str.replace("\n", " ", regex=False)
+                              .str.replace("\r", " ", regex=False).values,
+        "role_num": part["role"].map(role_nums).values.astype(np.int16),
+        "mk_hash": part["mk_hash"].values,
+    })
+
+
+def get_stmt_agents(stmt_hash: int, stmt_json: dict) -> List[tuple]:
+    """Get the ag_id, ag_num, db_name, db_id and role_num of each grounding
+    of each agent of a statement."""
+    stmt = stmt_from_json(stmt_json)
+    rows = []
+    for ag_num, ag in enumerate(stmt.agent_list()):
+        if ag is None:
+            continue
+
+        if ag_num == 0:
+            role_num = -1  # 'SUBJECT'
+        elif ag_num == 1:
+            role_num = 1  # 'OBJECT'
+        else:
+            role_num = 0  # 'OTHER'
+        groundings = set()
+
+        # NAME
+        if getattr(ag, "name", None):
+            groundings.add(("NAME", str(ag.name)))
+
+        # TEXT
+        text_id = (ag.db_refs or {}).get("TEXT")
+        if text_id:
+            groundings.add(("TEXT", str(text_id)))
+
+        # OTHER
+        for k, v in (ag.db_refs or {}).items():
+            if v is None:
+                continue
+            v_str = v if isinstance(v, str) else str(v)
+            groundings.add((k, v_str))
+
+        for db_name, db_id in groundings:
+            if not db_id or len(db_id) >= 2000:
+                continue
+            ag_id = synth_ag_id(stmt_hash, ag_num, role_num, db_name, db_id)
+            db_id = db_id.replace("\n", " ").replace("\r", " ")
+            rows.append((ag_id, ag_num, db_name, db_id, role_num))
+    return rows
+
+
+def load_missing_stmt_agents(unique_stmts_fpath: Path,
+                             stmt_meta: pd.DataFrame,
+                             seen_hashes: np.ndarray) -> pd.DataFrame:
+    """Load the agents of the unique statements that are not in pa_meta.
+
+    Only the statements with metadata, belief and evidence are parsed.
+    """
+    with gzip.open(unique_stmts_fpath, "rt") as fh:
+        stmt_rows = list(csv.reader(fh, delimiter="\t"))
+    hashes = np.array([int(stmt_hash) for stmt_hash, _ in stmt_rows],
+                      dtype=np.int64)
+    todo = ~isin_sorted(seen_hashes, hashes) & \
+        isin_sorted(stmt_meta["mk_hash"].values, hashes)
+    agent_rows = []
+    for i in np.flatnonzero(todo):
+        stmt_json = clean_json_loads(stmt_rows[i][1])
+        agent_rows.extend(
+            row + (hashes[i],)
+            for row in get_stmt_agents(int(hashes[i]), stmt_json)
+        )
+    columns = ["ag_id", "ag_num", "db_name", "db_id", "role_num", "mk_hash"]
+    agents = pd.DataFrame.from_records(agent_rows, columns=columns)
+    return agents.astype({"ag_id": np.int64, "ag_num": np.int64,
+                          "db_name": object, "db_id": object,
+                          "role_num": np.int16, "mk_hash": np.int64})
+
+
+def _build_pa_meta_part(task) -> np.ndarray:
+    i, part_fpath, out_dirs = task
+    agents = load_pa_meta_part(part_fpath)
+    rows = expand_complex_rows(join_stmt_meta(agents, _shared["stmt_meta"]))
+    write_agent_meta(rows, out_dirs, f"pa-{i:05d}")
+    return np.unique(agents["mk_hash"].values)
+
+
+def _build_unique_stmt_part(task):
+    i, unique_stmts_fpath, out_dirs = task
+    agents = load_missing_stmt_agents(unique_stmts_fpath,
+                                      _shared["stmt_meta"],
+                                      _shared["seen_hashes"])
+    rows = expand_complex_rows(join_stmt_meta(agents, _shared["stmt_meta"]))
+    write_agent_meta(rows, out_dirs, f"unique-{i:05d}")
+
+
+def _map(func, tasks, n_proc):
+    if n_proc == 1:
+        return [func(task) for task in tasks]
+    with ProcessPoolExecutor(
+            max_workers=n_proc,
+            mp_context=multiprocessing.get_context("fork")) as executor:
+        return list(executor.map(func, tasks))
+
+
+def is_agent_meta_done(out_dirs: Iterable[Path]) -> bool:
+    return all((Path(out_dir) / SUCCESS_MARKER).exists()
+               for out_dir in out_dirs)
+
+
+def build_agent_meta(pa_meta_parts: List[Path],
+                     unique_stmts_fpaths: List[Path],
+                     stmt_meta: pd.DataFrame,
+                     out_dirs: Tuple[Path, Path, Path],
+                     n_proc: Optional[int] = 1):
+    """Write the Name/Text/OtherMeta files from pa_meta and unique statements.
+
+    Parameters
+    ----------
+    pa_meta_parts :
+        The gzipped tsv parts of the pa_meta dump.
+    unique_stmts_fpaths :
+        The gzipped tsv shards of the unique statements (hash and json). The
+        agents of the statements that are not in pa_meta are made from these.
+    stmt_meta :
+        The metadata of the statements, from
+        :func:`indra_db.readonly_dumping.util.get_stmt_meta_table`.
+    out_dirs :
+        The directories to write the name, text and other meta tsv parts to.
+        Each is marked as done with a _SUCCESS file once complete.
+    n_proc :
+        The number of parts to handle at once. Default is 1.
+    """
+    for out_dir in out_dirs:
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        for old_fpath in Path(out_dir).glob("*.tsv"):
+            old_fpath.unlink()
+
+    _shared["stmt_meta"] = stmt_meta
+    try:
+        logger.info(f"Building agent meta from {len(pa_meta_parts)} "
+                    f"pa_meta parts")
+        part_hashes = _map(_build_pa_meta_part,
+                           [(i, part_fpath, out_dirs)
+                            for i, part_fpath in enumerate(pa_meta_parts)],
+                           n_proc)
+        _shared["seen_hashes"] = np.unique(
+            np.concatenate(part_hashes + [np.array([], dtype=np.int64)])
+        )
+
+        # A new pool is made so that the workers have the seen hashes.
+        logger.info(f"Adding agents of statements missing from pa_meta "
+                    f"from {len(unique_stmts_fpaths)} unique statement "
+                    f"shards")
+        _map(_build_unique_stmt_part,
+             [(i, fpath, out_dirs)
+              for i, fpath in enumerate(unique_stmts_fpaths)],
+             n_proc)
+    finally:
+        _shared.clear()
+
+    for out_dir in out_dirs:
+        (Path(out_dir) / SUCCESS_MARKER).touch()
@@ -0,0 +1,418 @@
+"""Download PubMed XML, and join the MeSH annotations of articles to statements.
+
+The XML files are downloaded concurrently by :class:`PubmedDownloader`. The
+extraction of MeSH annotations is a map step: each PubMed XML file is stream-parsed by a
+worker into a compact shard of (pmid, mesh_num, is_concept) arrays. The join
+is a reduce step over the shards, done on sorted arrays rather than
+per-row dict lookups.
+"""
+import gzip
+import logging
+import os
+import re
+from hashlib import md5
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from lxml import etree
+from indra.literature.pubmed_client import _get_annotations
+
+from indra_db.util.fetcher import ConcurrentFetcher, PersistentCache
+from indra_db.readonly_dumping.util import isin_sorted
+
+logger = logging.getLogger(__name__)
+
+META_COLUMNS = ["mk_hash", "ev_count", "belief", "mesh_num", "type_num",
+                "activity", "is_active", "agent_count"]
+
+
+class ChecksumMismatchError(ValueError):
+    pass
+
+
+class PubmedDownloader:
+    """Download files concurrently, verifying them against their md5 files.
+
+    Each file is first written to a ``.part`` file, so an interrupted
+    download is continued with an HTTP Range request, rather than started
+    over. Once a file is verified against the checksum in the ``<url>.md5``
+    file next to it, it is recorded in the manifest, and is skipped (without
+    hashing it again) by later runs.
+
+    Parameters
+    ----------
+    out_dir :
+        The directory to download the files to.
+    manifest :
+        The cache in which the checksum and size of each verified file are
+        recorded. By default, there is no record, and existing files are
+        verified again.
+    n_workers :
+        The number of files to download at once. Default is 4.
+    retries :
+        The number of times a failed download is retried. Default is 3.
+    backoff :
+        The base wait in seconds before a retry. Default is 1.
+    timeout :
+        The timeout in seconds of each request. Default is 60.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, out_dir: Path, manifest: PersistentCache = None,
+                 n_workers: int = 4, retries: int = 3, backoff: float = 1.0,
+                 timeout: float = 60):
+        self.out_dir = Path(out_dir)
+        self.manifest = manifest
+        self.n_workers = n_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def _get_expected_checksum(self, url: str) -> str:
+        resp = requests.get(url + ".md5", timeout=self.timeout)
+        resp.raise_for_status()
+        return re.search(r"[0-9a-z]+(?=\n)", resp.text).group()
+
+    def _is_verified(self, file_path: Path) -> bool:
+        if self.manifest is None or not file_path.exists():
+            return False
+        record = self.manifest.get(file_path.name)
+        return record is not None \
+            and record["size"] == file_path.stat().st_size
+
+    def _fetch_part(self, url: str, part_path: Path):
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with requests.get(url, headers=headers, stream=True,
+                          timeout=self.timeout) as resp:
+            if resp.status_code == 416:
+                # The part is already complete.
+                return
+            resp.raise_for_status()
+            mode = "ab" if resp.status_code == 206 else "wb"
+            with part_path.open(mode) as fh:
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    fh.write(chunk)
+
+    def download(self, url: str) -> str:
+        """Download and verify a file, unless it has already been verified.
+
+        Returns the path of the file.
+        """
+        file_path = self.out_dir / url.split("/")[-1]
+        if self._is_verified(file_path):
+            return file_path.as_posix()
+
+        expected_checksum = self._get_expected_checksum(url)
+        if not file_path.exists():
+            part_path = file_path.with_name(file_path.name + ".part")
+            self._fetch_part(url, part_path)
+        else:
+            # A file from before the manifest was kept.
+            part_path = file_path
+
+        hasher = md5()
+        with part_path.open("rb") as fh:
+            for chunk in iter(lambda: fh.read(self.chunk_size), b""):
+                hasher.update(chunk)
+        checksum = hasher.hexdigest()
+        if checksum != expected_checksum:
+            part_path.unlink()
+            raise ChecksumMismatchError(f"Checksum mismatch for {url}")
+
+        os.replace(part_path, file_path)
+        if self.manifest is not None:
+            self.manifest.set(file_path.name,
+                              {"md5": checksum,
+                               "size": file_path.stat().st_size})
+        return file_path.as_posix()
+
+    def download_all(self, urls: Iterable[str], on_file=None) \
+            -> Dict[str, str]:
+        """Download the files at the given urls.
+
+        Parameters
+        ----------
+        urls :
+            The urls of the files to download.
+        on_file :
+            If given, this is called with the path of each file as soon as
+            it is ready, e.g. to start processing it while the rest are
+            downloaded.
+
+        Returns
+        -------
+        :
+            The paths of the files that were downloaded (or had been), keyed
+            by url. Files that could not be downloaded are left out.
+        """
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        callback = None
+        if on_file is not None:
+            def callback(url, path):
+                on_file(Path(path))
+        fetcher = ConcurrentFetcher(self.download, n_workers=self.n_workers,
+                                    max_retries=self.retries,
+                                    backoff=self.backoff)
+        return fetcher.fetch_all(urls, callback=callback)
+
+
+def iter_pmid_mesh(xml_gz_path: Path) -> Iterator[Tuple[int, List[dict]]]:
+    """Stream the pmid and MeSH annotations of each article in a PubMed file.
+
+    Each article is cleared once it has been read, so the whole tree of the
+    file is never held in memory.
+    """
+    with gzip.open(xml_gz_path, "rb") as fh:
+        for _, article in etree.iterparse(fh, tag="PubmedArticle"):
+            medline_citation = article.find("MedlineCitation")
+            pmid = int(medline_citation.find("PMID").text)
+            mesh_annotations = \
+                _get_annotations(medline_citation)["mesh_annotations"]
+            article.clear()
+            while article.getprevious() is not None:
+                del article.getparent()[0]
+            yield pmid, mesh_annotations
+
+
+def get_mesh_shard_path(xml_gz_path: Path, shard_dir: Path) -> Path:
+    return Path(shard_dir) / (Path(xml_gz_path).name.split(".")[0] + ".npz")
+
+
+def extract_mesh_shard(xml_gz_path: Path, shard_dir: Path) -> Path:
+    """Write the MeSH annotations of a PubMed XML file to a shard.
+
+    The shard holds the pmids of all the articles in the file (`pmids`), and
+    one row per annotation (`pmid`, `mesh_num` and `is_concept`). A shard
+    that already exists is not made again.
+    """
+    shard_path = get_mesh_shard_path(xml_gz_path, shard_dir)
+    if shard_path.exists():
+        return shard_path
+
+    pmids = []
+    rows = []
+    for pmid, mesh_annotations in iter_pmid_mesh(xml_gz_path):
+        pmids.append(pmid)
+        for annot in mesh_annotations:
+            mesh_id = annot["mesh"]
+            rows.append((pmid, int(mesh_id[1:]), mesh_id.startswith("C")))
+    if rows:
+        pmid_col, mesh_col, concept_col = zip(*rows)
+    else:
+        pmid_col = mesh_col = concept_col = ()
+
+    tmp_path = shard_path.with_name(shard_path.name + ".tmp")
+    with tmp_path.open("wb") as fh:
+        np.savez(fh,
+                 pmids=np.array(pmids, dtype=np.int64),
+                 pmid=np.array(pmid_col, dtype=np.int64),
+                 mesh_num=np.array(mesh_col, dtype=np.int32),
+                 is_concept=np.array(concept_col, dtype=bool))
+    os.replace(tmp_path, shard_path)
+    return shard_path
+
+
+def load_mesh_shard(shard_path: Path) -> Dict[str, np.ndarray]:
+    with np.load(shard_path) as shard:
+        return {name: shard[name] for name in shard.files}
+
+
+def get_sorted_pairs(mapping: Dict[int, Iterable[int]],
+                     invert: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Flatten a one-to-many mapping into key and value arrays sorted by key.
+
+    If `invert` is True, the values are used as the keys, e.g. to get the
+    hash of each raw statement id from a mapping of hashes to raw ids.
+    """
+    keys = np.fromiter((k for k, vals in mapping.items() for _ in vals),
+                       dtype=np.int64)
+    values = np.fromiter((v for vals in mapping.values() for v in vals),
+                         dtype=np.int64)
+    if invert:
+        keys, values = values, keys
+    order = np.argsort(keys, kind="stable")
+    return keys[order], values[order]
+
+
+def expand_matches(sorted_keys: np.ndarray, query: np.ndarray) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Find every match of each query value in an array of sorted keys.
+
+    Returns
+    -------
+    query_idx :
+        The index in `query` of each match.
+    key_idx :
+        The index in `sorted_keys` of each match.
+    """
+    left = np.searchsorted(sorted_keys, query, side="left")
+    right = np.searchsorted(sorted_keys, query, side="right")
+    counts = right - left
+    query_idx = np.repeat(np.arange(len(query)), counts)
+    starts = np.cumsum(counts) - counts
+    key_idx = np.repeat(left, counts) + \
+        (np.arange(counts.sum()) - np.repeat(starts, counts))
+    return query_idx, key_idx
+
+
+def load_pmid_mesh(shard_paths: Iterable[Path], linked_pmids: np.ndarray) \
+        -> Tuple[Dict[str, Dict[str, Set[int]]], pd.DataFrame]:
+    """Load the MeSH annotations of all the shards.
+
+    Parameters
+    ----------
+    shard_paths :
+        The shards to load, see :func:`extract_mesh_shard`.
+    linked_pmids :
+        The sorted pmids that have raw statements.
+
+    Returns
+    -------
+    pmid_mesh_mapping :
+        The sets of "concepts" and "terms" (as mesh nums) of every pmid (as a
+        string) in PubMed.
+    annotations :
+        The distinct pmid, mesh_num and is_concept of the annotations of the
+        pmids that have raw statements, sorted by pmid.
+    """
+    pmid_mesh_mapping = {}
+    linked_annotations = []
+    for shard_path in shard_paths:
+        shard = load_mesh_shard(shard_path)
+        for pmid in shard["pmids"].tolist():
+            pmid_mesh_mapping.setdefault(
+                str(pmid), {"concepts": set(), "terms": set()}
+            )
+        for pmid, mesh_num, is_concept in zip(shard["pmid"].tolist(),
+                                              shard["mesh_num"].tolist(),
+                                              shard["is_concept"].tolist()):
+            key = "concepts" if is_concept else "terms"
+            pmid_mesh_mapping[str(pmid)][key].add(mesh_num)
+
+        linked = isin_sorted(linked_pmids, shard["pmid"])
+        linked_annotations.append(pd.DataFrame(
+            {col: shard[col][linked]
+             for col in ["pmid", "mesh_num", "is_concept"]}
+        ))
+
+    if linked_annotations:
+        annotations = pd.concat(linked_annotations, ignore_index=True)
+    else:
+        annotations = pd.DataFrame({
+            "pmid": np.array([], dtype=np.int64),
+            "mesh_num": np.array([], dtype=np.int32),
+            "is_concept": np.array([], dtype=bool),
+        })
+    annotations = annotations.drop_duplicates() \
+        .sort_values("pmid", kind="stable").reset_index(drop=True)
+    return pmid_mesh_mapping, annotations
+
+
+def join_mesh_to_raw_stmts(
+        annotations: pd.DataFrame,
+        pmid_raw_ids: Tuple[np.ndarray, np.ndarray],
+        raw_id_hashes: Tuple[np.ndarray, np.ndarray],
+        raw_concepts_path: Path,
+        raw_terms_path: Path,
+        chunk_size: int = 1_000_000,
+) -> Tuple[pd.DataFrame, Dict[str, Set[int]]]:
+    """Write the raw statement MeSH files, and map the MeSH to hashes.
+
+    Parameters
+    ----------
+    annotations :
+        The distinct annotations of pmids, from :func:`load_pmid_mesh`.
+    pmid_raw_ids :
+        The pmid and raw statement id arrays, sorted by pmid.
+    raw_id_hashes :
+        The raw statement id and statement hash arrays, sorted by raw id.
+    raw_concepts_path :
+        The file to write the raw_stmt_mesh_concepts rows to.
+    raw_terms_path :
+        The file to write the raw_stmt_mesh_terms rows to.
+    chunk_size :
+        The number of annotations to join at a time.
+
+    Returns
+    -------
+    hash_mesh :
+        The distinct mk_hash, mesh_num and is_concept.
+    pmid_stmt_hash :
+        The set of statement hashes of each pmid (as a string) that has MeSH
+        annotations.
+    """
+    link_pmids, link_raw_ids = pmid_raw_ids
+    hash_raw_ids, hashes = raw_id_hashes
+    hash_mesh_chunks = []
+    pmid_hash_chunks = []
+    with open(raw_concepts_path, "wt") as raw_concepts_fh, \
+            open(raw_terms_path, "wt") as raw_terms_fh:
+        for start in range(0, len(annotations), chunk_size):
+            chunk = annotations.iloc[start:start + chunk_size]
+            annot_idx, link_idx = expand_matches(link_pmids,
+                                                 chunk["pmid"].values)
+            raw = pd.DataFrame({
+                "raw_stmt_id": link_raw_ids[link_idx],
+                "mesh_num": chunk["mesh_num"].values[annot_idx],
+                "is_concept": chunk["is_concept"].values[annot_idx],
+                "pmid": chunk["pmid"].values[annot_idx],
+            })
+            is_concept = raw["is_concept"].values
+            raw.loc[is_concept, ["raw_stmt_id", "mesh_num"]].to_csv(
+                raw_concepts_fh, sep="\t", header=False, index=False
+            )
+            raw.loc[~is_concept, ["raw_stmt_id", "mesh_num"]].to_csv(
+                raw_terms_fh, sep="\t", header=False, index=False
+            )
+
+            # Get the hashes of the raw statements.
+            raw_ids = raw["raw_stmt_id"].values
+            hash_idx = np.searchsorted(hash_raw_ids, raw_ids)
+            found = isin_sorted(hash_raw_ids, raw_ids)
+            raw = raw[found].assign(mk_hash=hashes[hash_idx[found]])
+            hash_mesh_chunks.append(
+                raw[["mk_hash", "mesh_num", "is_concept"]].drop_duplicates()
+            )
+            pmid_hash_chunks.append(
+                raw[["pmid", "mk_hash"]].drop_duplicates()
+            )
+
+    columns = {"mk_hash": np.int64, "mesh_num": np.int32, "is_concept": bool}
+    if hash_mesh_chunks:
+        hash_mesh = pd.concat(hash_mesh_chunks, ignore_index=True) \
+            .drop_duplicates().reset_index(drop=True)
+        pmid_hashes = pd.concat(pmid_hash_chunks, ignore_index=True) \
+            .drop_duplicates()
+    else:
+        hash_mesh = pd.DataFrame({col: np.array([], dtype=dtype)
+                                  for col, dtype in columns.items()})
+        pmid_hashes = pd.DataFrame({"pmid": [], "mk_hash": []})
+
+    pmid_stmt_hash = {}
+    for pmid, mk_hash in zip(pmid_hashes["pmid"].tolist(),
+                             pmid_hashes["mk_hash"].tolist()):
+        pmid_stmt_hash.setdefault(str(pmid), set()).add(mk_hash)
+    return hash_mesh, pmid_stmt_hash
+
+
+def write_mesh_meta(hash_mesh: pd.DataFrame, stmt_meta: pd.DataFrame,
+                    concepts_meta_path: Path, terms_meta_path: Path):
+    """Write the mesh_concept_meta and mesh_term_meta rows.
+
+    Only the hashes that have statement metadata get a row.
+    """
+    sorted_hashes = stmt_meta["mk_hash"].values
+    query = hash_mesh["mk_hash"].values
+    meta_idx = np.searchsorted(sorted_hashes, query)
+    found = isin_sorted(sorted_hashes, query)
+    rows = stmt_meta.iloc[meta_idx[found]].reset_index(drop=True)
+    rows["mesh_num"] = hash_mesh["mesh_num"].values[found]
+    is_concept = hash_mesh["is_concept"].values[found]
+    for path, mask in [(concepts_meta_path, is_concept),
+                       (terms_meta_path, ~is_concept)]:
+        rows.loc[mask, META_COLUMNS].to_csv(path, sep="\t", header=False,
+                                            index=False)
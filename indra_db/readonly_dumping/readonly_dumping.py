@@ -2,6 +2,7 @@ import argparse
 import csv
 import gzip
 import logging
+import multiprocessing
 import os
 import pickle
 import re
@@ -10,23 +11,20 @@ import subprocess
 import sys
 import time
 import uuid
-import zlib
 from collections import defaultdict, Counter
-from hashlib import md5
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from textwrap import dedent
-from typing import Tuple, Iterable
+from typing import Tuple, Iterable, List, Optional
 
 import numpy as np
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
-from lxml import etree
 from pyspark.sql.types import StructType, IntegerType, StructField, LongType, FloatType, StringType, ShortType, \
     BooleanType, BinaryType
 from tqdm import tqdm
 from pyspark.sql import SparkSession
-from indra.literature.pubmed_client import _get_annotations
 from indra.statements import stmt_from_json, ActiveForm
 from indra.util.statement_presentation import db_sources, reader_sources
 from indra_db import get_db
@@ -35,14 +33,18 @@ from indra_db.databases import ReadonlyDatabaseManager
 from indra_db.schemas.mixins import ReadonlyTable
 from indra_db.schemas.readonly_schema import (
     ro_type_map,
-    ro_role_map,
     SOURCE_GROUPS
 )
 from sqlalchemy import create_engine
 from pyspark.sql.functions import to_json, col
 from .locations import *
+from indra_db.util.fetcher import PersistentCache
+from .pubmed import extract_mesh_shard, get_sorted_pairs, load_pmid_mesh, \
+    join_mesh_to_raw_stmts, write_mesh_meta, PubmedDownloader
 from .util import clean_json_loads, generate_db_snapshot, compare_snapshots, \
-    pipeline_files_clean_up
+    pipeline_files_clean_up, export_query_partitions, get_stmt_meta_table
+from .export_assembly import batch_size, split_tsv_gz_file
+from .pa_meta import build_agent_meta, is_agent_meta_done
 
 logger = logging.getLogger("indra_db.readonly_dumping.export_assembly")
 logger.setLevel(logging.DEBUG)
@@ -1106,7 +1108,7 @@ def source_meta(local_ro_mngr: ReadonlyDatabaseManager):
 
 # PaMeta - the table itself is not generated on the readonly db, but the
 # tables derived from it are (NameMeta, TextMeta and OtherMeta)
-def ensure_pa_meta():
+def ensure_pa_meta(n_proc: Optional[int] = None):
     """Generate the source files for the Name/Text/OtherMeta tables.
 
     Process and update agent metadata from principal and unique statement sources.
@@ -1118,10 +1120,14 @@ def ensure_pa_meta():
        present in the principal database.
     3. For these new statements, reprocess and regenerate agent-related metadata
        such as `ag_id`, `role_num`, `db_name`, `db_id`, and others as needed.
+
+    Both are done on columns, joined to the statement metadata on mk_hash,
+    one part or shard per process (see
+    :mod:`indra_db.readonly_dumping.pa_meta`). The tsv parts are written to
+    the name_meta, text_meta and other_meta directories.
     """
-    if all([name_meta_tsv.exists(),
-            text_meta_tsv.exists(),
-            other_meta_tsv.exists()]):
+    agent_meta_dirs = (name_meta_dir, text_meta_dir, other_meta_dir)
+    if is_agent_meta_done(agent_meta_dirs):
         return
 
     #  Depends on:
@@ -1165,257 +1171,43 @@ def ensure_pa_meta():
              pa_agents.stmt_mk_hash = pa_statements.mk_hash
     WHERE LENGTH(pa_agents.db_id) < 2000
     """)
-    if not pa_meta_fpath.absolute().exists():
-        principal_query_to_csv(pa_meta_query, pa_meta_fpath)
+    # The parts are split on mk_hash over the full range of a bigint, so
+    # there is no need to look up the bounds.
+    pa_meta_parts = principal_query_to_csv(
+        pa_meta_query, pa_meta_parts_dir, partition_key="mk_hash",
+        bounds=(-2**63, 2**63 - 1), n_parts=64
+    )
 
-    # Load the belief dump into a dictionary
     logger.info("Loading belief scores")
     belief_dict = pickle.load(belief_scores_pkl_fpath.open("rb"))
-
-    # Load source counts (can generate evidence counts from this)
     logger.info("Loading source counts")
     source_counts = pickle.load(source_counts_fpath.open("rb"))
-
-    # Load agent count, activity and type mapping
     logger.info("Loading agent count, activity and type mapping")
-    stmt_hash_to_activity_type_count = get_activity_type_ag_count()
-
-    # Loop pa_meta dump and write load files for NameMeta, TextMeta, OtherMeta
-    logger.info("Iterating over pa_meta dump")
-    nones = (None, None, None, None)
-
-    seen_hash = set()  # all int
-
-    def db_id_clean(s):
-        return s.replace('\n', ' ').replace('\r', ' ') if s else s
-
-    def synth_ag_id(mk_hash, ag_num, role_num, db_name, db_id):
-        int_mask = 0x7FFFFFFF  # 31 low bits set
-        # Deterministic, compact, and stable across runs
-        # The ID is guaranteed to be in the range [-INT32_MAX, -1].
-        crc32_full = zlib.crc32(
-            f"{mk_hash}|{ag_num}|{role_num}|{db_name}|{db_id}".encode()
-        )
-        id_pos = crc32_full & int_mask
-        if id_pos == 0:
-            id_pos = 1
-        return -id_pos
-
-    with name_meta_tsv.open("wt") as name_fh, \
-            text_meta_tsv.open("wt") as text_fh, \
-            other_meta_tsv.open("wt") as other_fh:
-        name_writer = csv.writer(name_fh, delimiter="\t")
-        text_writer = csv.writer(text_fh, delimiter="\t")
-        other_writer = csv.writer(other_fh, delimiter="\t")
-
-        with pa_meta_fpath.open('rt') as fh:
-            reader = csv.reader(fh, delimiter="\t")
-            next(reader)  # skip column name
-            for db_name, db_id, ag_id, ag_num, role, stmt_hash_str in reader:
-                stmt_hash = int(stmt_hash_str)
-                seen_hash.add(stmt_hash)
-
-                # Get the belief score
-                belief_score = belief_dict.get(stmt_hash)
-
-                # Skip the dropped statements
-                if belief_score is None:
-                    continue
-
-                # Get the agent count, activity and type count
-                activity, is_active, type_num, agent_count = \
-                    stmt_hash_to_activity_type_count.get(stmt_hash, nones)
-                if type_num is None and agent_count is None:
-                    continue
-
-                # Get the evidence count
-                ev_count = sum(
-                    source_counts.get(stmt_hash, {}).values()
-                )
-                if ev_count == 0:
-                    continue
-
-                # Get role num
-                role_num = ro_role_map.get_int(role)
-
-                # NameMeta - db_name == "NAME"
-                # TextMeta - db_name == "TEXT"
-                # OtherMeta - other db_names not part of ("NAME", "TEXT")
-                # Columns are:
-                # ag_id, ag_num, [db_name,] db_id, role_num, type_num, mk_hash,
-                # ev_count, belief, activity, is_active, agent_count,
-                # is_complex_dup
-                row_start = [
-                    ag_id,
-                    ag_num,
-                ]
-                # db_name here if "other"
-                row_end = [
-                    db_id_clean(db_id),
-                    role_num,
-                    type_num,
-                    stmt_hash,
-                    ev_count,
-                    belief_score,
-                    activity,
-                    is_active,
-                    agent_count,
-                    False,
-                ]
-                if db_name == "NAME":
-                    name_writer.writerow(row_start + row_end)
-                elif db_name == "TEXT":
-                    text_writer.writerow(row_start + row_end)
-                else:
-                    other_writer.writerow(row_start + [db_name] + row_end)
-
-                if type_num == ro_type_map.get_int("Complex"):
-                    dup1 = [
-                        db_id_clean(db_id),
-                        -1,  # role_num
-                        type_num, stmt_hash,
-                        ev_count, belief_score,
-                        activity, is_active,
-                        agent_count,
-                        True  # is_complex_dup = True
-                    ]
-
-                    dup2 = [
-                        db_id_clean(db_id),
-                        1,  # role_num
-                        type_num, stmt_hash,
-                        ev_count, belief_score,
-                        activity, is_active,
-                        agent_count,
-                        True
-                    ]
-                    if db_name == "NAME":
-                        name_writer.writerow(
-                            row_start[:1] + [0] + dup1)  # ag_num=0
-                        name_writer.writerow(
-                            row_start[:1] + [1] + dup2)  # ag_num=1
-                    elif db_name == "TEXT":
-                        text_writer.writerow(row_start[:1] + [0] + dup1)
-                        text_writer.writerow(row_start[:1] + [1] + dup2)
-                    else:
-                        other_writer.writerow(
-                            row_start[:1] + [0] + [db_name] + dup1)
-                        other_writer.writerow(
-                            row_start[:1] + [1] + [db_name] + dup2)
-
-        logger.info(
-            "Augmenting Name/Text/OtherMeta from unique statements for hashes missing in principal")
-        with gzip.open(unique_stmts_fpath.as_posix(), "rt") as fh:
-            reader = csv.reader(fh, delimiter="\t")
-            for stmt_hash_string, stmt_json_string in reader:
-                stmt_hash = int(stmt_hash_string)
-                if stmt_hash in seen_hash:
-                    continue
-                ev_count = sum(source_counts.get(stmt_hash, {}).values())
-                if ev_count == 0:
-                    continue
-                belief_score = belief_dict.get(stmt_hash)
-                if belief_score is None:
-                    continue
-                activity, is_active, type_num, agent_count = \
-                    stmt_hash_to_activity_type_count.get(stmt_hash, nones)
-                if type_num is None and agent_count is None:
-                    continue
-                stmt_json = clean_json_loads(stmt_json_string)
-                stmt = stmt_from_json(stmt_json)
-                agents = stmt.agent_list()
-                if not agents:
-                    continue
-                for ag_num, ag in enumerate(agents):
-                    if ag is None:
-                        continue
-
-                    if ag_num == 0:
-                        role_num = -1  # 'SUBJECT'
-                    elif ag_num == 1:
-                        role_num = 1  # 'OBJECT'
-                    else:
-                        role_num = 0  # 'OTHER'
-                    groundings = set()
-
-                    # NAME
-                    if getattr(ag, "name", None):
-                        groundings.add(("NAME", str(ag.name)))
-
-                    # TEXT
-                    text_id = (ag.db_refs or {}).get("TEXT")
-                    if text_id:
-                        groundings.add(("TEXT", str(text_id)))
-
-                    #OTHER
-                    for k, v in (ag.db_refs or {}).items():
-                        if v is None:
-                            continue
-                        v_str = v if isinstance(v, str) else str(v)
-                        groundings.add((k, v_str))
-
-                    for db_name, db_id in groundings:
-                        if not db_id or len(db_id) >= 2000:
-                            continue
-                        ag_id = synth_ag_id(stmt_hash, ag_num, role_num, db_name, db_id)
-                        row_start = [
-                            ag_id,
-                            ag_num,
-                        ]
-                        # db_name here if "other"
-                        row_end = [
-                            db_id_clean(db_id),
-                            role_num,
-                            type_num,
-                            stmt_hash,
-                            ev_count,
-                            belief_score,
-                            activity,
-                            is_active,
-                            agent_count,
-                            False,
-                        ]
-                        if db_name == "NAME":
-                            name_writer.writerow(row_start + row_end)
-                        elif db_name == "TEXT":
-                            text_writer.writerow(row_start + row_end)
-                        else:
-                            other_writer.writerow(
-                                row_start + [db_name] + row_end)
-
-                        if type_num == ro_type_map.get_int("Complex"):
-                            dup1 = [
-                                db_id_clean(db_id),
-                                -1,  # role_num
-                                type_num, stmt_hash,
-                                ev_count, belief_score,
-                                activity, is_active,
-                                agent_count,
-                                True  # is_complex_dup = True
-                            ]
-
-                            dup2 = [
-                                db_id_clean(db_id),
-                                1,  # role_num
-                                type_num, stmt_hash,
-                                ev_count, belief_score,
-                                activity, is_active,
-                                agent_count,
-                                True
-                            ]
-                            if db_name == "NAME":
-                                name_writer.writerow(
-                                    row_start[:1] + [0] + dup1)  # ag_num=0
-                                name_writer.writerow(
-                                    row_start[:1] + [1] + dup2)  # ag_num=1
-                            elif db_name == "TEXT":
-                                text_writer.writerow(row_start[:1] + [0] + dup1)
-                                text_writer.writerow(row_start[:1] + [1] + dup2)
-                            else:
-                                other_writer.writerow(
-                                    row_start[:1] + [0] + [db_name] + dup1)
-                                other_writer.writerow(
-                                    row_start[:1] + [1] + [db_name] + dup2)
+    stmt_meta = get_stmt_meta_table(get_activity_type_ag_count(),
+                                    source_counts, belief_dict)
+    del belief_dict, source_counts
+
+    # The agents of the statements missing from pa_meta are made from the
+    # unique statement shards, which are handled in parallel like the parts.
+    # The shards are made by the refinement step, but may have been cleaned
+    # up since then.
+    if not any(split_unique_statements_folder_fpath.glob("*.gz")):
+        if not unique_stmts_fpath.exists():
+            raise FileNotFoundError(
+                f"Neither the unique statement shards nor "
+                f"{unique_stmts_fpath} exist to get the agents of the "
+                f"statements missing from pa_meta."
+            )
+        logger.info("Splitting unique statements")
+        split_tsv_gz_file(unique_stmts_fpath.as_posix(),
+                          split_unique_statements_folder_fpath.as_posix(),
+                          batch_size=batch_size)
+    split_unique_files = sorted(
+        split_unique_statements_folder_fpath.glob("*.gz"),
+        key=lambda x: int(re.findall(r'\d+', x.name)[0])
+    )
+    build_agent_meta(pa_meta_parts, split_unique_files, stmt_meta,
+                     agent_meta_dirs, n_proc=n_proc or os.cpu_count())
 
 
 # NameMeta, TextMeta, OtherMeta
@@ -1447,7 +1239,7 @@ def name_meta(local_ro_mngr: ReadonlyDatabaseManager):
     load_file_to_table_spark("readonly.name_meta",
                              schema,
                              colum_order,
-                             name_meta_tsv.absolute().as_posix())
+                             name_meta_dir.absolute().as_posix())
     create_primary_key(ro_mngr_local=local_ro_mngr,
                        table_name='name_meta',
                        keys=['ag_id', 'mk_hash', 'role_num', 'ag_num'])
@@ -1485,7 +1277,7 @@ def text_meta(local_ro_mngr: ReadonlyDatabaseManager):
     load_file_to_table_spark("readonly.text_meta",
                              schema,
                              colum_order,
-                             text_meta_tsv.absolute().as_posix())
+                             text_meta_dir.absolute().as_posix())
 
     create_primary_key(ro_mngr_local=local_ro_mngr,
                        table_name='text_meta',
@@ -1526,7 +1318,7 @@ def other_meta(local_ro_mngr: ReadonlyDatabaseManager):
     load_file_to_table_spark("readonly.other_meta",
                              schema,
                              colum_order,
-                             other_meta_tsv.absolute().as_posix())
+                             other_meta_dir.absolute().as_posix())
 
     create_primary_key(ro_mngr_local=local_ro_mngr,
                        table_name='other_meta',
@@ -1536,19 +1328,25 @@ def other_meta(local_ro_mngr: ReadonlyDatabaseManager):
     logger.info("Building indices for other_meta")
     other_meta_table.build_indices(local_ro_mngr)
 
-    logger.info(f"Deleting {name_meta_tsv.absolute().as_posix()}")
-    os.remove(name_meta_tsv.absolute().as_posix())
-    logger.info(f"Deleting {text_meta_tsv.absolute().as_posix()}")
-    os.remove(text_meta_tsv.absolute().as_posix())
-    logger.info(f"Deleting {other_meta_tsv.absolute().as_posix()}")
-    os.remove(other_meta_tsv.absolute().as_posix())
-    logger.info(f"Deleting {pa_meta_fpath.absolute().as_posix()}")
-    os.remove(pa_meta_fpath.absolute().as_posix())
+    logger.info(f"Deleting {name_meta_dir.absolute().as_posix()}")
+    shutil.rmtree(name_meta_dir.absolute().as_posix())
+    logger.info(f"Deleting {text_meta_dir.absolute().as_posix()}")
+    shutil.rmtree(text_meta_dir.absolute().as_posix())
+    logger.info(f"Deleting {other_meta_dir.absolute().as_posix()}")
+    shutil.rmtree(other_meta_dir.absolute().as_posix())
+    logger.info(f"Deleting {pa_meta_parts_dir.absolute().as_posix()}")
+    shutil.rmtree(pa_meta_parts_dir.absolute().as_posix())
 
 
 def ensure_pubmed_xml_files(xml_dir: Path = pubmed_xml_gz_dir,
-                            retries: int = 3) -> int:
-    """Downloads the PubMed XML files if they are not already present"""
+                            retries: int = 3, n_workers: int = 4,
+                            on_file=None) -> int:
+    """Downloads the PubMed XML files if they are not already present
+
+    The files are downloaded `n_workers` at a time, see
+    :class:`indra_db.readonly_dumping.pubmed.PubmedDownloader`. If given,
+    `on_file` is called with the path of each file as soon as it is ready.
+    """
 
     def _get_urls(url: str) -> Iterable[str]:
         """Get the paths to all XML files on the PubMed FTP server."""
@@ -1573,31 +1371,6 @@ def ensure_pubmed_xml_files(xml_dir: Path = pubmed_xml_gz_dir,
             if href and href.startswith("pubmed") and href.endswith(".xml.gz"):
                 yield url + href
 
-    def _download_xml_gz(xml_url: str, xml_file: Path, md5_check: bool = True):
-        try:
-            resp = requests.get(xml_url)
-            resp.raise_for_status()
-        except requests.exceptions.RequestException:
-            return False
-
-        if md5_check:
-            md5_resp = requests.get(xml_url + ".md5")
-            checksum = md5(resp.content).hexdigest()
-            expected_checksum = re.search(
-                r"[0-9a-z]+(?=\n)", md5_resp.content.decode("utf-8")
-            ).group()
-            if checksum != expected_checksum:
-                logger.warning(
-                    f"Checksum mismatch for {xml_url}, skipping download"
-                )
-                raise ValueError("Checksum mismatch")
-
-        # Write the file xml.gz file
-        with xml_file.open("wb") as fh:
-            fh.write(resp.content)
-
-        return True
-
     if retries < 0:
         raise ValueError("retries must be >= 0")
 
@@ -1609,35 +1382,21 @@ def ensure_pubmed_xml_files(xml_dir: Path = pubmed_xml_gz_dir,
     xml_dir.mkdir(exist_ok=True, parents=True)
 
     # Download the files if they don't exist
-    num_files = 0
     basefiles = [u for u in _get_urls(pubmed_base_url)]
     updatefiles = [u for u in _get_urls(pubmed_update_url)]
-    for xml_url in tqdm(
-            basefiles + updatefiles, desc="Downloading PubMed XML files"
-    ):
-        xml_file_path = xml_dir.joinpath(xml_url.split("/")[-1])
-
-        # Download the file if it doesn't exist
-        if not xml_file_path.exists():
-            success = False
-            for _ in range(retries + 1):
-                try:
-                    success = _download_xml_gz(xml_url, xml_file_path)
-                except ValueError:
-                    logger.warning(f"Checksum mismatch, skipping {xml_url}")
-                    break
-                # If success, break retry loop and continue to next file
-                if success:
-                    num_files += 1
-                    break
-            if not success:
-                logger.error(
-                    f"Failed to download {xml_url} after {retries} retries"
-                )
-        else:
-            num_files += 1
+    manifest = PersistentCache(xml_dir.joinpath("md5_manifest.sqlite")
+                               .as_posix())
+    try:
+        downloader = PubmedDownloader(xml_dir, manifest=manifest,
+                                      n_workers=n_workers, retries=retries)
+        paths = downloader.download_all(basefiles + updatefiles,
+                                        on_file=on_file)
+    finally:
+        manifest.close()
+    for xml_url in set(basefiles + updatefiles) - set(paths):
+        logger.error(f"Failed to download {xml_url} after {retries} retries")
 
-    return num_files
+    return len(paths)
 
 
 def _load_pmid_to_raw_stmt_id():
@@ -1780,8 +1539,14 @@ def get_activity_type_ag_count():
     return stmt_hash_to_activity_type_count
 
 
-def ensure_pubmed_mesh_data():
-    """Get the of PubMed XML gzip files for pmid-mesh processing"""
+def ensure_pubmed_mesh_data(n_proc: Optional[int] = None):
+    """Get the of PubMed XML gzip files for pmid-mesh processing
+
+    The MeSH annotations of the PubMed XML files are extracted into compact
+    shards in parallel, with `n_proc` processes (default: the number of
+    cpus), and then joined to the raw statements and statement hashes on
+    sorted arrays. See :mod:`indra_db.readonly_dumping.pubmed`.
+    """
     # Check if the output files already exist
 
     if all(f.exists() for f in [mesh_concepts_meta_fpath,
@@ -1792,162 +1557,64 @@ def ensure_pubmed_mesh_data():
                                 pmid_stmt_hash_fpath]):
         return
 
-    def _pmid_mesh_extractor(xml_gz_path: Path) -> Iterable[Tuple[str, str]]:
-        tree = etree.parse(xml_gz_path.as_posix())
-
-        for article in tree.findall("PubmedArticle"):
-            medline_citation = article.find("MedlineCitation")
-            pubmed_id = medline_citation.find("PMID").text
+    # Extract the MeSH annotations of each file as soon as it is downloaded.
+    # The workers are spawned rather than forked, since the downloads run
+    # in threads.
+    pubmed_mesh_shards_dir.mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(
+            max_workers=n_proc or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")) as executor:
+        shard_futures = {}
+
+        def _extract(xml_gz_path: Path):
+            shard_futures[xml_gz_path.name] = executor.submit(
+                extract_mesh_shard, xml_gz_path, pubmed_mesh_shards_dir
+            )
 
-            mesh_ann = _get_annotations(medline_citation)
-            yield pubmed_id, mesh_ann["mesh_annotations"]
+        num_files = ensure_pubmed_xml_files(xml_dir=pubmed_xml_gz_dir,
+                                            on_file=_extract)
+        if num_files == 0:
+            raise FileNotFoundError("No PubMed XML files found")
 
-    num_files = ensure_pubmed_xml_files(xml_dir=pubmed_xml_gz_dir)
-    if num_files == 0:
-        raise FileNotFoundError("No PubMed XML files found")
+        logger.info(f"Extracting MeSH annotations from {num_files} files")
+        shard_paths = [shard_futures[name].result()
+                       for name in sorted(shard_futures)]
 
-    # Get the raw statement id -> stmt hash mapping
+    # Get the raw statement id -> stmt hash mapping, as sorted arrays
     hash_to_raw_stmt_id = pickle.load(stmt_hash_to_raw_stmt_ids_fpath.open("rb"))
-    raw_stmt_id_to_hash = {raw_id: stmt_hash for stmt_hash, raw_ids in
-                           hash_to_raw_stmt_id.items() for raw_id in raw_ids}
+    raw_id_hashes = get_sorted_pairs(hash_to_raw_stmt_id, invert=True)
     del hash_to_raw_stmt_id
 
-    # Load the pmid -> raw statement id mapping
-    pmid_to_raw_stmt_id = _load_pmid_to_raw_stmt_id()
+    # Load the pmid -> raw statement id mapping, as sorted arrays
+    pmid_raw_ids = get_sorted_pairs(_load_pmid_to_raw_stmt_id())
 
-    stmt_hash_to_activity_type_count = get_activity_type_ag_count()
+    logger.info("Loading MeSH annotations")
+    pmid_mesh_mapping, annotations = load_pmid_mesh(shard_paths,
+                                                    pmid_raw_ids[0])
 
-    # Get source counts ({hash: {source: count}})
+    logger.info("Generating raw statement MeSH tsv ingestion files")
+    hash_mesh, pmid_stmt_hash = join_mesh_to_raw_stmts(
+        annotations, pmid_raw_ids, raw_id_hashes,
+        raw_stmt_mesh_concepts_fpath, raw_stmt_mesh_terms_fpath
+    )
+    del annotations, pmid_raw_ids, raw_id_hashes
+
+    # Get source counts ({hash: {source: count}}) and belief scores
+    # (hash -> belief) for the statement metadata
     logger.info("Loading source counts")
     source_counts = pickle.load(source_counts_fpath.open("rb"))
-
-    # Get belief scores (hash -> belief)
     logger.info("Loading belief scores")
     belief_scores = pickle.load(belief_scores_pkl_fpath.open("rb"))
+    stmt_meta = get_stmt_meta_table(get_activity_type_ag_count(),
+                                    source_counts, belief_scores)
+    del source_counts, belief_scores
 
-    stmt_hashes = set()
-    pmid_mesh_mapping = {}
-    pmid_stmt_hash = defaultdict(set)
-    logger.info("Generating tsv ingestion files")
-    with open(
-            mesh_terms_meta_fpath.as_posix(), "wt") as terms_meta_fh, \
-            open(
-                raw_stmt_mesh_concepts_fpath.as_posix(), "wt") as raw_concepts_fh, \
-            open(
-                raw_stmt_mesh_terms_fpath.as_posix(), "wt") as raw_terms_fh:
-        terms_meta_writer = csv.writer(terms_meta_fh, delimiter="\t")
-        raw_concepts_writer = csv.writer(raw_concepts_fh, delimiter="\t")
-        raw_terms_writer = csv.writer(raw_terms_fh, delimiter="\t")
-
-        xml_files = list(pubmed_xml_gz_dir.glob("*.xml.gz"))
-        for xml_file_path in tqdm(xml_files, desc="Pubmed processing"):
-            # Extract the data from the XML file
-            for pmid, mesh_annotations in _pmid_mesh_extractor(xml_file_path):
-                pmid_mesh_map = {"concepts": set(), "terms": set()}
-                for annot in mesh_annotations:
-                    mesh_id = annot["mesh"]
-                    mesh_num = int(mesh_id[1:])
-                    is_concept = mesh_id.startswith("C")
-                    # major_topic = annot["major_topic"]  # Unused
-
-                    # Save each pmid-mesh mapping
-                    if is_concept:
-                        pmid_mesh_map["concepts"].add(mesh_num)
-                    else:
-                        pmid_mesh_map["terms"].add(mesh_num)
-
-                    # For each pmid, get the raw statement id
-                    for raw_stmt_id in pmid_to_raw_stmt_id.get(int(pmid), set()):
-                        raw_row = [raw_stmt_id, mesh_num]
-                        # RawStmtMeshConcepts
-                        if is_concept:
-                            raw_concepts_writer.writerow(raw_row)
-                        # RawStmtMeshTerms
-                        else:
-                            raw_terms_writer.writerow(raw_row)
-
-                        # Now write to the meta tables, one row per
-                        # (stmt hash, mesh id) pair
-                        stmt_hash = raw_stmt_id_to_hash.get(int(raw_stmt_id))
-
-                        # Save the pmid -> stmt hash mapping
-                        if stmt_hash:
-                            pmid_stmt_hash[pmid].add(stmt_hash)
-
-                        if stmt_hash and stmt_hash not in stmt_hashes:
-                            tup = \
-                                stmt_hash_to_activity_type_count.get(stmt_hash)
-
-                            if tup is not None:
-                                act, is_act, type_num, agent_count = tup
-                            else:
-                                stmt_hashes.add(stmt_hash)
-                                continue
-
-                            # Get evidence count for this statement
-                            ec = sum(
-                                source_counts.get(stmt_hash, {}).values()
-                            )
-                            bs = belief_scores.get(stmt_hash)
-
-                            meta_row = [
-                                stmt_hash,
-                                ec,
-                                bs,
-                                mesh_num,
-                                type_num,
-                                act,
-                                is_act,
-                                agent_count
-                            ]
-                            if not is_concept:
-                                terms_meta_writer.writerow(meta_row)
-
-
-                # If the pmid is already in pmid_mesh_mapping, update the
-                # mesh concepts and terms
-                if pmid in pmid_mesh_mapping:
-                    pmid_mesh_mapping[pmid]["concepts"].update(
-                        pmid_mesh_map["concepts"]
-                    )
-                    pmid_mesh_mapping[pmid]["terms"].update(
-                        pmid_mesh_map["terms"]
-                    )
-                else:
-                    pmid_mesh_mapping[pmid] = pmid_mesh_map
-    with open(raw_stmt_mesh_concepts_fpath, 'rt') as fh, \
-            open(
-                mesh_concepts_meta_fpath.as_posix(), "wt") as concepts_meta_fh:
-        reader = csv.reader(fh, delimiter="\t")
-        concepts_meta_writer = csv.writer(concepts_meta_fh, delimiter="\t")
-        for i, line in enumerate(reader):
-            raw_stmt_id = line[0]
-            mesh_num = line[1]
-            stmt_hash = raw_stmt_id_to_hash.get(int(raw_stmt_id))
-            if stmt_hash:
-                tup = stmt_hash_to_activity_type_count.get(stmt_hash)
-                if tup is not None:
-                    act, is_act, type_num, agent_count = tup
-                    ec = sum(
-                        source_counts.get(stmt_hash, {}).values()
-                    )
-                    bs = belief_scores.get(stmt_hash)
-
-                    meta_row = [
-                        stmt_hash,
-                        ec,
-                        bs,
-                        mesh_num,
-                        type_num,
-                        act,
-                        is_act,
-                        agent_count
-                    ]
-                    concepts_meta_writer.writerow(meta_row)
+    logger.info("Generating MeSH meta tsv ingestion files")
+    write_mesh_meta(hash_mesh, stmt_meta, mesh_concepts_meta_fpath,
+                    mesh_terms_meta_fpath)
 
     # Save the pmid-mesh and pmid-stmt hash mappings to cache
     logger.info("Saving pmid-stmt hash mappings to cache")
-    pmid_stmt_hash = dict(pmid_stmt_hash)
     with pmid_stmt_hash_fpath.open("wb") as pmid_stmt_hash_fh:
         pickle.dump(pmid_stmt_hash, pmid_stmt_hash_fh)
     logger.info("Saving pmid-mesh mappings to cache")
@@ -2073,8 +1740,11 @@ def mesh_term_meta(local_ro_mngr: ReadonlyDatabaseManager):
     shutil.rmtree(pubmed_mesh_path.absolute().as_posix())
 
 def principal_query_to_csv(
-        query: str, output_location: str, db: str = "primary"
-) -> None:
+        query: str, output_location: str, db: str = "primary",
+        partition_key: Optional[str] = None,
+        bounds: Optional[Tuple[int, int]] = None,
+        n_parts: int = 32, n_workers: int = 4,
+) -> Optional[List[Path]]:
     """Dump results of a query to the principal database to a tsv file
 
     Parameters
@@ -2086,11 +1756,34 @@ def principal_query_to_csv(
         it shouldn't be trusted completely.
 
     output_location : str
-        Path to file where output is to be stored.
+        Path to file where output is to be stored. If `partition_key` is
+        given, this is the directory the parts are written to.
 
     db : Optional[str]
         Database from list of defaults in indra_db config. Default: "primary".
 
+    partition_key : Optional[str]
+        If given, the query is exported on the server side in gzipped parts
+        split on ranges of this integer column, several at a time, and an
+        interrupted export can be resumed. See
+        :func:`indra_db.readonly_dumping.util.export_query_partitions`.
+        Default: None, meaning the query is dumped to a single file with
+        psql.
+
+    bounds : Optional[Tuple[int, int]]
+        The smallest and largest value of `partition_key`, if known.
+
+    n_parts : int
+        The number of parts to split the results into. Default: 32.
+
+    n_workers : int
+        The number of parts to export at once. Default: 4.
+
+    Returns
+    -------
+    Optional[List[Path]]
+        The paths of the parts, if `partition_key` is given.
+
     Raises
     ------
     AssertionError
@@ -2112,6 +1805,14 @@ def principal_query_to_csv(
     except KeyError as err:
         raise KeyError(f"db {db} not available. Check db_config.ini") from err
     print(principal_db_uri)
+    if partition_key is not None:
+        logger.info(f"Exporting SQL query {query} in parts by "
+                    f"{partition_key}")
+        return export_query_partitions(
+            query, principal_db_uri, Path(output_location), partition_key,
+            bounds=bounds, n_parts=n_parts, n_workers=n_workers
+        )
+
     # fixme: allow tsv.gz output
     # Note: 'copy ... to' copies data to a file on the server, while
     # 'copy ... from' copies data to the client. The former is faster, but
@@ -1,18 +1,30 @@
 import codecs
 import difflib
+import gzip
 import json
+import logging
 import os
 import re
 import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
 from urllib.parse import urlparse
 
 import boto3
+import numpy as np
+import pandas as pd
+import psycopg2
 
 from indra.statements import Statement
 from indra.statements.validate import assert_valid_statement_semantics
 from indra_db.readonly_dumping.locations import *
 
+logger = logging.getLogger(__name__)
+
+PARTITION_MANIFEST = "partitions.json"
+
 
 class StatementJSONDecodeError(Exception):
     pass
@@ -310,3 +322,192 @@ def pipeline_files_clean_up():
         print(f"{split_unique_statements_folder_fpath.absolute().as_posix()} "
               f"does not exist.")
 
+
+def get_partition_edges(bounds: Tuple[int, int], n_parts: int) -> List[int]:
+    """Split an inclusive range of integer keys into half-open ranges.
+
+    Parameters
+    ----------
+    bounds :
+        The smallest and largest value of the key.
+    n_parts :
+        The number of ranges to split into. Fewer are made if the range has
+        fewer values than this.
+
+    Returns
+    -------
+    :
+        The edges of the ranges, such that range i covers the keys
+        edges[i] <= key < edges[i+1].
+    """
+    low, high = bounds
+    span = high - low + 1
+    n_parts = max(1, min(n_parts, span))
+    return [low + span * i // n_parts for i in range(n_parts + 1)]
+
+
+def get_query_bounds(query: str, db_uri: str, key: str) -> Tuple[int, int]:
+    """Get the smallest and largest value of a key in the results of a query.
+    """
+    conn = psycopg2.connect(db_uri)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT min(q.{key}), max(q.{key}) "
+                        f"FROM ({query}) AS q")
+            low, high = cur.fetchone()
+    finally:
+        conn.close()
+    if low is None:
+        # The query has no results, but still make one (empty) part.
+        return 0, 0
+    return low, high
+
+
+def _copy_partition(db_uri: str, query: str, out_path: Path):
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    conn = psycopg2.connect(db_uri)
+    try:
+        conn.set_session(readonly=True)
+        with conn.cursor() as cur, gzip.open(tmp_path, "wb") as fh:
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, "
+                            f"DELIMITER E'\\t', HEADER)", fh)
+    finally:
+        conn.close()
+    os.replace(tmp_path, out_path)
+
+
+def _write_manifest(manifest_path: Path, manifest: dict):
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    os.replace(tmp_path, manifest_path)
+
+
+def export_query_partitions(
+        query: str,
+        db_uri: str,
+        output_dir: Path,
+        key: str,
+        bounds: Optional[Tuple[int, int]] = None,
+        n_parts: int = 32,
+        n_workers: int = 4,
+) -> List[Path]:
+    """Export the results of a query as gzipped tsv parts split on a key.
+
+    The results are split into ranges of an integer column of the query, and
+    each range is streamed with a COPY ... TO STDOUT on its own connection,
+    with up to `n_workers` running at once. Finished parts are recorded in a
+    manifest in `output_dir`, so an interrupted export picks up where it
+    stopped when run again with the same query and key.
+
+    Parameters
+    ----------
+    query :
+        The query to export. It must return the column `key`.
+    db_uri :
+        The uri of the database to run the query on.
+    output_dir :
+        The directory to write the parts and the manifest to.
+    key :
+        The name of an integer column of the query to split the results on,
+        e.g. mk_hash or id.
+    bounds :
+        The smallest and largest value of `key`. If not given, they are
+        looked up by running the query.
+    n_parts :
+        The number of parts to split the results into.
+    n_workers :
+        The number of parts to export at once.
+
+    Returns
+    -------
+    :
+        The paths of the parts, in order of their key ranges. Each part has a
+        header row.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / PARTITION_MANIFEST
+
+    manifest = None
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest["query"] != query or manifest["key"] != key:
+            logger.info(f"Discarding the parts of a different query in "
+                        f"{output_dir}")
+            for part_path in output_dir.glob("part-*"):
+                part_path.unlink()
+            manifest = None
+
+    if manifest is None:
+        if bounds is None:
+            bounds = get_query_bounds(query, db_uri, key)
+        manifest = {"query": query, "key": key,
+                    "edges": get_partition_edges(bounds, n_parts),
+                    "done": []}
+        _write_manifest(manifest_path, manifest)
+
+    edges = manifest["edges"]
+    part_paths = [output_dir / f"part-{i:05d}.tsv.gz"
+                  for i in range(len(edges) - 1)]
+    done = set(manifest["done"])
+    todo = [i for i, part_path in enumerate(part_paths)
+            if part_path.name not in done or not part_path.exists()]
+    logger.info(f"Exporting {len(todo)} of {len(part_paths)} parts to "
+                f"{output_dir}")
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = {}
+        for i in todo:
+            part_query = (f"SELECT * FROM ({query}) AS part "
+                          f"WHERE part.{key} >= {edges[i]} "
+                          f"AND part.{key} < {edges[i + 1]}")
+            future = executor.submit(_copy_partition, db_uri, part_query,
+                                     part_paths[i])
+            futures[future] = part_paths[i]
+        # Record each part as it finishes, so that the parts that did finish
+        # are not redone if another one fails.
+        for future in as_completed(futures):
+            if future.exception() is not None:
+                logger.error(f"Failed to export {futures[future].name}")
+                errors.append(future.exception())
+                continue
+            manifest["done"].append(futures[future].name)
+            _write_manifest(manifest_path, manifest)
+    if errors:
+        raise errors[0]
+    return part_paths
+
+
+def isin_sorted(sorted_keys: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Check which query values are in an array of sorted keys."""
+    idx = np.searchsorted(sorted_keys, query)
+    found = idx < len(sorted_keys)
+    found[found] = sorted_keys[idx[found]] == query[found]
+    return found
+
+
+def get_stmt_meta_table(stmt_hash_to_activity_type_count: dict,
+                        source_counts: dict,
+                        belief_scores: dict) -> pd.DataFrame:
+    """Get the metadata of each statement as columns sorted by hash."""
+    hashes = np.fromiter(stmt_hash_to_activity_type_count.keys(),
+                         dtype=np.int64,
+                         count=len(stmt_hash_to_activity_type_count))
+    activity, is_active, type_num, agent_count = \
+        zip(*stmt_hash_to_activity_type_count.values()) \
+        if len(hashes) else ((), (), (), ())
+    meta = pd.DataFrame({
+        "mk_hash": hashes,
+        "ev_count": np.fromiter(
+            (sum(source_counts.get(h, {}).values()) for h in hashes.tolist()),
+            dtype=np.int64, count=len(hashes)
+        ),
+        "belief": pd.array([belief_scores.get(h) for h in hashes.tolist()],
+                           dtype="Float64"),
+        "type_num": np.array(type_num, dtype=np.int16),
+        "activity": pd.array(activity, dtype=object),
+        "is_active": np.array(is_active, dtype=bool),
+        "agent_count": np.array(agent_count, dtype=np.int32),
+    })
+    return meta.sort_values("mk_hash", kind="stable").reset_index(drop=True)
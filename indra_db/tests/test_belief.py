@@ -1,7 +1,9 @@
 import pytest
+import numpy as np
 from indra.belief import BeliefEngine
 from indra_db.belief import MockStatement, MockEvidence, populate_support, \
-    load_mock_statements, calculate_belief
+    load_mock_statements, calculate_belief, SourceCounts, iter_count_groups, \
+    get_source_priors, score_counts, get_support_totals
 from indra_db.tests.util import get_prepped_db
 
 
@@ -69,6 +71,40 @@ def test_belief_calc_up_to_hierarchy():
     assert all_deltas_correct, deltas_dict
 
 
+def test_belief_from_counts_matches_mock():
+    ev_srcs = {
+        -11: [('reach', None), ('reach', None), ('sparser', None)],
+        12: [('biopax', 'pc11'), ('biopax', 'phosphosite')],
+        13: [('signor', None)],
+        14: [('biopax', 'pc11'), ('reach', None)],
+        15: [('bel', None), ('trips', None), ('trips', None)],
+        16: [('biogrid', None)],
+    }
+    sup_links = [(-11, 12), (-11, 13), (12, 13), (-11, 15), (14, 13)]
+
+    test_stmts = [MockStatement(h, [MockEvidence(src, source_sub_id=sub)
+                                    for src, sub in srcs])
+                  for h, srcs in ev_srcs.items()]
+    populate_support(test_stmts, sup_links)
+    expected = calculate_belief(test_stmts)
+
+    rows = [(h, src, sub, 1) for h, srcs in ev_srcs.items()
+            for src, sub in srcs]
+    source_counts = SourceCounts.from_rows(rows)
+    priors = get_source_priors(source_counts.sources)
+    groups = list(iter_count_groups(source_counts, np.array(sup_links),
+                                    group_size=2))
+    assert sum(len(hashes) for hashes, _, _ in groups) == len(ev_srcs)
+    beliefs = {}
+    for hashes, counts, links in groups:
+        totals = get_support_totals(counts, links)
+        beliefs.update(zip(map(str, hashes.tolist()),
+                           score_counts(totals, *priors).tolist()))
+    assert beliefs.keys() == expected.keys(), (beliefs, expected)
+    assert all(np.isclose(beliefs[h], expected[h]) for h in expected), \
+        (beliefs, expected)
+
+
 @pytest.mark.nonpublic
 def test_mock_stmt_load_and_belief_calc():
     db = get_prepped_db(1000, with_pa=True)
@@ -251,6 +251,45 @@ def test_multiple_pmids():
     return
 
 
+@attr('nonpublic')
+def test_filter_text_refs_missing_ids():
+    "Test that records missing some ids are matched on the ids they have."
+    db = get_temp_db(clear=True)
+    db.session.add_all([db.TextRef.new(pmid='1234'),
+                        db.TextRef.new(pmid='5678', doi='10.1000/ABC')])
+    db.commit("Failed to add text refs.")
+    pm = Pubmed(ftp_url=get_test_ftp_url(), local=True)
+    records = {('1234', 'PMC100', None, None, None),
+               (None, None, '10.1000/ABC', None, None),
+               ('9999', None, None, None, None)}
+    new_records, flawed, updated_id_map = \
+        pm.filter_text_refs(db, records, primary_id_types=['pmid', 'pmcid',
+                                                           'doi'])
+    assert_equal(new_records, {('9999', None, None, None, None)})
+    assert_equal(flawed, [])
+    assert_equal(set(updated_id_map), {'1234'})
+    tr = db.select_one(db.TextRef, db.TextRef.pmid == '1234')
+    assert_equal(tr.pmcid, 'PMC100')
+    return
+
+
+@attr('nonpublic')
+def test_parallel_pubmed_upload():
+    "Test that parsing pubmed files in parallel loads the same refs."
+    db = get_temp_db(clear=True)
+    Pubmed(ftp_url=get_test_ftp_url(), local=True).populate(db)
+    serial_pmids = {tr.pmid for tr in db.select_all('text_ref')}
+    serial_files = {sf.name for sf in db.select_all('source_file')}
+
+    db = get_temp_db(clear=True)
+    Pubmed(ftp_url=get_test_ftp_url(), local=True).populate(db, n_procs=2)
+    parallel_pmids = {tr.pmid for tr in db.select_all('text_ref')}
+    parallel_files = {sf.name for sf in db.select_all('source_file')}
+    assert serial_pmids == parallel_pmids, "Text refs differ."
+    assert serial_files == parallel_files, "Source files differ."
+    return
+
+
 @attr('nonpublic')
 def test_multible_pmc_oa_content():
     "Test to make sure repeated content is handled correctly."
@@ -264,6 +303,26 @@ def test_multible_pmc_oa_content():
     return
 
 
+@attr('nonpublic')
+def test_concurrent_pmc_oa_upload():
+    "Test that the concurrent ingest loads the same content as the serial."
+    db = get_temp_db(clear=True)
+    PmcOA(ftp_url=get_test_ftp_url(), local=True).populate(db)
+    serial_tcs = {(tc.text_ref_id, tc.text_type)
+                  for tc in db.select_all('text_content')}
+
+    db = get_temp_db(clear=True)
+    PmcOA(ftp_url=get_test_ftp_url(), local=True).populate(db, n_procs=2)
+    concurrent_tcs = {(tc.text_ref_id, tc.text_type)
+                      for tc in db.select_all('text_content')}
+    assert len(serial_tcs) == len(concurrent_tcs),\
+        "Got %d content entries concurrently, expected %d." \
+        % (len(concurrent_tcs), len(serial_tcs))
+    assert len(db.select_all('source_file')),\
+        "No source files were recorded."
+    return
+
+
 @attr('nonpublic')
 def test_multiple_text_ref_pmc_oa():
     "Test whether a duplicate text ref in pmc oa is handled correctly."
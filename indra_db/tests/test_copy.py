@@ -65,6 +65,20 @@ def test_push_copy():
     assert new_date != original_date, "PMID b was not updated."
 
 
+def test_push_copy_returning():
+    db = get_temp_db(True)
+    inps_1 = _do_init_copy(db)
+    inps_2 = {('b', '2'), ('c', '1'), ('d', '3')}
+
+    ret = db.copy_push('text_ref', inps_2, COLS, return_cols=('pmid', 'id'))
+    _assert_set_equal(inps_1 | inps_2, _ref_set(db))
+    id_dict = dict(ret)
+    assert set(id_dict) == {pmid for pmid, _ in inps_2}, id_dict
+    for pmid, trid in id_dict.items():
+        assert db.select_one(db.TextRef.id, db.TextRef.pmid == pmid)[0] \
+            == trid
+
+
 def test_push_report_copy():
     db = get_temp_db(True)
     inps_1 = _do_init_copy(db)
@@ -0,0 +1,97 @@
+import time
+import threading
+from contextlib import ExitStack
+from unittest import mock
+
+import boto3
+import moto
+
+from indra_db.cli import dump as dm
+from indra_db.util import S3Path
+
+
+def test_dump_order():
+    """Test that each dumper comes after all the dumpers it requires."""
+    order = dm.get_dump_order()
+    assert order[-1] is dm.End
+    assert dm.Start not in order
+    assert dm.FullPaStmts not in order
+    for i, dumper_class in enumerate(order):
+        assert all(req is dm.Start or req in order[:i]
+                   for req in dumper_class.requires), dumper_class.name
+
+
+@moto.mock_s3
+def test_run_dumpers():
+    """Test running independent dumpers together, and continuing."""
+    s3 = boto3.client('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket='test-dumps')
+    events = []
+    lock = threading.Lock()
+
+    failing = {dm.Sif}
+
+    def mock_dump(self, continuing=False):
+        with lock:
+            events.append(('start', self.__class__))
+        if self.__class__ in failing:
+            raise ValueError("Failed dump.")
+        time.sleep(0.05)
+        self.get_s3_path().upload(boto3.client('s3'), b'')
+        with lock:
+            events.append(('end', self.__class__))
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(
+            dm, 'get_s3_dump', return_value=S3Path('test-dumps', 'dumps/')))
+        stack.enter_context(mock.patch.object(dm, '_copy_db',
+                                              return_value=None))
+        for dumper_class in dm.get_dump_order():
+            stack.enter_context(mock.patch.object(dumper_class, 'dump',
+                                                  mock_dump))
+
+        start = dm.Start(date_stamp='2020-01-01')
+        start.dump()
+        try:
+            dm.run_dumpers(start, None, n_workers=3, max_heavy=2)
+        except ValueError:
+            pass
+        else:
+            assert False, "Expected the Sif dump to fail."
+        assert not dm.Sif.from_list(start.manifest)
+        assert not dm.End.from_list(start.manifest)
+        finished = {d for e, d in events if e == 'end'}
+
+        # When continuing, only what did not finish should run.
+        failing.clear()
+        events.clear()
+        start = dm.Start()
+        start.load(S3Path('test-dumps', 'dumps/2020-01-01/'))
+        dm.run_dumpers(start, None, allow_continue=True, n_workers=3,
+                       max_heavy=2)
+        started = [d for e, d in events if e == 'start']
+        assert set(started) == set(dm.get_dump_order()) - finished, started
+        assert started[-1] is dm.End
+        assert dm.End.from_list(start.manifest)
+
+        # Check that the requirements were respected, and the limit on heavy
+        # dumpers was kept, in a full run.
+        events.clear()
+        start = dm.Start(date_stamp='2020-02-01')
+        start.dump()
+        dm.run_dumpers(start, None, n_workers=3, max_heavy=2)
+        ended = set()
+        running = set()
+        max_heavy = 0
+        for event, dumper_class in events:
+            if event == 'start':
+                assert all(req is dm.Start or req in ended
+                           for req in dumper_class.requires)
+                running.add(dumper_class)
+                max_heavy = max(max_heavy,
+                                sum(d.heavy_compute for d in running))
+            else:
+                running.remove(dumper_class)
+                ended.add(dumper_class)
+        assert ended == set(dm.get_dump_order())
+        assert max_heavy == 2, max_heavy
@@ -0,0 +1,145 @@
+import json
+import time
+import tempfile
+import threading
+from os import path
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.request import urlopen
+
+from indra_db.util.fetcher import ConcurrentFetcher, PersistentCache, \
+    TokenBucket
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Answer /publisher/<doi> requests, failing the first try for some."""
+    hits = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        doi = self.path.split('/publisher/')[1]
+        with self.lock:
+            self.hits[doi] = self.hits.get(doi, 0) + 1
+            n_hits = self.hits[doi]
+        if doi.startswith('FLAKY') and n_hits == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'publisher': 'Elsevier BV'}).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub_server():
+    _StubHandler.hits = {}
+    server = HTTPServer(('127.0.0.1', 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    def get_publisher(doi):
+        with urlopen(f'{url}/publisher/{doi}') as resp:
+            return json.loads(resp.read())['publisher']
+
+    return server, get_publisher
+
+
+def test_fetcher_retries_and_caches():
+    server, get_publisher = _start_stub_server()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        cache = PersistentCache(path.join(tmp_dir, 'cache.sqlite'))
+        fetcher = ConcurrentFetcher(get_publisher, n_workers=4, backoff=0.01,
+                                    cache=cache, cache_prefix='publisher:')
+        dois = ['10.1/A%d' % i for i in range(10)] + ['FLAKY1', 'FLAKY2']
+        res = fetcher.fetch_all(dois)
+        assert set(res) == set(dois), set(dois) - set(res)
+        assert all(pub == 'Elsevier BV' for pub in res.values())
+        assert _StubHandler.hits['FLAKY1'] == 2, _StubHandler.hits
+
+        # A new fetcher with the same cache file should not make any calls.
+        cache.close()
+        cache = PersistentCache(path.join(tmp_dir, 'cache.sqlite'))
+        fetcher = ConcurrentFetcher(get_publisher, cache=cache,
+                                    cache_prefix='publisher:')
+        n_hits = sum(_StubHandler.hits.values())
+        assert fetcher.fetch_all(dois) == res
+        assert sum(_StubHandler.hits.values()) == n_hits
+        assert cache.keys('publisher:') == {'publisher:' + doi
+                                            for doi in dois}
+    finally:
+        server.shutdown()
+
+
+def test_fetcher_gives_up():
+    def always_fails(inp):
+        raise ValueError(inp)
+
+    fetcher = ConcurrentFetcher(always_fails, max_retries=1, backoff=0.01)
+    assert fetcher.fetch_all(['a', 'b']) == {}
+    try:
+        fetcher.fetch_all(['a'], raise_errors=True)
+    except ValueError:
+        pass
+    else:
+        assert False, "Expected the error to be raised."
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    elapsed = time.monotonic() - start
+    assert elapsed >= 0.45, elapsed
+
+
+def test_cache_delete():
+    tmp_dir = tempfile.mkdtemp()
+    cache = PersistentCache(path.join(tmp_dir, 'cache.sqlite'))
+    cache.set_many({'a:1': 1, 'a:2': 2, 'b:1': 3})
+    cache.delete(cache.keys('a:'))
+    assert cache.keys() == {'b:1'}, cache.keys()
+    assert 'a:1' not in cache
+    assert cache.get('b:1') == 3
+
+
+def test_fetcher_no_result():
+    calls = []
+
+    def flaky_lookup(inp):
+        # Fail the first time for each input, and have no result for 'b'.
+        calls.append(inp)
+        if calls.count(inp) == 1:
+            raise ConnectionError("Transient failure.")
+        return None if inp == 'b' else inp.upper()
+
+    tmp_dir = tempfile.mkdtemp()
+    cache = PersistentCache(path.join(tmp_dir, 'cache.sqlite'))
+    # A None cached by an older run may have been a failure, so is refetched.
+    cache.set('pub:c', None)
+    fetcher = ConcurrentFetcher(flaky_lookup, max_retries=1, backoff=0.01,
+                                cache=cache, cache_prefix='pub:')
+    assert fetcher.fetch_all(['a', 'b', 'c']) == {'a': 'A', 'b': None,
+                                                  'c': 'C'}
+    assert cache.get('pub:c') == 'C'
+
+    # The definite "no result" is cached, and not looked up again.
+    calls.clear()
+    assert fetcher.fetch_all(['a', 'b']) == {'a': 'A', 'b': None}
+    assert not calls
+
+    # Only the missing results are cached when results are not.
+    fetcher = ConcurrentFetcher(lambda inp: None if inp == 'e' else inp,
+                                cache=cache, cache_prefix='art:',
+                                cache_results=False)
+    assert fetcher.fetch_all(['d', 'e']) == {'d': 'd', 'e': None}
+    assert cache.keys('art:') == {'art:e'}
+
+    # When the calls keep failing, nothing is cached.
+    fetcher = ConcurrentFetcher(flaky_lookup, max_retries=0, backoff=0.01,
+                                cache=cache, cache_prefix='pub:')
+    assert fetcher.fetch_all(['f']) == {}
+    assert 'pub:f' not in cache
@@ -0,0 +1,125 @@
+import json
+import pickle
+import tempfile
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from indra_db.readonly_dumping import incremental_update as iu
+
+
+def _patch_locations(tmp_dir):
+    names = {
+        "incremental_state_fpath": "incremental_state.json",
+        "unique_stmts_fpath": "unique_statements.tsv.gz",
+        "processed_stmts_fpath": "processed_statements.tsv.gz",
+        "raw_id_info_map_fpath": "raw_stmt_id_to_info_map.tsv.gz",
+        "refinements_fpath": "refinements.tsv.gz",
+        "source_counts_fpath": "source_counts.pkl",
+        "stmt_hash_to_raw_stmt_ids_fpath": "stmt_hash_to_raw_stmt_ids.pkl",
+        "belief_scores_pkl_fpath": "belief_scores.pkl",
+        "new_source_counts_fpath": "incremental/source_counts.pkl",
+        "new_stmt_hash_to_raw_stmt_ids_fpath":
+            "incremental/stmt_hash_to_raw_stmt_ids.pkl",
+        "merged_source_counts_fpath": "incremental/merged_source_counts.pkl",
+        "merged_stmt_hash_to_raw_stmt_ids_fpath":
+            "incremental/merged_stmt_hash_to_raw_stmt_ids.pkl",
+        "merged_belief_scores_pkl_fpath":
+            "incremental/merged_belief_scores.pkl",
+    }
+    (tmp_dir / "incremental").mkdir()
+    (tmp_dir / "split").mkdir()
+    patches = [mock.patch.object(iu, name, tmp_dir / fname)
+               for name, fname in names.items()]
+    patches.append(mock.patch.object(
+        iu, "split_unique_statements_folder_fpath", tmp_dir / "split"
+    ))
+    return patches
+
+
+def _dump(fpath, obj):
+    with fpath.open("wb") as fh:
+        pickle.dump(obj, fh)
+
+
+def _load(fpath):
+    with fpath.open("rb") as fh:
+        return pickle.load(fh)
+
+
+def test_merge_counts_leaves_build_files():
+    tmp_dir = Path(tempfile.mkdtemp())
+    patches = _patch_locations(tmp_dir)
+    for patch in patches:
+        patch.start()
+    try:
+        _dump(iu.source_counts_fpath, {1: Counter(reach=2), 2: Counter(reach=1)})
+        _dump(iu.stmt_hash_to_raw_stmt_ids_fpath, {1: {10, 11}, 2: {12}})
+        _dump(iu.new_source_counts_fpath, {1: Counter(sparser=1),
+                                           3: Counter(reach=1)})
+        _dump(iu.new_stmt_hash_to_raw_stmt_ids_fpath, {1: {20}, 3: {21}})
+
+        changed, removed, source_counts = \
+            iu.merge_counts([(12, 2, "reach")])
+        assert changed == {1, 3}
+        assert removed == {2}
+        assert source_counts == {1: Counter(reach=2, sparser=1),
+                                 3: Counter(reach=1)}
+        assert _load(iu.merged_stmt_hash_to_raw_stmt_ids_fpath) == \
+            {1: {10, 11, 20}, 3: {21}}
+
+        # Merging again (as a rerun would) gives the same result.
+        assert iu.merge_counts([(12, 2, "reach")])[2] == source_counts
+        assert _load(iu.source_counts_fpath) == {1: Counter(reach=2),
+                                                 2: Counter(reach=1)}
+    finally:
+        for patch in patches:
+            patch.stop()
+
+
+def test_rollback_and_commit_update():
+    tmp_dir = Path(tempfile.mkdtemp())
+    patches = _patch_locations(tmp_dir)
+    for patch in patches:
+        patch.start()
+    try:
+        for fpath in iu._get_appended_files():
+            fpath.write_bytes(b"old")
+        (tmp_dir / "split" / "split_0.tsv.gz").write_bytes(b"old")
+        for merged_fpath, fpath in iu._get_swapped_files():
+            _dump(fpath, "old")
+        iu.save_state(100)
+        state = json.loads(iu.incremental_state_fpath.read_text())
+
+        # An update that is interrupted after appending to the build files.
+        pending = iu.begin_update(state, 200, [(1, 2, "reach")])
+        for fpath in iu._get_appended_files():
+            with fpath.open("ab") as fh:
+                fh.write(b"new")
+        (tmp_dir / "split" / "split_1.tsv.gz").write_bytes(b"new")
+        for merged_fpath, _ in iu._get_swapped_files():
+            _dump(merged_fpath, "new")
+        saved = json.loads(iu.incremental_state_fpath.read_text())
+        assert saved["max_raw_stmt_id"] == 100
+        assert saved["pending"]["superseded"] == [[1, 2, "reach"]]
+
+        iu.rollback_update(saved["pending"])
+        for fpath in iu._get_appended_files():
+            assert fpath.read_bytes() == b"old"
+        assert iu._get_split_files() == \
+            [(tmp_dir / "split" / "split_0.tsv.gz").as_posix()]
+
+        # A committed update swaps in the new files, even when resumed after
+        # some of them were swapped in already.
+        merged_fpath, fpath = iu._get_swapped_files()[0]
+        merged_fpath.replace(fpath)
+        iu.commit_update(state, pending)
+        for merged_fpath, fpath in iu._get_swapped_files():
+            assert not merged_fpath.exists()
+            assert _load(fpath) == "new"
+        saved = json.loads(iu.incremental_state_fpath.read_text())
+        assert saved["max_raw_stmt_id"] == 200
+        assert "pending" not in saved
+    finally:
+        for patch in patches:
+            patch.stop()
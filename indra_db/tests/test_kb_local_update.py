@@ -0,0 +1,135 @@
+import csv
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+
+from indra.statements import Agent, Phosphorylation, Evidence
+
+from indra_db.cli.knowledgebase import KnowledgebaseManager, _run_kb, \
+    _merge_kb_results, _preprocess_stmts
+from indra_db.util.fetcher import PersistentCache
+
+TMP_DIR = Path(tempfile.mkdtemp())
+
+
+class _LocalKbManager(KnowledgebaseManager):
+    rows = NotImplemented
+
+    def get_local_fpath(self) -> Path:
+        return TMP_DIR / f"processed_stmts_{self.short_name}.tsv.gz"
+
+    @classmethod
+    def write_rows(cls):
+        with gzip.open(cls().get_local_fpath(), "wt") as fh:
+            csv.writer(fh, delimiter="\t").writerows(cls.rows)
+
+
+class _KbA(_LocalKbManager):
+    name = 'KB A'
+    short_name = 'kba'
+    source = 'kba'
+    rows = [(1, '{"a": 1}'), (2, '{"a": 2}'), (1, '{"a": 3}')]
+
+
+class _KbB(_LocalKbManager):
+    name = 'KB B'
+    short_name = 'kbb'
+    source = 'kbb'
+    rows = [(2, '{"b": 1}'), (3, '{"b": 2}')]
+
+
+def test_run_and_merge_kbs():
+    """Test the sharded raw id info maps and merging of their results."""
+    for Mngr in [_KbA, _KbB]:
+        Mngr.write_rows()
+    results = [_run_kb(_KbB, 12, -1 - 10, True, block_size=10),
+               _run_kb(_KbA, 11, -1, True, block_size=10)]
+
+    # Check the shards.
+    for Mngr, first_id, db_info_id in [(_KbA, -1, 11), (_KbB, -11, 12)]:
+        with gzip.open(Mngr().get_info_shard_fpath(), "rt") as fh:
+            shard_rows = list(csv.reader(fh, delimiter="\t"))
+        assert shard_rows == [[str(first_id - i), str(db_info_id), "\\N",
+                               stmt_json]
+                              for i, (_, stmt_json) in enumerate(Mngr.rows)]
+
+    counts, source_counts, hash_to_raw_ids = _merge_kb_results(results)
+    assert counts == {('kba', 'kba'): 3, ('kbb', 'kbb'): 2}
+    assert source_counts == {1: {'kba': 2}, 2: {'kba': 1, 'kbb': 1},
+                             3: {'kbb': 1}}
+    assert hash_to_raw_ids == {1: {-1, -3}, 2: {-2, -11}, 3: {-12}}
+
+    # A knowledgebase that overflows its block should fail.
+    try:
+        _run_kb(_KbA, 11, -1, True, block_size=2)
+    except ValueError:
+        pass
+    else:
+        assert False, "Expected the raw id block to overflow."
+
+
+def _get_uuid(row):
+    return json.loads(row[1])['id']
+
+
+def _drop_uuid(row):
+    stmt_json = json.loads(row[1])
+    stmt_json.pop('id')
+    return row[0], stmt_json
+
+
+def _make_stmts(sites):
+    return [Phosphorylation(Agent('MAP2K1'), Agent('MAPK1'), 'T', site,
+                            evidence=[Evidence(source_api='kba')])
+            for site in sites]
+
+
+def test_preprocess_cache():
+    """Test that only new statements are preprocessed."""
+    processed = []
+
+    def record(stmts, **kwargs):
+        processed.extend(stmts)
+        return stmts
+
+    def drop_site_1(stmts):
+        return [s for s in stmts if s.position != '1']
+
+    # Stand-ins for the slow assemble corpus steps.
+    ac = SimpleNamespace(fix_invalidities=record, map_grounding=lambda s: s,
+                         map_sequence=drop_site_1)
+    cache = PersistentCache((TMP_DIR / 'stmt_cache.sqlite').as_posix())
+    with mock.patch('indra_db.cli.knowledgebase.ac', ac):
+        stats = Counter()
+        used_keys = set()
+        stmts = _make_stmts(['1', '185', '185', '183'])
+        rows = _preprocess_stmts(stmts, cache, 'v1', stats, used_keys)
+        assert len(processed) == 4
+        assert stats == {'hits': 0, 'misses': 4}
+        assert len(rows) == 3
+        assert len(used_keys) == 3
+        # The identical statements each keep their own uuid.
+        assert [_get_uuid(row) for row in rows] == \
+            [stmt.uuid for stmt in stmts[1:]]
+
+        # The same content, with new uuids, should be taken from the cache,
+        # and only the new statement processed.
+        processed.clear()
+        stats = Counter()
+        stmts = _make_stmts(['1', '185', '183', '202'])
+        new_rows = _preprocess_stmts(stmts, cache, 'v1', stats, set())
+        assert len(processed) == 1 and processed[0].position == '202'
+        assert stats == {'hits': 3, 'misses': 1}
+        assert [_drop_uuid(row) for row in new_rows[:2]] == \
+            [_drop_uuid(row) for row in [rows[0], rows[2]]]
+        assert [_get_uuid(row) for row in new_rows] == \
+            [stmt.uuid for stmt in stmts[1:]]
+
+        # A new version should not use the old results.
+        processed.clear()
+        _preprocess_stmts(_make_stmts(['185']), cache, 'v2', Counter(), set())
+        assert len(processed) == 1
@@ -0,0 +1,98 @@
+import csv
+import gzip
+import json
+import tempfile
+from pathlib import Path
+
+from indra.statements import Agent, Complex, Phosphorylation
+
+from indra_db.readonly_dumping.pa_meta import build_agent_meta, \
+    is_agent_meta_done, synth_ag_id
+from indra_db.readonly_dumping.util import get_stmt_meta_table
+from indra_db.schemas.readonly_schema import ro_type_map
+
+
+def _read_dir(out_dir):
+    rows = []
+    for fpath in sorted(Path(out_dir).glob("*.tsv")):
+        with fpath.open() as fh:
+            rows.extend(tuple(row) for row in csv.reader(fh, delimiter="\t"))
+    return sorted(rows)
+
+
+def _write_pa_meta_part(path, rows):
+    with gzip.open(path, "wt") as fh:
+        writer = csv.writer(fh, delimiter="\t")
+        writer.writerow(["db_name", "db_id", "ag_id", "ag_num", "role",
+                         "mk_hash"])
+        writer.writerows(rows)
+
+
+def _run(tmp_dir, n_proc):
+    phos = Phosphorylation(Agent("MEK", db_refs={"HGNC": "6840"}),
+                           Agent("ERK", db_refs={"TEXT": "erk"}))
+    cplx = Complex([Agent("A", db_refs={"FPLX": "A"}), Agent("B")])
+    unique_shard = tmp_dir / "split_0.tsv.gz"
+    with gzip.open(unique_shard, "wt") as fh:
+        writer = csv.writer(fh, delimiter="\t")
+        # 1 and 2 are in pa_meta, 3 is missing from it and 4 has no evidence.
+        for stmt_hash, stmt in [(1, phos), (3, cplx), (4, phos)]:
+            writer.writerow([stmt_hash, json.dumps(stmt.to_json())])
+
+    parts = [tmp_dir / "part-00000.tsv.gz", tmp_dir / "part-00001.tsv.gz"]
+    _write_pa_meta_part(parts[0], [("NAME", "MEK", 10, 0, "SUBJECT", 1),
+                                   ("HGNC", "68\n40", 11, 0, "SUBJECT", 1),
+                                   ("TEXT", "erk", 12, 1, "OBJECT", 1)])
+    # Statement 2 has no belief, so its agents are left out.
+    _write_pa_meta_part(parts[1], [("NAME", "X", 20, 0, "SUBJECT", 2)])
+
+    phos_num = ro_type_map.get_int("Phosphorylation")
+    cplx_num = ro_type_map.get_int("Complex")
+    stmt_meta = get_stmt_meta_table(
+        {1: (None, False, phos_num, 2), 2: (None, False, phos_num, 2),
+         3: (None, False, cplx_num, 2), 4: (None, False, phos_num, 2)},
+        {1: {"reach": 2}, 2: {"reach": 1}, 3: {"sparser": 1}},
+        {1: 0.5, 3: 0.75, 4: 0.9}
+    )
+    out_dirs = tuple(tmp_dir / name for name in ("name", "text", "other"))
+    build_agent_meta(parts, [unique_shard], stmt_meta, out_dirs,
+                     n_proc=n_proc)
+    return out_dirs
+
+
+def _check(out_dirs):
+    name_dir, text_dir, other_dir = out_dirs
+    assert is_agent_meta_done(out_dirs)
+    phos_num = str(ro_type_map.get_int("Phosphorylation"))
+    cplx_num = str(ro_type_map.get_int("Complex"))
+    phos_end = (phos_num, "1", "2", "0.5", "", "False", "2")
+    cplx_end = (cplx_num, "3", "1", "0.75", "", "False", "2")
+
+    ag_a = str(synth_ag_id(3, 0, -1, "NAME", "A"))
+    ag_b = str(synth_ag_id(3, 1, 1, "NAME", "B"))
+    assert _read_dir(name_dir) == sorted([
+        ("10", "0", "MEK", "-1") + phos_end + ("False",),
+        (ag_a, "0", "A", "-1") + cplx_end + ("False",),
+        (ag_a, "0", "A", "-1") + cplx_end + ("True",),
+        (ag_a, "1", "A", "1") + cplx_end + ("True",),
+        (ag_b, "1", "B", "1") + cplx_end + ("False",),
+        (ag_b, "0", "B", "-1") + cplx_end + ("True",),
+        (ag_b, "1", "B", "1") + cplx_end + ("True",),
+    ])
+    assert _read_dir(text_dir) == [("12", "1", "erk", "1") + phos_end +
+                                   ("False",)]
+    ag_fplx = str(synth_ag_id(3, 0, -1, "FPLX", "A"))
+    assert _read_dir(other_dir) == sorted([
+        ("11", "0", "HGNC", "68 40", "-1") + phos_end + ("False",),
+        (ag_fplx, "0", "FPLX", "A", "-1") + cplx_end + ("False",),
+        (ag_fplx, "0", "FPLX", "A", "-1") + cplx_end + ("True",),
+        (ag_fplx, "1", "FPLX", "A", "1") + cplx_end + ("True",),
+    ])
+
+
+def test_build_agent_meta():
+    _check(_run(Path(tempfile.mkdtemp()), n_proc=1))
+
+
+def test_build_agent_meta_parallel():
+    _check(_run(Path(tempfile.mkdtemp()), n_proc=2))
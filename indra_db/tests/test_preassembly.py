@@ -26,6 +26,7 @@ from indra.tools import assemble_corpus as ac
 from indra_db import util as db_util
 from indra_db import client as db_client
 from indra_db.preassembly import preassemble_db as pdb
+from indra_db.util.distill_statements import _filter_text_ref_stmts
 from indra_db.tests.util import get_pa_loaded_db, get_temp_db
 from indra_db.tests.db_building_util import DbBuilder
 
@@ -598,6 +599,56 @@ def test_distillation_on_curated_set():
         (len(filtered_set), len(filtered_id_set))
 
 
+def test_streamed_distillation_matches_nested():
+    db = _get_db_no_pa_stmts()
+    stmt_nd = db_util.get_reading_stmt_dict(db, get_full_stmts=False)
+    target_ids, target_bettered_ids = \
+        db_util.get_filtered_rdg_stmts(stmt_nd, get_full_stmts=False)
+
+    stmt_ids = set()
+    bettered_ids = set()
+    for sids, bettered_sids, bad_link_sids \
+            in db_util.iter_filtered_rdg_stmt_ids(db):
+        stmt_ids |= sids
+        bettered_ids |= bettered_sids
+        assert not bad_link_sids
+    assert len(stmt_ids) == len(target_ids), (len(stmt_ids), len(target_ids))
+    assert bettered_ids == target_bettered_ids
+
+
+def test_filter_text_ref_all_stmts_linked():
+    # The only raw statement of the text ref is already linked.
+    rv = db_util.reader_versions['reach'][-1]
+    src_dict = NestedDict()
+    src_dict[('pubmed', 'abstract')][1]['reach'][rv][1][(123, 456)] = \
+        {(10, None)}
+    stmt_tpls, bettered_tpls = \
+        _filter_text_ref_stmts(src_dict, {10}, set())
+    assert stmt_tpls == {(10, None)}, stmt_tpls
+    assert not bettered_tpls
+
+
+def test_streamed_distillation_with_links():
+    db = _get_db_with_pa_stmts()
+    linked_sids = {sid for sid, in
+                   db.select_all(db.RawUniqueLinks.raw_stmt_id)}
+    assert linked_sids
+    stmt_nd = db_util.get_reading_stmt_dict(db, get_full_stmts=False)
+    target_ids, target_bettered_ids = \
+        db_util.get_filtered_rdg_stmts(stmt_nd, get_full_stmts=False,
+                                       linked_sids=linked_sids)
+
+    stmt_ids = set()
+    bettered_ids = set()
+    for sids, bettered_sids, bad_link_sids \
+            in db_util.iter_filtered_rdg_stmt_ids(db):
+        stmt_ids |= sids
+        bettered_ids |= bettered_sids
+        assert bad_link_sids <= linked_sids
+    assert stmt_ids == target_ids, (stmt_ids, target_ids)
+    assert bettered_ids == target_bettered_ids
+
+
 @attr('nonpublic')
 def test_db_lazy_insert():
     rldb = RefLoadedDb()
@@ -725,6 +776,22 @@ def test_db_preassembly():
     return
 
 
+def test_db_preassembly_multiproc():
+    db = _get_db_no_pa_stmts()
+    opa_inp_stmts = _get_opa_input_stmts(db)
+
+    # Use small batches and few cached batches, so that batches are
+    # regularly re-read from the local store.
+    preassembler = pdb.DbPreassembler(batch_size=2, print_logs=True,
+                                      ontology=_get_test_ontology(),
+                                      n_proc=2, max_cached_batches=1)
+    preassembler.create_corpus(db)
+
+    pa_jsons = db_client.get_pa_stmt_jsons(db=db)
+    pa_stmts = stmts_from_json([r['stmt'] for r in pa_jsons.values()])
+    _check_against_opa_stmts(db, opa_inp_stmts, pa_stmts)
+
+
 @attr('nonpublic')
 def test_db_preassembly_update():
     db = _get_db_with_pa_stmts()
@@ -742,6 +809,21 @@ def test_db_preassembly_update():
     return
 
 
+def test_db_preassembly_update_multiproc_prefilter():
+    db = _get_db_with_pa_stmts()
+
+    preassembler = pdb.DbPreassembler(batch_size=2, print_logs=True,
+                                      ontology=_get_test_ontology(),
+                                      n_proc=2, prefilter=True)
+    opa_inp_stmts = _get_opa_input_stmts(db)
+    sleep(0.5)
+    preassembler.supplement_corpus(db)
+
+    pa_jsons = db_client.get_pa_stmt_jsons(db=db)
+    pa_stmts = stmts_from_json([r['stmt'] for r in pa_jsons.values()])
+    _check_against_opa_stmts(db, opa_inp_stmts, pa_stmts)
+
+
 def test_preassembly_create_corpus_div_by_type():
     db = _get_db_no_pa_stmts()
     opa_inp_stmts = _get_opa_input_stmts(db)
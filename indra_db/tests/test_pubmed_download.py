@@ -0,0 +1,104 @@
+import os
+import tempfile
+import threading
+from hashlib import md5
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from indra_db.readonly_dumping.pubmed import PubmedDownloader
+from indra_db.util.fetcher import PersistentCache
+
+FILES = {f"pubmed24n000{i}.xml.gz": os.urandom(300000) for i in range(1, 5)}
+
+
+class _FtpStubHandler(BaseHTTPRequestHandler):
+    """Serve files with md5s and Range support, cutting off some downloads."""
+    requests = []
+    cut_off = set()
+    bad_md5 = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        name = self.path.split("/")[-1]
+        with self.lock:
+            self.requests.append((name, self.headers.get("Range")))
+        if name.endswith(".md5"):
+            name = name[:-len(".md5")]
+            checksum = md5(FILES[name]).hexdigest()
+            if name in self.bad_md5:
+                checksum = "0" * 32
+            body = f"MD5({name})= {checksum}\n".encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        content = FILES[name]
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"][len("bytes="):].rstrip("-"))
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+        with self.lock:
+            cut = name in self.cut_off
+            self.cut_off.discard(name)
+        if cut:
+            # Send half of the file and drop the connection.
+            self.wfile.write(content[start:start + len(content)//2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+def test_downloader_resumes_and_skips_verified():
+    _FtpStubHandler.requests = []
+    _FtpStubHandler.cut_off = {"pubmed24n0002.xml.gz"}
+    _FtpStubHandler.bad_md5 = {"pubmed24n0004.xml.gz"}
+    server = HTTPServer(("127.0.0.1", 0), _FtpStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d/pubmed/baseline/" % server.server_address[1]
+    urls = [url + name for name in FILES]
+
+    out_dir = Path(tempfile.mkdtemp())
+    try:
+        manifest = PersistentCache((out_dir / "manifest.sqlite").as_posix())
+        downloader = PubmedDownloader(out_dir, manifest=manifest,
+                                      n_workers=3, retries=2, backoff=0.01,
+                                      timeout=5)
+        ready = []
+        paths = downloader.download_all(urls, on_file=ready.append)
+
+        # The file with the wrong checksum is not kept.
+        assert set(paths) == set(urls[:3])
+        assert sorted(p.name for p in ready) == sorted(list(FILES)[:3])
+        for name in list(FILES)[:3]:
+            assert (out_dir / name).read_bytes() == FILES[name]
+        assert not list(out_dir.glob("*.part"))
+        assert not (out_dir / "pubmed24n0004.xml.gz").exists()
+
+        # The cut off download was continued from where it stopped.
+        ranges = [rng for name, rng in _FtpStubHandler.requests
+                  if name == "pubmed24n0002.xml.gz"]
+        assert ranges[0] is None
+        assert ranges[1] is not None and ranges[1] != "bytes=0-", ranges
+
+        # Verified files are not downloaded or checked again.
+        _FtpStubHandler.requests = []
+        _FtpStubHandler.bad_md5 = set()
+        ready = []
+        paths = downloader.download_all(urls, on_file=ready.append)
+        assert set(paths) == set(urls)
+        assert len(ready) == 4
+        assert {name for name, _ in _FtpStubHandler.requests} == \
+            {"pubmed24n0004.xml.gz", "pubmed24n0004.xml.gz.md5"}
+        manifest.close()
+    finally:
+        server.shutdown()
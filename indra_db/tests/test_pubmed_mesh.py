@@ -0,0 +1,133 @@
+import csv
+import gzip
+import pickle
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from indra_db.readonly_dumping import readonly_dumping as rd
+from indra_db.readonly_dumping.pubmed import expand_matches
+
+
+def _make_article(pmid, mesh_ids=(), suppl_ids=()):
+    headings = "".join(
+        f'<MeshHeading><DescriptorName UI="{mesh_id}" MajorTopicYN="N">'
+        f'Name</DescriptorName></MeshHeading>' for mesh_id in mesh_ids
+    )
+    suppl = "".join(f'<SupplMeshName UI="{mesh_id}">Name</SupplMeshName>'
+                    for mesh_id in suppl_ids)
+    return (f'<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID>'
+            f'<MeshHeadingList>{headings}</MeshHeadingList>'
+            f'<SupplMeshList>{suppl}</SupplMeshList>'
+            f'</MedlineCitation></PubmedArticle>')
+
+
+def _write_xml(path, articles):
+    with gzip.open(path, "wt") as fh:
+        fh.write('<?xml version="1.0"?><PubmedArticleSet>')
+        fh.write("".join(articles))
+        fh.write("</PubmedArticleSet>")
+
+
+def _read_tsv(path):
+    with open(path) as fh:
+        return [tuple(row) for row in csv.reader(fh, delimiter="\t")]
+
+
+def test_expand_matches():
+    keys = np.array([1, 1, 2, 4, 4, 4])
+    query_idx, key_idx = expand_matches(keys, np.array([4, 3, 1]))
+    assert query_idx.tolist() == [0, 0, 0, 2, 2]
+    assert key_idx.tolist() == [3, 4, 5, 0, 1]
+
+
+def _dump(fpath, obj):
+    with fpath.open("wb") as fh:
+        pickle.dump(obj, fh)
+
+
+def _load(fpath):
+    with fpath.open("rb") as fh:
+        return pickle.load(fh)
+
+
+def test_ensure_pubmed_mesh_data():
+    tmp_dir = Path(tempfile.mkdtemp())
+    xml_dir = tmp_dir / "xml"
+    xml_dir.mkdir()
+    xml_paths = [xml_dir / "pubmed24n0001.xml.gz",
+                 xml_dir / "pubmed24n0002.xml.gz"]
+    _write_xml(xml_paths[0], [_make_article(1, ["D000001", "D000002"]),
+                              _make_article(2, ["D000001"], ["C000005"]),
+                              _make_article(3)])
+    # An update with a revised version of pmid 2.
+    _write_xml(xml_paths[1], [_make_article(2, ["D000003"]),
+                              _make_article(4, ["D000002"])])
+
+    def ensure_xml_files(xml_dir, on_file=None):
+        # The files are "downloaded" in reverse order.
+        for xml_path in reversed(xml_paths):
+            on_file(xml_path)
+        return len(xml_paths)
+
+    # Raw statements 10 and 11 are from pmid 1, 20 is from pmid 2, and pmid 3
+    # and 4 have no statements. Raw statements 10 and 20 have the same hash,
+    # and statement 101 has no metadata, so gets no meta rows.
+    _dump(tmp_dir / "hash_raw_ids.pkl", {100: {10, 20}, 101: {11}})
+    _dump(tmp_dir / "source_counts.pkl", {100: {"reach": 2, "sparser": 1}})
+    _dump(tmp_dir / "belief.pkl", {})
+    paths = {
+        "pubmed_xml_gz_dir": xml_dir,
+        "pubmed_mesh_shards_dir": tmp_dir / "shards",
+        "stmt_hash_to_raw_stmt_ids_fpath": tmp_dir / "hash_raw_ids.pkl",
+        "source_counts_fpath": tmp_dir / "source_counts.pkl",
+        "belief_scores_pkl_fpath": tmp_dir / "belief.pkl",
+        "raw_stmt_mesh_concepts_fpath": tmp_dir / "raw_concepts.tsv",
+        "raw_stmt_mesh_terms_fpath": tmp_dir / "raw_terms.tsv",
+        "mesh_concepts_meta_fpath": tmp_dir / "concepts_meta.tsv",
+        "mesh_terms_meta_fpath": tmp_dir / "terms_meta.tsv",
+        "pmid_mesh_map_fpath": tmp_dir / "pmid_mesh_map.pkl",
+        "pmid_stmt_hash_fpath": tmp_dir / "pmid_stmt_hash.pkl",
+    }
+    patches = [mock.patch.object(rd, name, fpath)
+               for name, fpath in paths.items()]
+    patches += [
+        mock.patch.object(rd, "ensure_pubmed_xml_files", ensure_xml_files),
+        mock.patch.object(rd, "_load_pmid_to_raw_stmt_id",
+                          lambda: {1: {10, 11}, 2: {20}}),
+        mock.patch.object(rd, "get_activity_type_ag_count",
+                          lambda: {100: ("kinase", True, 3, 2)}),
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        rd.ensure_pubmed_mesh_data(n_proc=2)
+    finally:
+        for patch in patches:
+            patch.stop()
+
+    assert sorted(p.name for p in (tmp_dir / "shards").iterdir()) == \
+        ["pubmed24n0001.npz", "pubmed24n0002.npz"]
+    assert _load(paths["pmid_mesh_map_fpath"]) == {
+        "1": {"concepts": set(), "terms": {1, 2}},
+        "2": {"concepts": {5}, "terms": {1, 3}},
+        "3": {"concepts": set(), "terms": set()},
+        "4": {"concepts": set(), "terms": {2}},
+    }
+    assert _load(paths["pmid_stmt_hash_fpath"]) == {"1": {100, 101},
+                                                    "2": {100}}
+    assert sorted(_read_tsv(paths["raw_stmt_mesh_concepts_fpath"])) == \
+        [("20", "5")]
+    assert sorted(_read_tsv(paths["raw_stmt_mesh_terms_fpath"])) == [
+        ("10", "1"), ("10", "2"), ("11", "1"), ("11", "2"), ("20", "1"),
+        ("20", "3")
+    ]
+    assert _read_tsv(paths["mesh_concepts_meta_fpath"]) == [
+        ("100", "3", "", "5", "3", "kinase", "True", "2")
+    ]
+    assert sorted(_read_tsv(paths["mesh_terms_meta_fpath"])) == [
+        ("100", "3", "", str(mesh_num), "3", "kinase", "True", "2")
+        for mesh_num in [1, 2, 3]
+    ]
@@ -0,0 +1,66 @@
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from indra_db.readonly_dumping import util
+from indra_db.readonly_dumping.util import get_partition_edges, \
+    export_query_partitions, PARTITION_MANIFEST
+
+
+def test_partition_edges():
+    edges = get_partition_edges((-2**63, 2**63 - 1), 64)
+    assert len(edges) == 65
+    assert edges[0] == -2**63 and edges[-1] == 2**63
+    assert all(lo < hi for lo, hi in zip(edges, edges[1:]))
+
+    # There are never more parts than keys.
+    assert get_partition_edges((5, 7), 10) == [5, 6, 7, 8]
+    assert get_partition_edges((0, 0), 4) == [0, 1]
+
+
+def test_export_resumes():
+    """Test that an interrupted export only redoes the unfinished parts."""
+    out_dir = Path(tempfile.mkdtemp())
+    copied = []
+    failing = {'part-00002.tsv.gz'}
+
+    def fake_copy(db_uri, query, out_path):
+        copied.append(out_path.name)
+        if out_path.name in failing:
+            raise ConnectionError("Lost the connection.")
+        with gzip.open(out_path, 'wt') as fh:
+            fh.write(f"id\n{query}\n")
+
+    with mock.patch.object(util, '_copy_partition', fake_copy):
+        try:
+            export_query_partitions('SELECT id FROM t', 'fake://', out_dir,
+                                    'id', bounds=(0, 99), n_parts=4,
+                                    n_workers=2)
+        except ConnectionError:
+            pass
+        else:
+            assert False, "Expected the export to fail."
+        manifest = json.loads((out_dir / PARTITION_MANIFEST).read_text())
+        assert sorted(manifest['done']) == ['part-00000.tsv.gz',
+                                            'part-00001.tsv.gz',
+                                            'part-00003.tsv.gz']
+
+        failing.clear()
+        copied.clear()
+        parts = export_query_partitions('SELECT id FROM t', 'fake://',
+                                        out_dir, 'id', n_parts=4)
+        assert copied == ['part-00002.tsv.gz']
+        assert [p.name for p in parts] == [f'part-0000{i}.tsv.gz'
+                                           for i in range(4)]
+        with gzip.open(parts[2], 'rt') as fh:
+            assert 'part.id >= 50 AND part.id < 75' in fh.read()
+
+        # A different query starts over.
+        copied.clear()
+        export_query_partitions('SELECT id FROM u', 'fake://', out_dir, 'id',
+                                bounds=(0, 9), n_parts=2)
+        assert sorted(copied) == ['part-00000.tsv.gz', 'part-00001.tsv.gz']
+        assert sorted(p.name for p in out_dir.glob('part-*')) == \
+            ['part-00000.tsv.gz', 'part-00001.tsv.gz']
@@ -0,0 +1,59 @@
+import gzip
+import json
+import random
+
+import boto3
+import moto
+
+from indra_db.util import S3Path, GzipMultipartUpload
+
+MB = 1024**2
+
+
+def _make_lines(n, seed=0):
+    # Random digits do not compress well, so that several parts are needed.
+    rand = random.Random(seed)
+    return [json.dumps({'id': i, 'data': '%030d' % rand.getrandbits(96)})
+            .encode('utf-8') for i in range(n)]
+
+
+@moto.mock_s3
+def test_gzip_multipart_upload_resume():
+    """Test that an interrupted multipart upload can be continued."""
+    s3 = boto3.client('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket='test-bucket')
+    s3_path = S3Path('test-bucket', 'dumps/test.jsonl.gz')
+    lines = _make_lines(600000)
+
+    # Upload the first couple parts, and then "crash".
+    upload = GzipMultipartUpload(s3, s3_path, part_size=5*MB).start()
+    for i, line in enumerate(lines):
+        upload.write(line, marker=i)
+        if len(upload.parts) == 2:
+            break
+    assert s3_path.list_objects(s3) == [upload.state_path]
+
+    # Pick up where the last part left off.
+    upload = GzipMultipartUpload(s3, s3_path, part_size=5*MB)
+    upload.start(continuing=True)
+    assert len(upload.parts) == 2, upload.parts
+    for i, line in enumerate(lines[upload.last_marker + 1:],
+                             upload.last_marker + 1):
+        upload.write(line, marker=i)
+    upload.complete()
+    assert len(upload.parts) > 2, upload.parts
+    assert not upload.state_path.exists(s3)
+
+    # The result should be one gzip file with each line exactly once.
+    body = gzip.decompress(s3_path.get(s3)['Body'].read())
+    assert body.splitlines() == lines
+
+
+@moto.mock_s3
+def test_gzip_multipart_upload_empty():
+    """Test that an upload with no lines still produces a valid file."""
+    s3 = boto3.client('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket='test-bucket')
+    s3_path = S3Path('test-bucket', 'dumps/empty.jsonl.gz')
+    GzipMultipartUpload(s3, s3_path).start().complete()
+    assert gzip.decompress(s3_path.get(s3)['Body'].read()) == b''
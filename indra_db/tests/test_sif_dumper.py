@@ -1,3 +1,4 @@
+import tempfile
 import unittest
 import numpy as np
 from os import path, remove
@@ -5,7 +6,9 @@ import pandas as pd
 
 import indra_db.tests.util as tu
 from indra_db.util.dump_sif import load_db_content, get_source_counts, \
-    make_dataframe, NS_LIST, normalize_sif_names
+    make_dataframe, NS_LIST, normalize_sif_names, dump_table, \
+    SourceCountTable, load_res_pos_table, _get_source_count_schema, \
+    _get_res_pos_schema
 
 
 class SifDumperTester(unittest.TestCase):
@@ -108,3 +111,34 @@ def test_normalize_names():
     normalize_sif_names(sif_df)
     # Both names should now be SPRING1
     assert set(sif_df.agA_name.values) == {'SPRING1'}
+
+
+def test_source_count_table():
+    """Check that the source count table gives the same dicts."""
+    src_counts = {-5: {'reach': 3, 'pc': 1}, 12: {'sparser': 2},
+                  7: {'reach': 1, 'sparser': 1, 'medscan': 4}}
+    rows = [(h, src, n) for h, counts in src_counts.items()
+            for src, n in counts.items()]
+    tbl_file = path.join(tempfile.mkdtemp(), 'source_count.parquet')
+
+    # Write the rows in a couple of row groups.
+    assert dump_table([rows[:3], rows[3:]], _get_source_count_schema(),
+                      tbl_file) == len(rows)
+
+    src_count_table = SourceCountTable.from_file(tbl_file)
+    assert len(src_count_table) == len(src_counts)
+    for h, counts in src_counts.items():
+        assert h in src_count_table
+        assert src_count_table.get(h) == counts
+        assert src_count_table[h] == counts
+    assert 1 not in src_count_table
+    assert src_count_table.get(1) is None
+
+
+def test_res_pos_table():
+    """Check that the residue/position table loads into the old dicts."""
+    rows = [(1, 'S', '222'), (2, 'T', None), (-3, None, '15')]
+    tbl_file = path.join(tempfile.mkdtemp(), 'res_pos.parquet')
+    dump_table([rows], _get_res_pos_schema(), tbl_file)
+    assert load_res_pos_table(tbl_file) == {'residue': {1: 'S', 2: 'T'},
+                                            'position': {1: '222', -3: '15'}}
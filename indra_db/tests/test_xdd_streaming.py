@@ -0,0 +1,62 @@
+import json
+
+import boto3
+import moto
+
+from indra_db.cli.xdd import XddManager
+from indra_db.util import S3Path
+
+BUCKET = 'hms-uw-collaboration'
+
+
+def _make_group_files(s3, group_name, dois):
+    bibs = [{'_xddid': f'{group_name}-{i}', 'publisher': 'bioRxiv',
+             'identifier': [{'type': 'doi', 'id': doi}]}
+            for i, doi in enumerate(dois)]
+    bibs.append({'_xddid': f'{group_name}-nodoi', 'publisher': 'Elsevier'})
+    stmts = [{'type': 'Phosphorylation',
+              'enz': {'name': 'MAP2K1', 'db_refs': {}},
+              'sub': {'name': 'MAPK1', 'db_refs': {}},
+              'evidence': [{'source_api': 'reach', 'pmid': None,
+                            'text_refs': {'CONTENT_ID': bib['_xddid'],
+                                          'READER': 'REACH'}}]}
+             for bib in bibs]
+    for suffix, content in [('bib', bibs), ('stmts', stmts)]:
+        s3.put_object(Bucket=BUCKET, Key=f'{group_name}/run1_{suffix}.json',
+                      Body=json.dumps(content))
+
+
+@moto.mock_s3
+def test_iter_and_load_groups():
+    """Test streaming groups from s3, and organizing each by trid."""
+    s3 = boto3.client('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket=BUCKET)
+    group_dois = {'2020-01-01': ['10.1/a', '10.1/b'],
+                  '2020-01-02': ['10.1/c']}
+    for group_name, dois in group_dois.items():
+        _make_group_files(s3, group_name, dois)
+
+    xm = XddManager()
+    xm.groups = [S3Path(BUCKET, f'{group_name}/')
+                 for group_name in group_dois]
+    trids = {'10.1/A': 1, '10.1/B': 2, '10.1/C': 3}
+    seen = []
+    for group, file_pair_dict, got_all in xm.iter_group_files(s3):
+        assert got_all
+        assert set(file_pair_dict) == {(group.key + 'run1', None)}
+        statements, text_content = \
+            xm.load_group(group, file_pair_dict, trids)
+        seen.append(group.key)
+
+        # The statement without a DOI in its bib is skipped.
+        exp_trids = {trids[doi.upper()] for doi in group_dois[group.key[:-1]]}
+        assert set(statements) == exp_trids
+        assert set(text_content) == exp_trids
+        for trid, reader_stmts in statements.items():
+            sj, = reader_stmts['REACH']
+            text_refs = sj['evidence'][0]['text_refs']
+            assert text_refs['TRID'] == trid
+            assert text_refs['XDD_GROUP_ID'] == group.key
+            assert 'pmid' not in sj['evidence'][0]
+            assert text_content[trid] == (trid, 'xdd', 'xdd', 'fulltext', True)
+    assert seen == ['2020-01-01/', '2020-01-02/']
@@ -1,5 +1,6 @@
 __all__ = ['distill_stmts', 'get_filtered_rdg_stmts', 'get_filtered_db_stmts',
            'delete_raw_statements_by_id', 'get_reading_stmt_dict',
+           'iter_filtered_rdg_stmt_ids',
            'reader_versions', 'text_content_sources', 'extract_duplicates',
            'KeyFunc']
 
@@ -7,9 +8,12 @@ import json
 import pickle
 import logging
 from datetime import datetime
+from itertools import groupby
 from collections import defaultdict
 
-from indra.util import clockit
+from sqlalchemy import exists
+
+from indra.util import clockit, batch_iter
 from indra.statements import Statement
 from indra.util.nested_dict import NestedDict
 from indra_db.databases import reader_versions
@@ -137,6 +141,80 @@ text_content_sources = [('pubmed', 'title'),
                         ('pmc_oa', 'fulltext')]
 
 
+def _filter_text_ref_stmts(src_dict, linked_sids, bad_dups):
+    """Filter the statements from the readings of a single text ref.
+
+    Returns the statement tuples to keep, and those with "better"
+    alternatives.
+    """
+    stmt_tpls = set()
+    some_bettered_duplicate_tpls = set()
+
+    # Filter out the older reader versions
+    for reader, rv_list in reader_versions.items():
+        simple_src_dict = defaultdict(dict)
+        for (src, _, _), rv_dict in src_dict.get_paths(reader):
+            best_rv = max(rv_dict, key=lambda x: rv_list.index(x))
+
+            # Record the rest of the statement ids.
+            for rv, r_dict in rv_dict.items():
+                if rv != best_rv:
+                    some_bettered_duplicate_tpls |= r_dict.get_leaves()
+                else:
+                    for h, stmt_set in list(r_dict.values())[0].items():
+                        # Sort the statements by their source, and whether
+                        # they are new or old, defined as whether they
+                        # have yet been included in preassembly. There
+                        # should be no overlap in hashes here.
+                        sid_set = {sid for sid, _ in stmt_set}
+                        if sid_set <= linked_sids:
+                            simple_src_dict[src][h] = ('old', stmt_set)
+                        elif sid_set.isdisjoint(linked_sids):
+                            simple_src_dict[src][h] = ('new', stmt_set)
+                        else:
+                            # If you ever see this pop up, something very
+                            # strange has happened. It means that some
+                            # statements from a given reading were already
+                            # included in preassembly, but others were not.
+                            # There is no mechanism that should accept only
+                            # some statements from within a reading, so
+                            # that should never happen, but Murphy will
+                            # always win the day.
+                            assert False, \
+                                "Found reading partially included."
+
+        # Choose the statements to propagate
+        new_stmt_dict = {}
+        for src in reversed(text_content_sources):
+            for h, (status, s_set) in simple_src_dict[src].items():
+                # If this error ever comes up, it means that the uniqueness
+                # constraint on raw statements per reading is not
+                # functioning correctly.
+                if len(s_set) > 1:
+                    logger.warning("Found exact duplicates from the same "
+                                   "reading: %s" % str(s_set))
+                    bad_dups.add(tuple(s_set))
+
+                # Choose whether to keep the statement or not.
+                s_tpl = s_set.pop()
+                if h not in new_stmt_dict:
+                    # No conflict, no problem
+                    new_stmt_dict[h] = s_tpl
+                elif status == 'old':
+                    # The same statement was newly found by a better
+                    # version.
+                    some_bettered_duplicate_tpls.add(s_tpl)
+        stmt_tpls |= set(new_stmt_dict.values())
+
+    return stmt_tpls, some_bettered_duplicate_tpls
+
+
+def _dump_bad_dups(bad_dups):
+    if bad_dups:
+        with open('bad_duplicates_%s.pkl' % datetime.now(), 'wb') as f:
+            pickle.dump(bad_dups, f)
+
+
 def get_filtered_rdg_stmts(stmt_nd, get_full_stmts, linked_sids=None):
     """Get the set of statements/ids from readings minus exact duplicates."""
     logger.info("Filtering the statements from reading.")
@@ -148,72 +226,16 @@ def get_filtered_rdg_stmts(stmt_nd, get_full_stmts, linked_sids=None):
     stmt_tpls = set()
     bettered_duplicate_sids = set()  # Statements with "better" alternatives
     for trid, src_dict in stmt_nd.items():
-        some_bettered_duplicate_tpls = set()
-
-        # Filter out the older reader versions
-        for reader, rv_list in reader_versions.items():
-            simple_src_dict = defaultdict(dict)
-            for (src, _, _), rv_dict in src_dict.get_paths(reader):
-                best_rv = max(rv_dict, key=lambda x: rv_list.index(x))
-
-                # Record the rest of the statement ids.
-                for rv, r_dict in rv_dict.items():
-                    if rv != best_rv:
-                        some_bettered_duplicate_tpls |= r_dict.get_leaves()
-                    else:
-                        for h, stmt_set in list(r_dict.values())[0].items():
-                            # Sort the statements by their source, and whether
-                            # they are new or old, defined as whether they
-                            # have yet been included in preassembly. There
-                            # should be no overlap in hashes here.
-                            sid_set = {sid for sid, _ in stmt_set}
-                            if sid_set < linked_sids:
-                                simple_src_dict[src][h] = ('old', stmt_set)
-                            elif sid_set.isdisjoint(linked_sids):
-                                simple_src_dict[src][h] = ('new', stmt_set)
-                            else:
-                                # If you ever see this pop up, something very
-                                # strange has happened. It means that some
-                                # statements from a given reading were already
-                                # included in preassembly, but others were not.
-                                # There is no mechanism that should accept only
-                                # some statements from within a reading, so
-                                # that should never happen, but Murphy will
-                                # always win the day.
-                                assert False, \
-                                    "Found reading partially included."
-
-            # Choose the statements to propagate
-            new_stmt_dict = {}
-            for src in reversed(text_content_sources):
-                for h, (status, s_set) in simple_src_dict[src].items():
-                    # If this error ever comes up, it means that the uniqueness
-                    # constraint on raw statements per reading is not
-                    # functioning correctly.
-                    if len(s_set) > 1:
-                        logger.warning("Found exact duplicates from the same "
-                                       "reading: %s" % str(s_set))
-                        bad_dups.add(tuple(s_set))
-
-                    # Choose whether to keep the statement or not.
-                    s_tpl = s_set.pop()
-                    if h not in new_stmt_dict:
-                        # No conflict, no problem
-                        new_stmt_dict[h] = s_tpl
-                    elif status == 'old':
-                        # The same statement was newly found by a better
-                        # version.
-                        some_bettered_duplicate_tpls.add(s_tpl)
-            stmt_tpls |= set(new_stmt_dict.values())
+        some_stmt_tpls, some_bettered_duplicate_tpls = \
+            _filter_text_ref_stmts(src_dict, linked_sids, bad_dups)
+        stmt_tpls |= some_stmt_tpls
 
         # Add the bettered duplicates found in this round.
         bettered_duplicate_sids |= \
             {sid for sid, _ in some_bettered_duplicate_tpls}
 
     # Dump the bad duplicates, if any
-    if bad_dups:
-        with open('bad_duplicates_%s.pkl' % datetime.now(), 'wb') as f:
-            pickle.dump(bad_dups, f)
+    _dump_bad_dups(bad_dups)
 
     if get_full_stmts:
         stmts = {stmt for _, stmt in stmt_tpls if stmt is not None}
@@ -227,6 +249,100 @@ def get_filtered_rdg_stmts(stmt_nd, get_full_stmts, linked_sids=None):
     return stmts, bettered_duplicate_sids
 
 
+def _get_reader(rv):
+    # Back out the reader name.
+    for reader, rv_list in reader_versions.items():
+        if rv in rv_list:
+            return reader
+    raise Exception("rv %s not recognized." % rv)
+
+
+def iter_filtered_rdg_stmt_ids(db, clauses=None, check_links=True):
+    """Filter the reading statements one text ref at a time.
+
+    Unlike :func:`get_reading_stmt_dict` followed by
+    :func:`get_filtered_rdg_stmts`, only the ids and hashes of the raw
+    statements are loaded, streamed from a query sorted by text ref, so the
+    memory used scales with the largest text ref rather than the corpus.
+    Whether a raw statement is already linked to a pa statement is checked in
+    the same query, rather than by loading all the existing links.
+
+    Parameters
+    ----------
+    db : :py:class:`DatabaseManager`
+        A database manager instance to access the database.
+    clauses : None or list of sqlalchemy clauses
+        Further clauses restricting the raw statements.
+    check_links : bool
+        If True (default), consider whether statements are already linked to
+        pa statements (i.e. are "old") when choosing between duplicates.
+
+    Yields
+    ------
+    sids : set
+        The ids of the raw statements to keep for a text ref.
+    bettered_sids : set
+        The ids of the raw statements from the text ref with "better"
+        alternatives.
+    bad_link_sids : set
+        The subset of bettered_sids that are linked to pa statements.
+    """
+    elements = [db.TextContent.text_ref_id, db.TextContent.id,
+                db.TextContent.source, db.TextContent.text_type,
+                db.Reading.id, db.Reading.reader_version,
+                db.RawStatements.id, db.RawStatements.mk_hash,
+                db.RawStatements.text_hash]
+    if check_links:
+        elements.append(
+            exists().where(db.RawUniqueLinks.raw_stmt_id == db.RawStatements.id)
+        )
+
+    q = (db.session.query(*elements)
+         .filter(db.RawStatements.reading_id == db.Reading.id,
+                 db.Reading.text_content_id == db.TextContent.id))
+    if clauses:
+        q = q.filter(*clauses)
+    q = q.order_by(db.TextContent.text_ref_id)
+
+    bad_dups = set()
+    num_trids = 0
+    for trid, rows in groupby(q.yield_per(10000), key=lambda row: row[0]):
+        num_trids += 1
+        src_dict = NestedDict()
+        linked_sids = set()
+        for row in rows:
+            _, tcid, src, tt, rid, rv, sid, mk_hash, text_hash = row[:9]
+            if check_links and row[9]:
+                linked_sids.add(sid)
+            s_dict = src_dict[(src, tt)][tcid][_get_reader(rv)][rv][rid]
+            s_dict.setdefault((mk_hash, text_hash), set()).add((sid, None))
+
+        stmt_tpls, bettered_tpls = \
+            _filter_text_ref_stmts(src_dict, linked_sids, bad_dups)
+        bettered_sids = {sid for sid, _ in bettered_tpls}
+        yield ({sid for sid, _ in stmt_tpls}, bettered_sids,
+               bettered_sids & linked_sids)
+
+    _dump_bad_dups(bad_dups)
+    logger.info("Filtered reading statements from %d text refs." % num_trids)
+
+
+def _get_full_rdg_stmts(db, sids, batch_size=10000):
+    """Load the given reading raw statements, with their text refs."""
+    stmts = set()
+    for sid_batch in batch_iter(sorted(sids), batch_size):
+        q = (db.session.query(db.RawStatements.json, db.TextRef)
+             .filter(db.RawStatements.id.in_(sid_batch),
+                     db.RawStatements.reading_id == db.Reading.id,
+                     db.Reading.text_content_id == db.TextContent.id,
+                     db.TextContent.text_ref_id == db.TextRef.id))
+        for sjson, tr in q.yield_per(1000):
+            stmt = Statement._from_json(json.loads(sjson.decode('utf8')))
+            _set_evidence_text_ref(stmt, tr)
+            stmts.add(stmt)
+    return stmts
+
+
 def get_filtered_db_stmts(db, get_full_stmts=False, clauses=None):
     """Get the set of statements/ids from databases minus exact duplicates."""
     # Only get the json if it's going to be used.
@@ -280,30 +396,30 @@ def distill_stmts(db, get_full_stmts=False, clauses=None,
         A set of either statement ids or serialized statements, depending on
         `get_full_stmts`.
     """
-    if handle_duplicates == 'delete' or handle_duplicates == 'error':
-        logger.info("Looking for ids from existing links...")
-        linked_sids = {sid for sid,
-                       in db.select_all(db.RawUniqueLinks.raw_stmt_id)}
-    else:
-        linked_sids = set()
+    check_links = handle_duplicates == 'delete' \
+        or handle_duplicates == 'error'
 
     # Get de-duplicated Statements, and duplicate uuids, as well as uuid of
-    # Statements that have been improved upon...
-    logger.info("Sorting reading statements...")
-    stmt_nd = get_reading_stmt_dict(db, clauses, get_full_stmts)
-
-    stmts, bettered_duplicate_sids = \
-        get_filtered_rdg_stmts(stmt_nd, get_full_stmts, linked_sids)
+    # Statements that have been improved upon, one text ref at a time.
+    logger.info("Sorting and filtering reading statements...")
+    stmts = set()
+    num_bettered = 0
+    bad_link_sids = set()
+    for sids, bettered_sids, some_bad_link_sids \
+            in iter_filtered_rdg_stmt_ids(db, clauses, check_links):
+        stmts |= sids
+        num_bettered += len(bettered_sids)
+        bad_link_sids |= some_bad_link_sids
     logger.info("After filtering reading: %d unique statements, and %d with "
                 "results from better resources available."
-                % (len(stmts), len(bettered_duplicate_sids)))
-    del stmt_nd  # This takes up a lot of memory, and is done being used.
+                % (len(stmts), num_bettered))
+    if get_full_stmts:
+        stmts = _get_full_rdg_stmts(db, stmts)
 
     db_stmts = get_filtered_db_stmts(db, get_full_stmts, clauses)
     stmts |= db_stmts
 
     # Remove support links for statements that have better versions available.
-    bad_link_sids = bettered_duplicate_sids & linked_sids
     if len(bad_link_sids):
         logger.error("Found pre-existing evidence links that were bettered...")
         logger.info("Removing the links...")
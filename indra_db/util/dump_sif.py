@@ -1,10 +1,15 @@
 __all__ = ['load_db_content', 'make_dataframe', 'get_source_counts', 'NS_LIST',
-           'dump_sif', 'load_res_pos']
+           'dump_sif', 'load_res_pos', 'dump_table', 'load_table',
+           'dump_res_pos_table', 'load_res_pos_table',
+           'dump_source_count_table', 'SourceCountTable',
+           'dump_mesh_id_table']
 
+import os
 import json
 import pickle
 import logging
 import argparse
+import tempfile
 from io import StringIO
 from datetime import datetime
 from itertools import permutations
@@ -12,6 +17,8 @@ from collections import OrderedDict, defaultdict
 from typing import Tuple, Dict
 
 from tqdm import tqdm
+from sqlalchemy import func, or_, literal, true, Integer
+from sqlalchemy.dialects.postgresql import JSONB
 
 from indra.util.aws import get_s3_client
 from indra_db.schemas.readonly_schema import ro_type_map
@@ -29,6 +36,16 @@ except ImportError:
     from typing import Any
     DataFrame = Any
 
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    print("Pyarrow not available.")
+    np = None
+    pa = None
+    pq = None
+
 from indra_db.util.s3_path import S3Path
 from indra_db.util.constructors import get_ro, get_db
 
@@ -204,6 +221,266 @@ def get_source_counts(pkl_filename=None, ro=None):
     return ev
 
 
+def _stream_rows(query, batch_size):
+    # Run the query with a server side cursor, and gather the rows in batches.
+    batch = []
+    for row in query.execution_options(stream_results=True)\
+            .yield_per(batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def dump_table(row_batches, schema, out_file):
+    """Write batches of rows to a parquet file, one row group per batch.
+
+    Parameters
+    ----------
+    row_batches : iterable of lists of tuples
+        The rows to write, in batches, with the values in the order of the
+        fields of the schema.
+    schema : pyarrow.Schema
+        The schema of the table.
+    out_file : Union[str, S3Path]
+        The location to write the file to. Can be local file path, an s3 url
+        string or an S3Path instance. Files for s3 are built in a temporary
+        file and uploaded when complete.
+
+    Returns
+    -------
+    n_rows : int
+        The number of rows written.
+    """
+    if isinstance(out_file, str) and out_file.startswith('s3:'):
+        out_file = S3Path.from_string(out_file)
+    if isinstance(out_file, S3Path):
+        fd, local_file = tempfile.mkstemp(suffix='.parquet')
+        os.close(fd)
+    else:
+        local_file = out_file
+
+    n_rows = 0
+    try:
+        with pq.ParquetWriter(local_file, schema) as writer:
+            for rows in row_batches:
+                columns = [pa.array(col, type=field.type)
+                           for col, field in zip(zip(*rows), schema)]
+                writer.write_batch(
+                    pa.RecordBatch.from_arrays(columns, schema=schema)
+                )
+                n_rows += len(rows)
+                logger.info(f"Wrote {n_rows} rows to {out_file}.")
+
+        if isinstance(out_file, S3Path):
+            s3 = get_s3_client(unsigned=False)
+            s3.upload_file(local_file, out_file.bucket, out_file.key)
+    finally:
+        if isinstance(out_file, S3Path):
+            os.remove(local_file)
+    return n_rows
+
+
+def load_table(in_file, columns=None):
+    """Load a parquet table from a local file or s3.
+
+    Parameters
+    ----------
+    in_file : Union[str, S3Path]
+        The location of the table. Can be local file path, an s3 url string
+        or an S3Path instance.
+    columns : Optional[list]
+        If given, only load these columns.
+
+    Returns
+    -------
+    pyarrow.Table
+    """
+    if isinstance(in_file, str) and in_file.startswith('s3:'):
+        in_file = S3Path.from_string(in_file)
+    if isinstance(in_file, S3Path):
+        logger.info(f'Loading table {in_file} from s3.')
+        s3 = get_s3_client(unsigned=False)
+        body = in_file.get(s3)['Body'].read()
+        return pq.read_table(pa.BufferReader(body), columns=columns)
+    return pq.read_table(in_file, columns=columns)
+
+
+def _get_res_pos_schema():
+    return pa.schema([('mk_hash', pa.int64()), ('residue', pa.string()),
+                      ('position', pa.string())])
+
+
+def dump_res_pos_table(out_file, ro=None, batch_size=100000):
+    """Dump the residue and position of Modifications as a parquet table.
+
+    Only the residue and position are read out of the statement jsons, by the
+    database, and only one row is kept for each hash.
+
+    Parameters
+    ----------
+    out_file : Union[str, S3Path]
+        The location to dump the table to.
+    ro : Optional[DatabaseManager]
+        The database to load the content from. If not given, calls
+        `get_ro('primary')`.
+    batch_size : int
+        The number of rows in each row group of the file. Default: 100000.
+    """
+    logger.info('Dumping residue and position info')
+    if ro is None:
+        ro = get_ro('primary')
+    type_nums = [ro_type_map.get_int(stmt_type.__name__)
+                 for stmt_type in get_all_descendants(Modification)
+                 if stmt_type.__name__ not in ('Modification',
+                                               'AddModification',
+                                               'RemoveModification')]
+    frpl = ro.FastRawPaLink
+    stmt_json = func.convert_from(frpl.pa_json, 'UTF8').cast(JSONB)
+    residue = stmt_json['residue'].astext
+    position = stmt_json['position'].astext
+    q = ro.session.query(frpl.mk_hash, residue, position)\
+        .filter(frpl.type_num.in_(type_nums),
+                or_(residue.isnot(None), position.isnot(None)))\
+        .distinct(frpl.mk_hash)
+    return dump_table(_stream_rows(q, batch_size), _get_res_pos_schema(),
+                      out_file)
+
+
+def load_res_pos_table(in_file):
+    """Load the residue/position dict from a table from `dump_res_pos_table`.
+
+    The result has the same form as that of `load_res_pos`.
+    """
+    df = load_table(in_file).to_pandas()
+    res = {}
+    for col in ['residue', 'position']:
+        has_val = df[col].notna()
+        res[col] = dict(zip(df['mk_hash'][has_val].tolist(),
+                            df[col][has_val].tolist()))
+    return res
+
+
+def _get_source_count_schema():
+    return pa.schema([('mk_hash', pa.int64()),
+                      ('source', pa.dictionary(pa.int16(), pa.string())),
+                      ('count', pa.int32())])
+
+
+def dump_source_count_table(out_file, ro=None, batch_size=100000):
+    """Dump the evidence count of each source for each hash as a table.
+
+    The table has a row for each source of each statement, with columns
+    mk_hash, source, and count.
+
+    Parameters
+    ----------
+    out_file : Union[str, S3Path]
+        The location to dump the table to.
+    ro : Optional[DatabaseManager]
+        The database to load the content from. If not given, calls
+        `get_ro('primary')`.
+    batch_size : int
+        The number of rows in each row group of the file. Default: 100000.
+    """
+    logger.info('Dumping source counts per statement')
+    if ro is None:
+        ro = get_ro('primary')
+    src_counts = func.json_each_text(ro.SourceMeta.src_json)\
+        .table_valued('key', 'value')
+    q = ro.session.query(ro.SourceMeta.mk_hash, src_counts.c.key,
+                         src_counts.c.value.cast(Integer))\
+        .join(src_counts, true())
+    return dump_table(_stream_rows(q, batch_size),
+                      _get_source_count_schema(), out_file)
+
+
+class SourceCountTable(object):
+    """Source counts by hash, from a table made by `dump_source_count_table`.
+
+    This can be used in place of the dict of dicts from `get_source_counts`:
+    the counts are kept in flat arrays sorted by hash, and the dict for a
+    hash is only made when it is looked up.
+    """
+    def __init__(self, table):
+        table = table.sort_by('mk_hash').unify_dictionaries()\
+            .combine_chunks()
+        self._hashes = table['mk_hash'].to_numpy()
+        self._counts = table['count'].to_numpy()
+        if table['source'].num_chunks:
+            sources = table['source'].chunk(0)
+            self._sources = sources.dictionary.to_pylist()
+            self._src_idx = sources.indices.to_numpy()
+        else:
+            self._sources = []
+            self._src_idx = np.array([], dtype=np.int16)
+
+    @classmethod
+    def from_file(cls, in_file):
+        return cls(load_table(in_file))
+
+    def _find(self, mk_hash):
+        start = np.searchsorted(self._hashes, mk_hash, side='left')
+        end = np.searchsorted(self._hashes, mk_hash, side='right')
+        return start, end
+
+    def get(self, mk_hash, default=None):
+        start, end = self._find(mk_hash)
+        if start == end:
+            return default
+        return {self._sources[src_idx]: int(count)
+                for src_idx, count in zip(self._src_idx[start:end],
+                                          self._counts[start:end])}
+
+    def __getitem__(self, mk_hash):
+        res = self.get(mk_hash)
+        if res is None:
+            raise KeyError(mk_hash)
+        return res
+
+    def __contains__(self, mk_hash):
+        start, end = self._find(mk_hash)
+        return start != end
+
+    def __len__(self):
+        return len(np.unique(self._hashes))
+
+
+def dump_mesh_id_table(out_file, ro=None, batch_size=100000):
+    """Dump the MeSH terms and concepts of each hash as a parquet table.
+
+    The table has columns mk_hash, mesh_type ("D" for terms and "C" for
+    concepts), and mesh_num.
+
+    Parameters
+    ----------
+    out_file : Union[str, S3Path]
+        The location to dump the table to.
+    ro : Optional[DatabaseManager]
+        The database to load the content from. If not given, calls
+        `get_ro('primary')`.
+    batch_size : int
+        The number of rows in each row group of the file. Default: 100000.
+    """
+    logger.info('Dumping MeSH IDs per statement')
+    if ro is None:
+        ro = get_ro('primary')
+    schema = pa.schema([('mk_hash', pa.int64()),
+                        ('mesh_type', pa.dictionary(pa.int8(), pa.string())),
+                        ('mesh_num', pa.int32())])
+
+    def iter_batches():
+        for mesh_type, tbl in [('D', ro.MeshTermMeta),
+                               ('C', ro.MeshConceptMeta)]:
+            q = ro.session.query(tbl.mk_hash, literal(mesh_type),
+                                 tbl.mesh_num)
+            yield from _stream_rows(q, batch_size)
+
+    return dump_table(iter_batches(), schema, out_file)
+
+
 def normalize_sif_names(sif_df: DataFrame):
     """Try to normalize names in the sif dump dataframe
 
@@ -523,11 +800,13 @@ def dump_sif(src_count_file, res_pos_file, belief_file, df_file=None,
     Parameters
     ----------
     src_count_file : Union[str, S3Path]
-        A location to load the source count dict from. Can be local file
-        path, an s3 url string or an S3Path instance.
+        A location to load the source count dict, or the parquet table from
+        `dump_source_count_table`, from. Can be local file path, an s3 url
+        string or an S3Path instance.
     res_pos_file : Union[str, S3Path]
-        A location to load the residue-postion dict from. Can be local file
-        path, an s3 url string or an S3Path instance.
+        A location to load the residue-postion dict, or the parquet table
+        from `dump_res_pos_table`, from. Can be local file path, an s3 url
+        string or an S3Path instance.
     belief_file : Union[str, S3Path]
         A location to load the belief dict from. Can be local file path,
         an s3 url string or an S3Path instance.
@@ -555,7 +834,9 @@ def dump_sif(src_count_file, res_pos_file, belief_file, df_file=None,
         If True, detect and try to merge name duplicates (same entity with
         different names, e.g. Loratadin vs loratadin). Default: False
     """
-    def _load_file(path):
+    def _load_file(path, table_loader=None):
+        if str(path).endswith('parquet'):
+            return table_loader(path)
         if isinstance(path, str) and path.startswith('s3:') or \
                 isinstance(path, S3Path):
             if isinstance(path, str):
@@ -584,8 +865,8 @@ def dump_sif(src_count_file, res_pos_file, belief_file, df_file=None,
                                  pkl_filename=db_res_file, ro=ro)
 
     # Load supporting files
-    res_pos = _load_file(res_pos_file)
-    src_count = _load_file(src_count_file)
+    res_pos = _load_file(res_pos_file, load_res_pos_table)
+    src_count = _load_file(src_count_file, SourceCountTable.from_file)
     belief = _load_file(belief_file)
 
     # Convert the database query result into a set of pairwise relationships
@@ -0,0 +1,278 @@
+__all__ = ['TokenBucket', 'PersistentCache', 'ConcurrentFetcher']
+
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """A thread-safe token bucket used to limit the rate of requests.
+
+    Parameters
+    ----------
+    rate : float
+        The number of tokens added to the bucket per second, i.e. the steady
+        state number of requests allowed per second.
+    capacity : Optional[int]
+        The maximum number of tokens in the bucket, i.e. the largest burst of
+        requests allowed. By default, this is the rate (rounded up).
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("The rate must be positive.")
+        self.rate = rate
+        if capacity is None:
+            capacity = max(1, int(rate + 0.5))
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """Take a token from the bucket, waiting until one is available."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class PersistentCache(object):
+    """A simple, thread-safe, on-disk key-value store of JSON-able values.
+
+    The values are stored in a sqlite file, so they persist between runs, and
+    every `set` is committed immediately, so progress is never lost.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the sqlite file. If it does not exist, it is created.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                         '(key TEXT PRIMARY KEY, value TEXT)')
+            conn.commit()
+
+    def _get_conn(self):
+        # A sqlite connection must not be used across a fork, so a forked
+        # process (e.g. a server worker) opens its own. Call with the lock.
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.file_path,
+                                         check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        """Get the value for a key, or the default if it is not cached."""
+        with self._lock:
+            row = self._get_conn().execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """Set the value for a key."""
+        self.set_many({key: value})
+
+    def set_many(self, value_dict):
+        """Set the values for many keys in a single transaction."""
+        rows = [(key, json.dumps(value)) for key, value in value_dict.items()]
+        with self._lock:
+            conn = self._get_conn()
+            conn.executemany('INSERT OR REPLACE INTO cache (key, value) '
+                             'VALUES (?, ?)', rows)
+            conn.commit()
+
+    def delete(self, keys):
+        """Remove the given keys from the cache."""
+        with self._lock:
+            conn = self._get_conn()
+            conn.executemany('DELETE FROM cache WHERE key = ?',
+                             [(key,) for key in keys])
+            conn.commit()
+
+    def keys(self, prefix=''):
+        """Get the set of cached keys that start with the given prefix."""
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT key FROM cache WHERE key LIKE ? ESCAPE '\\'",
+                (_escape_like(prefix) + '%',)
+            ).fetchall()
+        return {key for key, in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_missing = object()
+
+# Cached in place of a None result, i.e. when there is definitely no result.
+_NO_RESULT = {'__no_result__': True}
+
+
+def _escape_like(s):
+    return s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class ConcurrentFetcher(object):
+    """Call a slow (generally web-bound) function on many inputs concurrently.
+
+    Parameters
+    ----------
+    func : callable
+        The function to be called. It should take a single input, and return
+        a JSON-able result if a cache is used.
+    n_workers : Optional[int]
+        The number of threads used to make calls concurrently. Default is 4.
+    rate : Optional[float]
+        The maximum number of calls (including retries) per second, across all
+        threads. By default, there is no limit.
+    max_retries : Optional[int]
+        The number of times a call that raised an exception is retried before
+        giving up. Default is 2.
+    backoff : Optional[float]
+        The base wait in seconds before a retry, which is doubled with every
+        subsequent retry (plus some jitter). Default is 1.
+    cache : Optional[PersistentCache]
+        If given, results are looked up in and added to this cache, so that
+        calls are not repeated between runs.
+    cache_prefix : Optional[str]
+        A prefix added to the cache keys, allowing one cache to be shared by
+        several fetchers.
+    cache_results : Optional[bool]
+        If False, only the inputs that had no result (None) are cached, so
+        that they are not looked up again, while the results themselves are
+        not stored (e.g. if they are large). Default is True.
+
+    The function should return None when there definitely is no result (for
+    example a 404), and raise an exception when the call failed in a way
+    that may be transient. Only exceptions are retried, and None results are
+    cached as a "no result" marker.
+    """
+    def __init__(self, func, n_workers=4, rate=None, max_retries=2,
+                 backoff=1.0, cache=None, cache_prefix='',
+                 cache_results=True):
+        self.func = func
+        self.n_workers = n_workers
+        self.bucket = TokenBucket(rate) if rate else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self.cache_prefix = cache_prefix
+        self.cache_results = cache_results
+
+    def _call(self, inp):
+        num_tries = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                return self.func(inp)
+            except Exception as e:
+                if num_tries >= self.max_retries:
+                    logger.error(f"Giving up on {inp} after {num_tries + 1} "
+                                 f"tries: {e}")
+                    raise
+                wait = self.backoff * 2**num_tries * (1 + random.random()/2)
+                logger.warning(f"Call for {inp} failed ({e}), retrying in "
+                               f"{wait:.1f} seconds...")
+                time.sleep(wait)
+                num_tries += 1
+
+    def fetch_all(self, inputs, raise_errors=False, callback=None):
+        """Get the results for each of the inputs.
+
+        Parameters
+        ----------
+        inputs : Iterable
+            The (hashable) inputs to pass to the function. If a cache is used,
+            the inputs should be strings.
+        raise_errors : Optional[bool]
+            If True, raise the first error that persists after all the
+            retries. Otherwise (default), the error is logged and the input
+            is left out of the results.
+        callback : Optional[callable]
+            If given, this is called with each input and its result as soon
+            as the result is available (including results from the cache),
+            so that they can be handled while the rest are fetched.
+
+        Returns
+        -------
+        results : dict
+            A dict of the results keyed by input.
+        """
+        inputs = set(inputs)
+        results = {}
+
+        # Get any results we already know.
+        if self.cache is not None:
+            for inp in inputs:
+                res = self.cache.get(self.cache_prefix + inp, _missing)
+                if res is None:
+                    # Cached by an older run, when a failure could give None.
+                    continue
+                if res == _NO_RESULT:
+                    res = None
+                if res is not _missing:
+                    results[inp] = res
+                    if callback is not None:
+                        callback(inp, res)
+            logger.debug(f"Found {len(results)}/{len(inputs)} results in the "
+                         f"cache.")
+
+        # Fetch the rest.
+        to_fetch = [inp for inp in inputs if inp not in results]
+        if not to_fetch:
+            return results
+        new_results = {}
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            futures = {executor.submit(self._call, inp): inp
+                       for inp in to_fetch}
+            for future in as_completed(futures):
+                inp = futures[future]
+                try:
+                    new_results[inp] = future.result()
+                except Exception:
+                    if raise_errors:
+                        raise
+                    continue
+                if callback is not None:
+                    callback(inp, new_results[inp])
+
+        if self.cache is not None:
+            to_cache = {self.cache_prefix + inp: _NO_RESULT
+                        if res is None else res
+                        for inp, res in new_results.items()
+                        if res is None or self.cache_results}
+            if to_cache:
+                self.cache.set_many(to_cache)
+        results.update(new_results)
+        return results
@@ -1,10 +1,11 @@
 __all__ = ['unpack', '_get_trids', '_fix_evidence_refs',
            'get_raw_stmts_frm_db_list', '_set_evidence_text_ref',
-           'get_statement_object']
+           'get_statement_object', 'imap_bounded']
 
 import json
 import zlib
 import logging
+from collections import deque
 
 from indra.util import clockit
 from indra.statements import Statement
@@ -91,3 +92,20 @@ def _get_trids(db, id_val, id_type):
         constraint = (getattr(db.TextRef, id_type) == id_val)
         trids = [trid for trid, in db.select_all(db.TextRef.id, constraint)]
     return trids
+
+
+def imap_bounded(pool, func, jobs, max_in_flight):
+    """Like `pool.imap`, but with at most `max_in_flight` jobs outstanding.
+
+    A new job is only submitted when the result of an earlier one has been
+    consumed, so a slow consumer holds back the workers (and whatever feeds
+    the jobs), rather than letting results pile up in memory. The results
+    are yielded in the order of the jobs.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.apply_async(func, (job,)))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
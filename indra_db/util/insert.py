@@ -1,14 +1,15 @@
 __all__ = ['insert_raw_agents', 'insert_pa_agents', 'insert_pa_stmts',
            'insert_db_stmts', 'regularize_agent_id', 'extract_agent_data',
-           'hash_pa_agents']
+           'hash_pa_agents', 'get_agent_columns', 'hash_agent_refs']
 
 import json
 import pickle
 import logging
+from hashlib import md5
 
 from indra.util.get_version import get_version
 from indra.statements import Complex, SelfModification, ActiveForm, \
-    Conversion, Translocation, make_hash
+    Conversion, Translocation
 
 from indra_db.exceptions import IndraDbException
 
@@ -18,8 +19,13 @@ from .helpers import get_statement_object
 logger = logging.getLogger('util-insert')
 
 
+REF_COLS = ('stmt_id', 'ag_num', 'db_name', 'db_id', 'role')
+MOD_COLS = ('stmt_id', 'ag_num', 'type', 'position', 'residue', 'modified')
+MUT_COLS = ('stmt_id', 'ag_num', 'position', 'residue_from', 'residue_to')
+
+
 def insert_raw_agents(db, batch_id, stmts=None, verbose=False,
-                      num_per_yield=100, commit=True):
+                      num_per_yield=100, commit=True, stmt_ids=None):
     """Insert agents for statements that don't have any agents.
 
     Parameters
@@ -41,10 +47,20 @@ def insert_raw_agents(db, batch_id, stmts=None, verbose=False,
     commit : bool
         Optionally do not commit at the end. Default is True, meaning a commit
         will be executed.
+    stmt_ids : dict
+        A dict of raw statement ids keyed by the uuids of `stmts`, for example
+        as returned by the copy of the raw statements. If given, the ids are
+        not looked up again using the `batch_id`.
     """
-    ref_tuples = []
-    mod_tuples = []
-    mut_tuples = []
+    if stmts is not None and stmt_ids is not None:
+        stmt_list = [s for s in stmts if s.uuid in stmt_ids]
+        ref_cols, mod_tuples, mut_tuples = \
+            get_agent_columns(stmt_list, [stmt_ids[s.uuid] for s in stmt_list])
+        _copy_raw_agents(db, ref_cols, mod_tuples, mut_tuples, commit)
+        return
+
+    stmt_list = []
+    stmt_id_list = []
     if stmts is None:
         s_col = 'json'
         stmt_dict = None
@@ -64,14 +80,10 @@ def insert_raw_agents(db, batch_id, stmts=None, verbose=False,
     while res_list:
         for stmt_id, db_stmt in res_list:
             if stmts is None:
-                stmt = get_statement_object(db_stmt)
+                stmt_list.append(get_statement_object(db_stmt))
             else:
-                stmt = stmt_dict[db_stmt]
-
-            ref_data, mod_data, mut_data = extract_agent_data(stmt, stmt_id)
-            ref_tuples.extend(ref_data)
-            mod_tuples.extend(mod_data)
-            mut_tuples.extend(mut_data)
+                stmt_list.append(stmt_dict[db_stmt])
+            stmt_id_list.append(stmt_id)
 
             # Optionally print another tick on the progress bar.
             if verbose and num_stmts > 25 and i % (num_stmts//25) == 0:
@@ -82,14 +94,17 @@ def insert_raw_agents(db, batch_id, stmts=None, verbose=False,
     if verbose and num_stmts > 25:
         print()
 
-    db.copy('raw_agents', ref_tuples,
-            ('stmt_id', 'ag_num', 'db_name', 'db_id', 'role'), commit=False)
-    db.copy('raw_mods', mod_tuples,
-            ('stmt_id', 'ag_num', 'type', 'position', 'residue', 'modified'),
-            commit=False)
-    db.copy('raw_muts', mut_tuples,
-            ('stmt_id', 'ag_num', 'position', 'residue_from', 'residue_to'),
-            commit=False)
+    ref_cols, mod_tuples, mut_tuples = get_agent_columns(stmt_list,
+                                                         stmt_id_list)
+    _copy_raw_agents(db, ref_cols, mod_tuples, mut_tuples, commit)
+    return
+
+
+def _copy_raw_agents(db, ref_cols, mod_tuples, mut_tuples, commit):
+    db.copy('raw_agents', list(zip(*(ref_cols[c] for c in REF_COLS))),
+            REF_COLS, commit=False)
+    db.copy('raw_mods', mod_tuples, MOD_COLS, commit=False)
+    db.copy('raw_muts', mut_tuples, MUT_COLS, commit=False)
     if commit:
         db.commit_copy('Error copying raw agents, mods, and muts.')
     return
@@ -108,24 +123,13 @@ def insert_pa_agents(db, stmts, verbose=False, skip=None, commit=True):
     logger.info("Building data from agents for insert into pa_agents, "
                 "pa_mods, and pa_muts...")
 
+    ref_cols, mod_data, mut_data = \
+        get_agent_columns(stmts, [stmt.get_hash() for stmt in stmts])
+    ref_cols['agent_ref_hash'] = hash_agent_refs(ref_cols)
+    ref_data = list(zip(*(ref_cols[c]
+                          for c in REF_COLS + ('agent_ref_hash',))))
     if verbose:
-        print("Loading pa agents:", end='', flush=True)
-
-    ref_data = []
-    mod_data = []
-    mut_data = []
-    for i, stmt in enumerate(stmts):
-        refs, mods, muts = extract_agent_data(stmt, stmt.get_hash())
-        ref_data.extend(hash_pa_agents(refs))
-        mod_data.extend(mods)
-        mut_data.extend(muts)
-
-        # Optionally print another tick on the progress bar.
-        if verbose and num_stmts > 25 and i % (num_stmts//25) == 0:
-            print('|', end='', flush=True)
-
-    if verbose and num_stmts > 25:
-        print()
+        print(f"Loaded {len(ref_data)} pa agents.")
 
     # Note that lazy copies are used to handle the case where hashes do not
     # exist in the table. Such an error is not one that should result in process
@@ -149,11 +153,27 @@ def insert_pa_agents(db, stmts, verbose=False, skip=None, commit=True):
 
 
 def hash_pa_agents(agent_tuples):
-    hashed_tuples = []
-    for ref in agent_tuples:
-        h = make_hash(':'.join([str(r) for r in ref[:-1]]), 16)
-        hashed_tuples.append(ref + (h,))
-    return hashed_tuples
+    agent_tuples = list(agent_tuples)
+    ref_cols = dict(zip(REF_COLS, zip(*agent_tuples)))
+    if not ref_cols:
+        return []
+    return [ref + (h,)
+            for ref, h in zip(agent_tuples, hash_agent_refs(ref_cols))]
+
+
+def hash_agent_refs(ref_cols):
+    """Get the agent ref hashes for columns of agent refs.
+
+    This gives the same values as calling
+    `make_hash('stmt_id:ag_num:db_name:db_id', 16)` for each ref, which is how
+    the `agent_ref_hash` of pa agents is defined.
+    """
+    half = 16**16//2
+    keys = zip(ref_cols['stmt_id'], ref_cols['ag_num'], ref_cols['db_name'],
+               ref_cols['db_id'])
+    return [half - int.from_bytes(md5(f'{s}:{a}:{n}:{i}'.encode('utf-8'))
+                                  .digest()[:8], 'big')
+            for s, a, n, i in keys]
 
 
 def regularize_agent_id(id_val, id_ns):
@@ -174,63 +194,96 @@ def regularize_agent_id(id_val, id_ns):
     return new_id_val
 
 
-def extract_agent_data(stmt, stmt_id):
-    """Create the tuples for copying agents into the database."""
+_nary_stmt_types = (Complex, SelfModification, ActiveForm, Conversion,
+                    Translocation)
+
+
+def _get_agent_roles(stmt):
+    """Get the (role, agent, index) of each agent in a statement."""
     # Figure out how the agents are structured and assign roles.
     ag_list = stmt.agent_list(deep_sorted=True)
-    nary_stmt_types = [Complex, SelfModification, ActiveForm, Conversion,
-                       Translocation]
-    if any([isinstance(stmt, tp) for tp in nary_stmt_types]):
-        agents = {('OTHER', ag, i) for i, ag in enumerate(ag_list)}
+    if isinstance(stmt, _nary_stmt_types):
+        return [('OTHER', ag, i) for i, ag in enumerate(ag_list)]
     elif len(ag_list) == 2:
-        agents = {(role, ag_list[i], i)
-                  for i, role in enumerate(['SUBJECT', 'OBJECT'])}
-    else:
-        raise IndraDbException("Unhandled agent structure for stmt %s "
-                               "with agents: %s."
-                               % (str(stmt), str(stmt.agent_list())))
-
-    def all_agent_refs(ag):
-        """Smooth out the iteration over agents and their refs."""
-        for ns, ag_id in ag.db_refs.items():
-            if isinstance(ag_id, list):
-                for sub_id in ag_id:
-                    yield ns, sub_id
-            else:
-                yield ns, ag_id
-        yield 'NAME', ag.name
+        return [('SUBJECT', ag_list[0], 0), ('OBJECT', ag_list[1], 1)]
+    raise IndraDbException("Unhandled agent structure for stmt %s "
+                           "with agents: %s."
+                           % (str(stmt), str(stmt.agent_list())))
+
+
+def get_agent_columns(stmts, stmt_ids):
+    """Get the agent data for a batch of statements, with refs as columns.
 
-    # Prep the agents for copy into the database.
-    ref_data = []
+    Parameters
+    ----------
+    stmts : list[indra.statements.Statement]
+        The statements whose agents are extracted.
+    stmt_ids : list
+        The id (for raw statements) or hash (for pa statements) of each
+        statement, in the same order as `stmts`.
+
+    Returns
+    -------
+    ref_cols : dict
+        A dict of lists keyed by the agent ref columns: stmt_id, ag_num,
+        db_name, db_id, and role. Each ref is a row across the lists.
+    mod_data : list[tuple]
+        The rows of modification data.
+    mut_data : list[tuple]
+        The rows of mutation data.
+    """
+    sid_col = []
+    ag_num_col = []
+    db_name_col = []
+    db_id_col = []
+    role_col = []
     mod_data = []
     mut_data = []
     warnings = set()
-    for role, ag, idx in agents:
-        # If no agent, or no db_refs for the agent, skip the insert
-        # that follows.
-        if ag is None or ag.db_refs is None:
-            continue
-
-        # Get the db refs data.
-        for ns, ag_id in all_agent_refs(ag):
-            if ag_id is not None:
-                ref_data.append((stmt_id, idx, ns,
-                                 regularize_agent_id(ag_id, ns), role))
-            else:
-                if ns not in warnings:
-                    warnings.add(ns)
-                    logger.warning("Found agent for %s with None value." % ns)
-
-        # Get the modification data
-        for mod in ag.mods:
-            mod_data.append((stmt_id, idx, mod.mod_type, mod.position,
-                             mod.residue, mod.is_modified))
+    for stmt, stmt_id in zip(stmts, stmt_ids):
+        for role, ag, idx in _get_agent_roles(stmt):
+            # If no agent, or no db_refs for the agent, skip the insert
+            # that follows.
+            if ag is None or ag.db_refs is None:
+                continue
+
+            # Get the db refs data, smoothing out the refs with lists of ids.
+            refs = [(ns, sub_id) for ns, ag_id in ag.db_refs.items()
+                    for sub_id in (ag_id if isinstance(ag_id, list)
+                                   else [ag_id])]
+            refs.append(('NAME', ag.name))
+            for ns, ag_id in refs:
+                if ag_id is None:
+                    if ns not in warnings:
+                        warnings.add(ns)
+                        logger.warning("Found agent for %s with None value."
+                                       % ns)
+                    continue
+                sid_col.append(stmt_id)
+                ag_num_col.append(idx)
+                db_name_col.append(ns)
+                db_id_col.append(regularize_agent_id(ag_id, ns))
+                role_col.append(role)
+
+            # Get the modification data
+            for mod in ag.mods:
+                mod_data.append((stmt_id, idx, mod.mod_type, mod.position,
+                                 mod.residue, mod.is_modified))
+
+            # Get the mutation data
+            for mut in ag.mutations:
+                mut_data.append((stmt_id, idx, mut.position, mut.residue_from,
+                                 mut.residue_to))
+
+    ref_cols = dict(zip(REF_COLS, (sid_col, ag_num_col, db_name_col,
+                                   db_id_col, role_col)))
+    return ref_cols, mod_data, mut_data
 
-        # Get the mutation data
-        for mut in ag.mutations:
-            mut_data.append((stmt_id, idx, mut.position, mut.residue_from,
-                             mut.residue_to))
 
+def extract_agent_data(stmt, stmt_id):
+    """Create the tuples for copying agents into the database."""
+    ref_cols, mod_data, mut_data = get_agent_columns([stmt], [stmt_id])
+    ref_data = list(zip(*(ref_cols[c] for c in REF_COLS)))
     return ref_data, mod_data, mut_data
 
 
@@ -287,15 +340,16 @@ def insert_db_stmts(db, stmts, db_ref_id, verbose=False, batch_id=None):
         print(" Done preparing %d statements." % len(stmts))
 
     try:
-        # TODO: Make it possible to not commit this immediately. That would
-        # require developing a more sophisticated copy procedure for raw
-        # statements and agents.
-        db.copy_push('raw_statements', stmt_data, cols)
+        # Get the ids of the new statements back from the copy, so they don't
+        # need to be looked up again. The agents are committed along with
+        # the statements.
+        id_rows = db.copy_push('raw_statements', stmt_data, cols,
+                               commit=False, return_cols=('uuid', 'id'))
     except Exception as e:
         with open('stmt_data_dump.pkl', 'wb') as f:
             pickle.dump(stmt_data, f)
         raise e
-    insert_raw_agents(db, batch_id, stmts)
+    insert_raw_agents(db, batch_id, stmts, stmt_ids=dict(id_rows))
     return
 
 
@@ -1,7 +1,12 @@
 import re
+import gzip
+import json
+import logging
 from os import path
 from io import BytesIO
 
+logger = logging.getLogger(__name__)
+
 
 class S3Path(object):
     """A simple object to make it easier to manage s3 locations."""
@@ -104,3 +109,126 @@ class S3Path(object):
     def __repr__(self):
         return 'S3Path({bucket}, {key})'.format(bucket=self.bucket,
                                                 key=self.key)
+
+
+class GzipMultipartUpload(object):
+    """Write a stream of lines to s3 as gzipped parts of a multipart upload.
+
+    Each part is compressed as its own gzip member, so the completed object
+    is a valid (multi-member) gzip file, and only one part is held in memory
+    at a time. After each part is uploaded, the upload id, the parts, and the
+    `marker` given for the last line of the part are saved to a small json
+    file next to the target, so that an interrupted upload can be picked up
+    where it left off.
+
+    Parameters
+    ----------
+    s3 : boto3.client
+        A boto3 client for s3.
+    s3_path : S3Path
+        The location of the final file.
+    part_size : int
+        The size in bytes of compressed data at which a part is uploaded.
+        S3 requires that all but the last part be at least 5 MB.
+        (Default is 64 MB)
+    """
+    def __init__(self, s3, s3_path, part_size=64*1024**2):
+        if not s3_path.key:
+            raise ValueError("Cannot upload to a key-less s3 path.")
+        self.s3 = s3
+        self.s3_path = s3_path
+        self.state_path = S3Path(s3_path.bucket, s3_path.key + '.parts.json')
+        self.part_size = part_size
+        self.upload_id = None
+        self.parts = []
+        self._buf = None
+        self._gz = None
+        self._marker = None
+
+    @property
+    def last_marker(self):
+        """The marker of the last line in the last uploaded part, if any."""
+        if not self.parts:
+            return None
+        return self.parts[-1]['marker']
+
+    def start(self, continuing=False):
+        """Begin a new upload, or resume a previous one if `continuing`."""
+        if continuing and self.state_path.exists(self.s3):
+            state = json.loads(self.state_path.get(self.s3)['Body'].read())
+            try:
+                res = self.s3.list_parts(UploadId=state['upload_id'],
+                                         **self.s3_path.kw())
+            except self.s3.exceptions.NoSuchUpload:
+                logger.warning(f"Upload to {self.s3_path} has expired, "
+                               f"starting over.")
+            else:
+                # Only keep parts that s3 actually has.
+                etags = {p['PartNumber']: p['ETag']
+                         for p in res.get('Parts', [])}
+                self.upload_id = state['upload_id']
+                for part in state['parts']:
+                    if etags.get(part['PartNumber']) != part['ETag']:
+                        break
+                    self.parts.append(part)
+                logger.info(f"Resuming upload to {self.s3_path} after "
+                            f"{len(self.parts)} parts.")
+        if self.upload_id is None:
+            res = self.s3.create_multipart_upload(**self.s3_path.kw())
+            self.upload_id = res['UploadId']
+            self.parts = []
+        self._marker = self.last_marker
+        self._new_buffer()
+        return self
+
+    def _new_buffer(self):
+        self._buf = BytesIO()
+        self._gz = gzip.GzipFile(fileobj=self._buf, mode='wb')
+
+    def write(self, line, marker=None):
+        """Write a line (bytes, without the newline) to the upload.
+
+        If a part is completed by this line, it is uploaded, and `marker`
+        (which must be json serializable) is recorded with it.
+        """
+        self._gz.write(line)
+        self._gz.write(b'\n')
+        self._marker = marker
+        if self._buf.tell() >= self.part_size:
+            self._upload_part(marker)
+
+    def _upload_part(self, marker):
+        self._gz.close()
+        part_num = len(self.parts) + 1
+        res = self.s3.upload_part(Body=self._buf.getvalue(),
+                                  PartNumber=part_num,
+                                  UploadId=self.upload_id,
+                                  **self.s3_path.kw())
+        self.parts.append({'PartNumber': part_num, 'ETag': res['ETag'],
+                           'marker': marker})
+        self.state_path.put(self.s3, json.dumps(
+            {'upload_id': self.upload_id, 'parts': self.parts}
+        ).encode('utf-8'))
+        logger.info(f"Uploaded part {part_num} of {self.s3_path}.")
+        self._new_buffer()
+
+    def complete(self):
+        """Upload whatever remains and assemble the parts into the file."""
+        # S3 needs at least one part, even if it is empty.
+        if self._gz.tell() or not self.parts:
+            self._upload_part(self._marker)
+        self._gz.close()
+        self.s3.complete_multipart_upload(
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': p['PartNumber'],
+                                        'ETag': p['ETag']}
+                                       for p in self.parts]},
+            **self.s3_path.kw()
+        )
+        self.state_path.delete(self.s3)
+
+    def abort(self):
+        """Abandon the upload, removing any parts from s3."""
+        self.s3.abort_multipart_upload(UploadId=self.upload_id,
+                                       **self.s3_path.kw())
+        self.state_path.delete(self.s3)
@@ -198,7 +198,7 @@ def i_am_alive():
 @app.route("/ground", methods=["GET"])
 def ground():
     ag = request.args["agent"]
-    res_json = gilda_ground(ag)
+    res_json = gilda_ground(ag, context=request.args.get("context"))
     return jsonify(res_json)
 
 
@@ -520,6 +520,17 @@ def get_statements_by_query_json(result_type):
         return Response(f"Invalid result type: {e.result_type}", 400)
 
 
+@app.route("/batch/<result_type>", methods=["POST"])
+@user_log_endpoint
+def get_batch_of_query_jsons(result_type):
+    # Run many query jsons in one request, streaming back NDJSON.
+    note_in_log(result_type=result_type)
+    try:
+        return BatchQueryApiCall(env).run(result_type)
+    except ResultTypeError as e:
+        return Response(f"Invalid result type: {e.result_type}", 400)
+
+
 @app.route("/compile/<fmt>", methods=["POST"])
 def compile_query(fmt):
     # Used in indra_db_rest in indra
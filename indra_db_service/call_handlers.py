@@ -1,14 +1,19 @@
 __all__ = ['ApiCall', 'FromAgentsApiCall', 'FromHashApiCall',
            'FromHashesApiCall', 'FromPapersApiCall', 'FromSimpleJsonApiCall',
-           'FromAgentJsonApiCall', 'DirectQueryApiCall', 'pop_request_bool']
+           'FromAgentJsonApiCall', 'DirectQueryApiCall', 'BatchQueryApiCall',
+           'pop_request_bool']
 
 import sys
 import json
 import logging
+import threading
+from copy import copy
 from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from flask import request, Response, abort
+from flask import request, Response, abort, stream_with_context
+from sqlalchemy.exc import DBAPIError
 
 from indra.sources import SOURCE_INFO
 from indra.util.statement_presentation import internal_source_mappings
@@ -19,16 +24,18 @@ from indra.statements import stmts_from_json, Complex, make_statement_camel
 from indra.assemblers.html.assembler import HtmlAssembler, _format_stmt_text, \
     _format_evidence_text, DEFAULT_SOURCE_COLORS
 
+from indra_db.util import get_ro
 from indra_db.client.readonly import *
 from indra_db.client.principal.curation import *
 from indralab_auth_tools.log import note_in_log, is_log_running
 
 from indra_db_service.config import MAX_STMTS, REDACT_MESSAGE, TITLE, TESTING, \
-    jwt_nontest_optional, MAX_LIST_LEN, BASE_URL
+    jwt_nontest_optional, MAX_LIST_LEN, BASE_URL, MAX_BATCH_QUERIES, \
+    BATCH_WORKERS
 from indra_db_service.errors import HttpUserError, ResultTypeError
 from indra_db_service.util import LogTracker, sec_since, get_source,\
     process_agent,  process_mesh_term, DbAPIError, iter_free_agents, \
-    _make_english_from_meta
+    _make_english_from_meta, _make_english_from_stmt_json
 
 logger = logging.getLogger('call_handlers')
 
@@ -107,6 +114,12 @@ class ApiCall:
     valid_result_types = ['statements', 'interactions', 'agents', 'hashes']
 
     def run(self, result_type):
+        if result_type == 'statements' and self.fmt == 'ndjson':
+            return self.stream_statements()
+        res = self.get_result(result_type)
+        return self.produce_response(res)
+
+    def get_result(self, result_type, ro=None):
 
         # Get the db query object.
         logger.info("Running function %s after %s seconds."
@@ -120,15 +133,17 @@ class ApiCall:
             self.special['ev_limit'] = \
                 self._pop('ev_limit', self.default_ev_lim, int)
             res = self.get_db_query().get_statements(
+                ro=ro,
                 ev_limit=self.special['ev_limit'],
                 evidence_filter=self.ev_filter,
                 **params
             )
         elif result_type == 'interactions':
-            res = self.get_db_query().get_interactions(**params)
+            res = self.get_db_query().get_interactions(ro=ro, **params)
         elif result_type == 'relations':
             self.special['with_hashes'] = self._pop('with_hashes', False, bool)
             res = self.get_db_query().get_relations(
+                ro=ro,
                 with_hashes=self.special['with_hashes'] or self.w_cur_counts,
                 **params
             )
@@ -137,19 +152,20 @@ class ApiCall:
             self.special['complexes_covered'] = \
                 self._pop('complexes_covered', None)
             res = self.get_db_query().get_agents(
+                ro=ro,
                 with_hashes=self.special['with_hashes'] or self.w_cur_counts,
                 complexes_covered=self.special['complexes_covered'],
                 **params
             )
         elif result_type == 'hashes':
-            res = self.get_db_query().get_hashes(**params)
+            res = self.get_db_query().get_hashes(ro=ro, **params)
         else:
             raise ResultTypeError(result_type)
         logger.info(f"Got results from query after "
                     f"{sec_since(self.start_time)} seconds.")
         self.process_entries(res)
         logger.info(f"Returning for query with params: {params}")
-        return self.produce_response(res)
+        return res
 
     def _pop(self, key, default=None, type_cast=None):
         if isinstance(default, bool):
@@ -230,82 +246,18 @@ class ApiCall:
             return
 
         elsevier_redactions = 0
-        if not all(self.has.values()) or self.fmt == 'json-js' \
-                or self.w_english:
+        if self._needs_processing():
+            if result.result_type == 'statements':
+                counts = result.source_counts
+            else:
+                counts = result.evidence_counts
             for key, entry in result.results.copy().items():
-                # Build english reps of each result (unless their just hashes)
-                if self.w_english and result.result_type != 'hashes':
-                    stmt = None
-                    # Fix the agent order
-                    if self.strict:
-                        if result.result_type == 'statements':
-                            stmt = stmts_from_json([entry])[0]
-                            if type(stmt) == Complex:
-                                id_lookup = {v: int(k)
-                                             for k, v in self.agent_dict.items()}
-                                stmt.members.sort(
-                                    key=lambda ag: id_lookup.get(ag.name, 10)
-                                )
-                            agent_set = {ag.name
-                                         for ag in stmt.agent_list()
-                                         if ag is not None}
-                        else:
-                            agent_set = set(entry['agents'].values())
-                            if result.result_type == 'relations' \
-                                    and entry['type'] == 'Complex':
-                                entry['agents'] = self.agent_dict
-                        if agent_set < self.agent_set:
-                            result.results.pop(key, None)
-                            continue
-
-                    # Construct the english.
-                    if result.result_type == 'statements':
-                        if stmt is None:
-                            stmt = stmts_from_json([entry])[0]
-                        eng = _format_stmt_text(stmt)
-                        entry['evidence'] = _format_evidence_text(stmt)
-                    else:
-                        eng = _make_english_from_meta(entry)
-                    if not eng:
-                        logger.warning(f"English not formed for {key}:\n"
-                                       f"{entry}")
-                    entry['english'] = eng
-
-                # Filter out medscan if user does not have medscan privileges.
-                if not self.has['medscan']:
-                    if result.result_type == 'statements':
-                        result.source_counts[key].pop('medscan', 0)
-                    else:
-                        result.evidence_counts[key] -= \
-                            entry['source_counts'].pop('medscan', 0)
-                        entry['total_count'] = result.evidence_counts[key]
-                        if not entry['source_counts']:
-                            logger.warning("Censored content present.")
-
-                # In most cases we can stop here
-                if self.has['elsevier'] and self.fmt != 'json-js' \
-                        and not self.w_english:
+                keep, num_redacted = \
+                    self.process_entry(result.result_type, key, entry, counts)
+                if not keep:
+                    result.results.pop(key, None)
                     continue
-
-                if result.result_type == 'statements':
-                    # If there is evidence, loop through it if necessary.
-                    for ev_json in entry['evidence'][:]:
-                        if self.fmt == 'json-js':
-                            ev_json['source_hash'] = str(ev_json['source_hash'])
-
-                        # Check for elsevier and redact if necessary
-                        if not self.has['elsevier'] and \
-                                get_source(ev_json) == 'elsevier':
-                            text = ev_json['text']
-                            if len(text) > 200:
-                                ev_json['text'] = text[:200] + REDACT_MESSAGE
-                                elsevier_redactions += 1
-                elif result.result_type != 'hashes' and self.fmt == 'json-js':
-                    # Stringify lists of hashes.
-                    if 'hashes' in entry and entry['hashes'] is not None:
-                        entry['hashes'] = [str(h) for h in entry['hashes']]
-                    elif 'hash' in entry:
-                        entry['hash'] = str(entry['hash'])
+                elsevier_redactions += num_redacted
 
         if result.result_type == 'statements':
             logger.info(f"Redacted {elsevier_redactions} pieces of elsevier "
@@ -315,6 +267,159 @@ class ApiCall:
                     f"{sec_since(self.start_time)} seconds.")
         return
 
+    def _needs_processing(self):
+        return not all(self.has.values()) or self.fmt == 'json-js' \
+            or self.w_english
+
+    def process_entry(self, result_type, key, entry, counts):
+        """Build the english for, and redact, a single entry of a result.
+
+        The `counts` are the source counts by key for statements, and the
+        evidence counts by key for other result types. They are updated in
+        place if medscan evidence is removed.
+
+        Returns whether the entry should be kept, and the number of pieces
+        of elsevier evidence that were redacted.
+        """
+        # Build english reps of each result (unless their just hashes)
+        if self.w_english and result_type != 'hashes':
+            stmt = None
+            # Fix the agent order
+            if self.strict:
+                if result_type == 'statements':
+                    stmt = stmts_from_json([entry])[0]
+                    if type(stmt) == Complex:
+                        id_lookup = {v: int(k)
+                                     for k, v in self.agent_dict.items()}
+                        stmt.members.sort(
+                            key=lambda ag: id_lookup.get(ag.name, 10)
+                        )
+                    agent_set = {ag.name
+                                 for ag in stmt.agent_list()
+                                 if ag is not None}
+                else:
+                    agent_set = set(entry['agents'].values())
+                    if result_type == 'relations' \
+                            and entry['type'] == 'Complex':
+                        entry['agents'] = self.agent_dict
+                if agent_set < self.agent_set:
+                    return False, 0
+
+            # Construct the english, using the cache unless the agents were
+            # reordered.
+            if result_type == 'statements':
+                if stmt is None:
+                    eng, entry['evidence'] = \
+                        _make_english_from_stmt_json(key, entry)
+                else:
+                    eng = _format_stmt_text(stmt)
+                    entry['evidence'] = _format_evidence_text(stmt)
+            else:
+                eng = _make_english_from_meta(entry)
+            if not eng:
+                logger.warning(f"English not formed for {key}:\n"
+                               f"{entry}")
+            entry['english'] = eng
+
+        # Filter out medscan if user does not have medscan privileges.
+        if not self.has['medscan']:
+            if result_type == 'statements':
+                counts[key].pop('medscan', 0)
+            else:
+                counts[key] -= entry['source_counts'].pop('medscan', 0)
+                entry['total_count'] = counts[key]
+                if not entry['source_counts']:
+                    logger.warning("Censored content present.")
+
+        # In most cases we can stop here
+        if self.has['elsevier'] and self.fmt != 'json-js' \
+                and not self.w_english:
+            return True, 0
+
+        elsevier_redactions = 0
+        if result_type == 'statements':
+            # If there is evidence, loop through it if necessary.
+            for ev_json in entry['evidence'][:]:
+                if self.fmt == 'json-js':
+                    ev_json['source_hash'] = str(ev_json['source_hash'])
+
+                # Check for elsevier and redact if necessary
+                if not self.has['elsevier'] and \
+                        get_source(ev_json) == 'elsevier':
+                    text = ev_json['text']
+                    if len(text) > 200:
+                        ev_json['text'] = text[:200] + REDACT_MESSAGE
+                        elsevier_redactions += 1
+        elif result_type != 'hashes' and self.fmt == 'json-js':
+            # Stringify lists of hashes.
+            if 'hashes' in entry and entry['hashes'] is not None:
+                entry['hashes'] = [str(h) for h in entry['hashes']]
+            elif 'hash' in entry:
+                entry['hash'] = str(entry['hash'])
+        return True, elsevier_redactions
+
+    def stream_statements(self, ro=None):
+        """Stream the statements as newline-delimited JSON.
+
+        Each statement is processed and sent as soon as it is read from the
+        database, with a line holding its hash, JSON, evidence count, belief,
+        and source counts. A final line holds a summary of the result.
+        """
+        if self.w_cur_counts:
+            raise HttpUserError("Curation counts are not available with the "
+                                "ndjson format.")
+        self.special['ev_limit'] = \
+            self._pop('ev_limit', self.default_ev_lim, int)
+        stmt_iter = self.get_db_query().iter_statements(
+            ro=ro,
+            offset=self.offs,
+            limit=self.limit,
+            sort_by=self.sort_by,
+            ev_limit=self.special['ev_limit'],
+            evidence_filter=self.ev_filter
+        )
+        needs_processing = self._needs_processing()
+
+        def iter_lines():
+            num_stmts = 0
+            num_evidence = 0
+            total_evidence = 0
+            elsevier_redactions = 0
+            for mk_hash, stmt_json, ev_count, belief, src_counts, num_ev \
+                    in stmt_iter:
+                if needs_processing:
+                    keep, num_redacted = self.process_entry(
+                        'statements', mk_hash, stmt_json, {mk_hash: src_counts}
+                    )
+                    if not keep:
+                        continue
+                    elsevier_redactions += num_redacted
+                num_stmts += 1
+                num_evidence += num_ev
+                total_evidence += ev_count
+                yield json.dumps({'hash': str(mk_hash),
+                                  'statement': stmt_json,
+                                  'evidence_count': ev_count,
+                                  'belief': belief,
+                                  'source_counts': src_counts}) + '\n'
+
+            logger.info(f"Streamed {num_stmts} statements with "
+                        f"{num_evidence} evidence ({elsevier_redactions} "
+                        f"elsevier redactions) after "
+                        f"{sec_since(self.start_time)} seconds.")
+            yield json.dumps({'summary': {
+                'statement_limit': MAX_STMTS,
+                'statements_returned': num_stmts,
+                'end_of_statements': num_stmts < MAX_STMTS,
+                'evidence_returned': num_evidence,
+                'total_evidence': total_evidence,
+                'offset': self.offs,
+                'query_json': self.db_query.to_json(),
+            }}) + '\n'
+
+        return Response(stream_with_context(iter_lines()),
+                        mimetype='application/x-ndjson')
+
 
 class StatementApiCall(ApiCall):
     def __init__(self, env):
@@ -720,3 +825,133 @@ class DirectQueryApiCall(ApiCall):
         except (KeyError, ValueError):
             raise HttpUserError("Invalid JSON.")
         return q
+
+
+_batch_executor = None
+_batch_ro = None
+_batch_ro_lock = threading.Lock()
+_batch_local = threading.local()
+
+
+def _get_batch_executor():
+    # The executor is created lazily, so each (forked) server worker gets its
+    # own threads.
+    global _batch_executor
+    if _batch_executor is None:
+        _batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS,
+                                             thread_name_prefix='batch')
+    return _batch_executor
+
+
+def _get_batch_ro():
+    # Like the executor, the readonly handle (and so its pool of connections)
+    # is made lazily, and is shared by all the batch threads of a worker.
+    global _batch_ro
+    with _batch_ro_lock:
+        if _batch_ro is None:
+            _batch_ro = get_ro('primary')
+            if _batch_ro is None:
+                raise DbAPIError("Could not connect to the readonly "
+                                 "database.")
+    return _batch_ro
+
+
+def _run_batch_query(call, result_type):
+    # Each thread keeps its own session on the shared connection pool, so the
+    # sessions are not shared between threads.
+    ro = getattr(_batch_local, 'ro', None)
+    if ro is None:
+        ro = _get_batch_ro().get_session_handle()
+        _batch_local.ro = ro
+    try:
+        return call.get_result(result_type, ro=ro).json()
+    except Exception as e:
+        # The session may be broken, so it is closed (returning its connection
+        # to the pool) and the next query on this thread gets a new one.
+        del _batch_local.ro
+        try:
+            ro.session.close()
+        except Exception as close_err:
+            logger.warning(f"Failed to close the readonly session: "
+                           f"{close_err}")
+        if isinstance(e, DBAPIError) and e.connection_invalidated:
+            # The database connection was lost, so the rest of the pooled
+            # connections are likely stale too.
+            ro.dispose_engine()
+        raise
+
+
+class BatchQueryApiCall(DirectQueryApiCall):
+    """Run a list of query JSONs, streaming the results as they complete.
+
+    The auth and the other options of the request are shared by all the
+    queries, and the results are returned as newline-delimited JSON, with a
+    line for each query, holding its index in the list and either its result
+    or an error.
+    """
+    def __init__(self, env):
+        ApiCall.__init__(self, env)
+        self.is_simple = self._pop('simple', False, bool)
+        if isinstance(request.json, list):
+            query_jsons = request.json
+            kwargs = {}
+        else:
+            query_jsons = request.json.get('queries')
+            kwargs = request.json.get('kwargs', {})
+            self.web_query['complexes_covered'] = \
+                request.json.get('complexes_covered')
+        if not query_jsons or not isinstance(query_jsons, list):
+            raise HttpUserError("No list of queries given.")
+        if len(query_jsons) > MAX_BATCH_QUERIES:
+            raise HttpUserError(f"Too many queries! Only {MAX_BATCH_QUERIES} "
+                                f"queries allowed.")
+        self.filter_ev = kwargs.pop('filter_ev', True)
+        self.web_query.update(kwargs)
+        self.query_jsons = query_jsons
+        self.query_json = None
+
+    def _get_query_call(self, query_json):
+        call = copy(self)
+        call.web_query = self.web_query.copy()
+        call.special = {}
+        call.db_query = None
+        call.ev_filter = None
+        call.query_json = query_json
+        call.get_db_query()
+        return call
+
+    def run(self, result_type):
+        if result_type not in self.valid_result_types:
+            raise ResultTypeError(result_type)
+
+        # Build all the queries within the request, so any problem with them
+        # is found before streaming begins.
+        calls = {}
+        errors = {}
+        for idx, query_json in enumerate(self.query_jsons):
+            try:
+                calls[idx] = self._get_query_call(query_json)
+            except Exception as e:
+                logger.warning(f"Failed to build query {idx}: {e}")
+                errors[idx] = str(e) or type(e).__name__
+
+        def iter_lines():
+            for idx, msg in errors.items():
+                yield json.dumps({'index': idx, 'error': msg}) + '\n'
+
+            executor = _get_batch_executor()
+            futures = {executor.submit(_run_batch_query, call, result_type): idx
+                       for idx, call in calls.items()}
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    line = {'index': idx, 'result': future.result()}
+                except Exception as e:
+                    logger.exception(e)
+                    line = {'index': idx, 'error': str(e)}
+                yield json.dumps(line) + '\n'
+            logger.info(f"Finished batch of {len(self.query_jsons)} queries "
+                        f"({len(errors)} invalid) after "
+                        f"{sec_since(self.start_time)} seconds.")
+
+        return Response(iter_lines(), mimetype='application/x-ndjson')
@@ -5,6 +5,8 @@ __all__ = [
     "VUE_ROOT",
     "MAX_STMTS",
     "MAX_LIST_LEN",
+    "MAX_BATCH_QUERIES",
+    "BATCH_WORKERS",
     "REDACT_MESSAGE",
     "TESTING",
     "jwt_nontest_optional",
@@ -26,6 +28,8 @@ if VUE_ROOT is not None and not VUE_ROOT.startswith("http"):
         VUE_ROOT = Path(__file__).parent.absolute() / VUE_ROOT
 MAX_STMTS = 500
 MAX_LIST_LEN = 2000
+MAX_BATCH_QUERIES = 500
+BATCH_WORKERS = int(environ.get("INDRA_DB_API_BATCH_WORKERS", 8))
 REDACT_MESSAGE = "[MISSING/INVALID CREDENTIALS: limited to 200 char for Elsevier]"
 
 TESTING = {}
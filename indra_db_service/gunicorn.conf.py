@@ -7,6 +7,27 @@ import threading
 from indralab_auth_tools.src.database import monitor_database_connection
 
 
+def on_starting(server):
+    """Function to run in the master process before the workers are forked
+
+    See: https://docs.gunicorn.org/en/stable/settings.html#on-starting
+
+    This warms up the gilda grounding cache with the most common agent names,
+    once, so that every worker starts with the groundings in memory without
+    running the query itself. A database or network problem is only reported,
+    since the groundings are otherwise made as they are needed.
+    """
+    try:
+        from indra import get_config
+        from indra_db.client.readonly.query import get_grounding_cache
+        num_names = int(get_config("GROUNDING_CACHE_WARM_N") or 1000)
+        get_grounding_cache().warm(num_names=num_names)
+    except Exception as e:
+        print(f"WARNING: Failed to warm up gilda grounding: {e}")
+        return
+    print("Warmed up gilda grounding.")
+
+
 def post_fork(server, worker):
     """Function to run after forking a worker
 
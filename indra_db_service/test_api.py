@@ -669,6 +669,50 @@ class TestDbApi(unittest.TestCase):
                         assert len(ev1.text) == len(ev2.text),\
                             "Evidence text lengths don't match."
 
+    def test_ndjson_statements(self):
+        query_str = 'agent0=MEK&agent1=ERK&type=Phosphorylation&ev_limit=5'
+        resp = self.app.get(f'statements/from_agents?{query_str}&format=json')
+        assert resp.status_code == 200, resp.data.decode()
+        resp_dict = json.loads(resp.data)
+
+        resp = self.app.get(f'statements/from_agents?{query_str}'
+                            f'&format=ndjson')
+        assert resp.status_code == 200, resp.data.decode()
+        assert resp.mimetype == 'application/x-ndjson', resp.mimetype
+        lines = [json.loads(line) for line in resp.data.decode().splitlines()]
+        summary = lines.pop()['summary']
+        assert summary['statements_returned'] == len(lines)
+        assert [line['hash'] for line in lines] \
+            == list(resp_dict['statements'].keys())
+        for line in lines:
+            stmt_json = resp_dict['statements'][line['hash']]
+            assert len(line['statement']['evidence']) \
+                == len(stmt_json['evidence'])
+            assert line['evidence_count'] \
+                == resp_dict['evidence_counts'][line['hash']]
+        assert summary['evidence_returned'] == resp_dict['evidence_returned']
+
+    def test_batch_query(self):
+        queries = [HasAgent('MEK') & HasAgent('ERK'),
+                   HasAgent('TP53', namespace='HGNC-SYMBOL'),
+                   HasAgent('MEK') & HasType(['Phosphorylation'])]
+        query_jsons = [q.to_json() for q in queries] + [{'class': 'Bogus'}]
+        resp = self.app.post('batch/hashes?limit=10',
+                             data=json.dumps({'queries': query_jsons}),
+                             headers={'content-type': 'application/json'})
+        assert resp.status_code == 200, resp.data.decode()
+        assert resp.mimetype == 'application/x-ndjson', resp.mimetype
+        lines = [json.loads(line) for line in resp.data.decode().splitlines()]
+        assert sorted(line['index'] for line in lines) \
+            == list(range(len(query_jsons)))
+        by_idx = {line['index']: line for line in lines}
+        assert 'error' in by_idx[len(queries)], by_idx[len(queries)]
+        for idx, query in enumerate(queries):
+            assert 'result' in by_idx[idx], by_idx[idx]
+            qr = QueryResult.from_json(by_idx[idx]['result'])
+            assert qr.results.keys() \
+                == query.get_hashes(limit=10).results.keys()
+
     def test_drill_down(self):
         def drill_down(relation, result_type):
             query_strs = ['with_cur_counts=true']
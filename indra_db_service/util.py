@@ -1,9 +1,14 @@
 import json
 import logging
+import threading
+from os import environ
 from io import StringIO
 from datetime import datetime
 
-from indra.assemblers.html.assembler import _format_stmt_text
+from cachetools import LRUCache
+from indra.statements import stmts_from_json
+from indra.assemblers.html.assembler import _format_stmt_text, \
+    _format_evidence_text
 from indra_db.client import stmt_from_interaction
 
 from indra_db.client.readonly.query import gilda_ground
@@ -141,6 +146,49 @@ def iter_free_agents(query_dict):
             yield entry
 
 
+# English and formatted evidence are deterministic for a given statement hash
+# (and evidence source hash), so they are cached between requests.
+_english_cache = LRUCache(
+    maxsize=int(environ.get('INDRA_DB_API_ENGLISH_CACHE_SIZE', 100000))
+)
+_english_lock = threading.Lock()
+
+
+def _get_cached(key):
+    with _english_lock:
+        return _english_cache.get(key)
+
+
+def _set_cached(key, value):
+    with _english_lock:
+        _english_cache[key] = value
+
+
+def _make_english_from_stmt_json(mk_hash, stmt_json):
+    """Get the english and formatted evidence for a statement JSON.
+
+    The results are cached by statement hash and evidence source hash, so a
+    statement JSON is only deserialized if something is missing from the
+    cache. The formatted evidence is copied, so it may be edited freely.
+    """
+    eng = _get_cached(('stmt', mk_hash))
+    ev_keys = [('ev', mk_hash, str(ev_json['source_hash']))
+               if ev_json.get('source_hash') is not None else None
+               for ev_json in stmt_json['evidence']]
+    ev_list = [_get_cached(key) if key is not None else None
+               for key in ev_keys]
+    if eng is None or any(ev is None for ev in ev_list):
+        stmt = stmts_from_json([stmt_json])[0]
+        if eng is None:
+            eng = _format_stmt_text(stmt)
+            _set_cached(('stmt', mk_hash), eng)
+        ev_list = _format_evidence_text(stmt)
+        for key, ev in zip(ev_keys, ev_list):
+            if key is not None:
+                _set_cached(key, ev)
+    return eng, [dict(ev) for ev in ev_list]
+
+
 def _make_english_from_meta(interaction):
     stmt_type = interaction.get('type')
     agent_json = interaction['agents']
@@ -161,5 +209,10 @@ def _make_english_from_meta(interaction):
             else:
                 eng += ' is modified'
     else:
-        eng = _format_stmt_text(stmt_from_interaction(interaction))
+        key = ('meta', stmt_type, tuple(agent_json.items()),
+               interaction.get('activity'), interaction.get('is_active'))
+        eng = _get_cached(key)
+        if eng is None:
+            eng = _format_stmt_text(stmt_from_interaction(interaction))
+            _set_cached(key, eng)
     return eng
\ No newline at end of file
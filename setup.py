@@ -10,6 +10,7 @@ def main():
                                   'flask-compress', 'numpy'],
                       'cli': ['click', 'boto3'],
                       'copy': ['pgcopy'],
+                      'dump': ['pandas', 'pyarrow'],
                       'misc': ['matplotlib', 'numpy']}
     extras_require['all'] = list({dep for deps in extras_require.values()
                                   for dep in deps})